@@ -3,16 +3,11 @@ import os
 from langchain_groq import ChatGroq
 from app.modals.anon_conversation import fetch_conversation_history
 from app.utils.prompts import get_system_instruction
-from langchain_openai import ChatOpenAI
+from app.utils.providers import get_chat_model
 
 def get_llm():
-    api_key = os.environ.get("OPENAI_API_KEY")
-    return ChatOpenAI(
-        api_key=api_key,
-        model="gpt-4o-mini",
-        temperature=0.5,
-        max_retries=3
-    )
+    # Backend chosen by settings.LLM_PROVIDER ('openai', or 'stub' for offline load tests)
+    return get_chat_model(temperature=0.5)
 
 def get_chat_completion(conversation_history, message_content):
     print('get_chat_completion')
@@ -255,4 +255,155 @@ EMAIL_HOST = 'smtp.gmail.com'
 EMAIL_PORT = 587
 EMAIL_USE_TLS = True
 EMAIL_HOST_USER = os.getenv('EMAIL_HOST_USER')  # Your Gmail address
-EMAIL_HOST_PASSWORD = os.getenv('EMAIL_HOST_PASSWORD')  # Your app-specific password
\ No newline at end of file
+EMAIL_HOST_PASSWORD = os.getenv('EMAIL_HOST_PASSWORD')  # Your app-specific password
+
+# Retrieval settings
+
+# Upper bound (bytes) on the per-assistant embedding matrices each worker keeps in memory
+VECTOR_INDEX_MAX_BYTES = int(os.getenv('VECTOR_INDEX_MAX_BYTES', 256 * 1024 * 1024))
+
+# Embedding model used for documents and queries, and its dimensionality
+EMBEDDING_MODEL = 'text-embedding-ada-002'
+EMBEDDING_DIMENSIONS = 1536
+
+# Where similarity search runs: 'numpy' (in-process index) or 'pgvector' (SQL, HNSW index).
+# The float32 pgvector column and its index are only kept for 'pgvector'; run
+# `manage.py sync_pgvector` after changing this
+VECTOR_SEARCH_BACKEND = os.getenv('VECTOR_SEARCH_BACKEND', 'numpy')
+
+# HNSW candidate list size for pgvector queries; higher trades latency for recall
+PGVECTOR_EF_SEARCH = int(os.getenv('PGVECTOR_EF_SEARCH', 100))
+
+# Query-embedding cache: in-process LRU entries, plus an optional on-disk tier directory
+QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv('QUERY_EMBEDDING_CACHE_SIZE', 10000))
+QUERY_EMBEDDING_CACHE_DIR = os.getenv('QUERY_EMBEDDING_CACHE_DIR')
+
+# Ingestion: embedding requests are packed up to this many tokens / inputs each,
+# with this many requests in flight and jittered exponential backoff on 429s
+EMBEDDING_BATCH_MAX_TOKENS = int(os.getenv('EMBEDDING_BATCH_MAX_TOKENS', 100000))
+EMBEDDING_BATCH_MAX_INPUTS = int(os.getenv('EMBEDDING_BATCH_MAX_INPUTS', 2048))
+EMBEDDING_MAX_CONCURRENCY = int(os.getenv('EMBEDDING_MAX_CONCURRENCY', 4))
+EMBEDDING_MAX_RETRIES = int(os.getenv('EMBEDDING_MAX_RETRIES', 6))
+EMBEDDING_RETRY_BASE_DELAY = float(os.getenv('EMBEDDING_RETRY_BASE_DELAY', 1.0))
+EMBEDDING_RETRY_MAX_DELAY = float(os.getenv('EMBEDDING_RETRY_MAX_DELAY', 60.0))
+
+# Rows per INSERT when storing document chunks
+CHUNK_BULK_CREATE_BATCH_SIZE = int(os.getenv('CHUNK_BULK_CREATE_BATCH_SIZE', 500))
+
+# PDF text extraction: pages are parsed in a process pool in slices of this many pages;
+# shorter documents are parsed in-process
+PDF_EXTRACTION_WORKERS = int(os.getenv('PDF_EXTRACTION_WORKERS', os.cpu_count() or 1))
+PDF_EXTRACTION_PAGES_PER_TASK = int(os.getenv('PDF_EXTRACTION_PAGES_PER_TASK', 16))
+PDF_EXTRACTION_MIN_PAGES = int(os.getenv('PDF_EXTRACTION_MIN_PAGES', 32))
+
+# Persistent embedding cache: entries unused for this many days, or beyond this many
+# least recently used, are removed by `manage.py prune_embedding_cache`
+EMBEDDING_CACHE_RETENTION_DAYS = int(os.getenv('EMBEDDING_CACHE_RETENTION_DAYS', 180))
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv('EMBEDDING_CACHE_MAX_ENTRIES', 1000000))
+
+# Chunking: target chunk size and overlap in embedding-model tokens, for every source type
+CHUNK_TARGET_TOKENS = int(os.getenv('CHUNK_TARGET_TOKENS', 300))
+CHUNK_OVERLAP_TOKENS = int(os.getenv('CHUNK_OVERLAP_TOKENS', 50))
+
+# Upper bound on retrieved-context tokens placed in a chat prompt
+CONTEXT_TOKEN_BUDGET = int(os.getenv('CONTEXT_TOKEN_BUDGET', 1500))
+
+# URL sources: concurrent fetch limits, timeouts (seconds) and maximum page size (bytes)
+URL_FETCH_TIMEOUT = float(os.getenv('URL_FETCH_TIMEOUT', 20))
+URL_FETCH_CONNECT_TIMEOUT = float(os.getenv('URL_FETCH_CONNECT_TIMEOUT', 5))
+URL_FETCH_MAX_CONNECTIONS = int(os.getenv('URL_FETCH_MAX_CONNECTIONS', 32))
+URL_FETCH_PER_HOST_LIMIT = int(os.getenv('URL_FETCH_PER_HOST_LIMIT', 4))
+URL_FETCH_MAX_BYTES = int(os.getenv('URL_FETCH_MAX_BYTES', 10 * 1024 * 1024))
+URL_FETCH_USER_AGENT = os.getenv('USER_AGENT', 'Mozilla/5.0 (compatible; AIProf/1.0)')
+
+# Retrieval mode for knowledge-base search: 'hybrid' (vector + full-text, fused by
+# reciprocal rank), 'vector' or 'lexical'. Hybrid takes this many candidates per
+# result from each side; RRF_K damps the weight of top ranks.
+RETRIEVAL_MODE = os.getenv('RETRIEVAL_MODE', 'hybrid')
+HYBRID_CANDIDATE_MULTIPLIER = int(os.getenv('HYBRID_CANDIDATE_MULTIPLIER', 4))
+RRF_K = int(os.getenv('RRF_K', 60))
+LEXICAL_MAX_TERMS = int(os.getenv('LEXICAL_MAX_TERMS', 32))
+# Full-text matches ranked per query; chunks beyond this are not scored
+LEXICAL_MAX_CANDIDATES = int(os.getenv('LEXICAL_MAX_CANDIDATES', 1000))
+
+# Query embedding on a cache miss: API timeout (seconds) before falling back to
+# full-text search, and how long to skip the API after a failure
+QUERY_EMBEDDING_TIMEOUT = float(os.getenv('QUERY_EMBEDDING_TIMEOUT', 2.0))
+QUERY_EMBEDDING_BACKOFF = float(os.getenv('QUERY_EMBEDDING_BACKOFF', 30.0))
+
+# On-disk encoding of chunk embeddings read by the in-process index: 'float16' or 'int8'
+EMBEDDING_STORAGE_CODEC = os.getenv('EMBEDDING_STORAGE_CODEC', 'float16')
+
+# Directory of memory-mapped per-assistant embedding shards shared by all workers on
+# the machine; unset keeps each worker's index in process memory
+VECTOR_SHARD_DIR = os.getenv('VECTOR_SHARD_DIR')
+
+# Incremental index maintenance: how often (seconds) a worker checks for knowledge-base
+# edits, the delta + tombstone share of an index that triggers compaction, and how long
+# (seconds) the edit log is kept
+VECTOR_INDEX_SYNC_INTERVAL = float(os.getenv('VECTOR_INDEX_SYNC_INTERVAL', 2.0))
+VECTOR_INDEX_COMPACT_RATIO = float(os.getenv('VECTOR_INDEX_COMPACT_RATIO', 0.2))
+VECTOR_INDEX_CHANGE_RETENTION = int(os.getenv('VECTOR_INDEX_CHANGE_RETENTION', 24 * 60 * 60))
+
+# Two-stage vector search for large assistants: 'pca' (projection fitted per assistant),
+# 'truncate' (leading dimensions, for Matryoshka-style models) or 'off'. The first stage
+# scans VECTOR_PREFILTER_DIMS-dim vectors for k * VECTOR_RERANK_MULTIPLIER candidates,
+# which are reranked with full vectors; raise the multiplier for recall, lower it for speed.
+VECTOR_PREFILTER = os.getenv('VECTOR_PREFILTER', 'pca')
+VECTOR_PREFILTER_DIMS = int(os.getenv('VECTOR_PREFILTER_DIMS', 256))
+VECTOR_PREFILTER_MIN_CHUNKS = int(os.getenv('VECTOR_PREFILTER_MIN_CHUNKS', 5000))
+VECTOR_PREFILTER_SAMPLE = int(os.getenv('VECTOR_PREFILTER_SAMPLE', 8192))
+VECTOR_RERANK_MULTIPLIER = int(os.getenv('VECTOR_RERANK_MULTIPLIER', 10))
+
+# IVF search for very large assistants: once an assistant has VECTOR_IVF_MIN_CHUNKS
+# embedded chunks (0 disables), its embeddings are clustered with k-means at ingestion
+# (VECTOR_IVF_CLUSTERS lists, 0 = sqrt(chunks)) and a search scans only the
+# VECTOR_IVF_NPROBE nearest clusters; raise nprobe for recall, lower it for speed.
+# The quantizer is retrained when the assistant grows VECTOR_IVF_RETRAIN_GROWTH times.
+VECTOR_IVF_MIN_CHUNKS = int(os.getenv('VECTOR_IVF_MIN_CHUNKS', 50000))
+VECTOR_IVF_CLUSTERS = int(os.getenv('VECTOR_IVF_CLUSTERS', 0))
+VECTOR_IVF_NPROBE = int(os.getenv('VECTOR_IVF_NPROBE', 16))
+VECTOR_IVF_TRAIN_SAMPLE_PER_CLUSTER = int(os.getenv('VECTOR_IVF_TRAIN_SAMPLE_PER_CLUSTER', 64))
+VECTOR_IVF_TRAIN_ITERATIONS = int(os.getenv('VECTOR_IVF_TRAIN_ITERATIONS', 10))
+VECTOR_IVF_RETRAIN_GROWTH = float(os.getenv('VECTOR_IVF_RETRAIN_GROWTH', 2.0))
+
+# Document routing: on assistants with at least DOCUMENT_ROUTING_MIN_DOCUMENTS documents
+# (0 disables), a query is matched against per-document summary embeddings first and
+# only the chunks of the DOCUMENT_ROUTING_TOP_DOCUMENTS closest documents are searched.
+# Off by default; enable it per deployment once eval_retrieval shows recall holds
+DOCUMENT_ROUTING_MIN_DOCUMENTS = int(os.getenv('DOCUMENT_ROUTING_MIN_DOCUMENTS', 0))
+DOCUMENT_ROUTING_TOP_DOCUMENTS = int(os.getenv('DOCUMENT_ROUTING_TOP_DOCUMENTS', 3))
+
+# Model backends: 'openai', or 'stub' for offline load testing and profiling. The stub
+# chat model streams STUB_LLM_TOKENS deterministic words, the first after STUB_LLM_TTFT
+# seconds and the rest STUB_LLM_TOKEN_DELAY seconds apart; stub embeddings are
+# deterministic and take STUB_EMBEDDING_DELAY seconds per request.
+LLM_PROVIDER = os.getenv('LLM_PROVIDER', 'openai')
+LLM_MODEL = os.getenv('LLM_MODEL', 'gpt-4o-mini')
+EMBEDDING_PROVIDER = os.getenv('EMBEDDING_PROVIDER', 'openai')
+STUB_LLM_TTFT = float(os.getenv('STUB_LLM_TTFT', 0.2))
+STUB_LLM_TOKEN_DELAY = float(os.getenv('STUB_LLM_TOKEN_DELAY', 0.02))
+STUB_LLM_TOKENS = int(os.getenv('STUB_LLM_TOKENS', 64))
+STUB_EMBEDDING_DELAY = float(os.getenv('STUB_EMBEDDING_DELAY', 0.05))
+
+# Chat pre-generation budgets (seconds): context retrieval and the learner knowledge
+# level lookup run concurrently before the answer starts streaming. Retrieval that misses
+# CHAT_CONTEXT_TIMEOUT answers without context; a level lookup that misses
+# CHAT_ASSESSMENT_TIMEOUT (0 never waits) uses the level saved in the chat window.
+CHAT_CONTEXT_TIMEOUT = float(os.getenv('CHAT_CONTEXT_TIMEOUT', 8.0))
+CHAT_ASSESSMENT_TIMEOUT = float(os.getenv('CHAT_ASSESSMENT_TIMEOUT', 0.5))
+
+# Learner knowledge levels are stored in KnowledgeAssessment and recomputed only at
+# checkpoints: once the chat window holds KNOWLEDGE_ASSESSMENT_FIRST_MESSAGES messages
+# for a learner never assessed, whenever the window is offloaded, and after a quiz.
+# Reads go through an in-process cache of KNOWLEDGE_LEVEL_CACHE_SIZE entries that
+# expire after KNOWLEDGE_LEVEL_CACHE_TTL seconds.
+KNOWLEDGE_ASSESSMENT_FIRST_MESSAGES = int(os.getenv('KNOWLEDGE_ASSESSMENT_FIRST_MESSAGES', 5))
+KNOWLEDGE_LEVEL_CACHE_SIZE = int(os.getenv('KNOWLEDGE_LEVEL_CACHE_SIZE', 10000))
+KNOWLEDGE_LEVEL_CACHE_TTL = float(os.getenv('KNOWLEDGE_LEVEL_CACHE_TTL', 300))
+
+# Chat post-processing (offloading full chat windows to the database, summaries and
+# knowledge level checkpoints) runs in background threads after the response stream
+# closes, one task at a time per learner and assistant, CHAT_POST_PROCESSING_WORKERS
+# learners in parallel
+CHAT_POST_PROCESSING_WORKERS = int(os.getenv('CHAT_POST_PROCESSING_WORKERS', 4))
@@ -0,0 +1,181 @@
+"""
+Query-embedding cache shared by the chat, RAG and voice retrieval paths.
+
+Embeddings are keyed by (model, normalized text). Lookups go to a bounded
+in-process LRU first and then to an optional on-disk tier (diskcache, enabled
+by setting QUERY_EMBEDDING_CACHE_DIR) before falling back to the embedding API.
+After an API failure, misses fail fast for QUERY_EMBEDDING_BACKOFF seconds
+so retrieval can degrade to full-text search without waiting on each query.
+"""
+import hashlib
+import logging
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+from diskcache import Cache
+from django.conf import settings
+from langchain_openai import OpenAIEmbeddings
+
+from app.utils.providers import embedding_cache_model, get_embedding_client
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingUnavailable(RuntimeError):
+    """A query could not be embedded (API error, timeout or recent failures)."""
+
+
+def normalize_query(text: str) -> str:
+    """Canonical form used for cache keys: NFKC, case-folded, single-spaced."""
+    return " ".join(unicodedata.normalize("NFKC", text).casefold().split())
+
+
+class QueryEmbeddingCache:
+    """Two-tier (memory LRU + optional disk) cache of query embeddings."""
+
+    def __init__(self, max_entries: int = 10000, directory: Optional[str] = None,
+                 disk_size_limit: int = 1024 * 1024 * 1024):
+        self.max_entries = max_entries
+        self._memory: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk = Cache(directory, size_limit=disk_size_limit) if directory else None
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(model: str, text: str) -> str:
+        return hashlib.sha256(f"{model}\0{normalize_query(text)}".encode("utf-8")).hexdigest()
+
+    def get(self, model: str, text: str) -> Optional[np.ndarray]:
+        key = self.make_key(model, text)
+
+        with self._lock:
+            vector = self._memory.get(key)
+            if vector is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return vector
+
+        if self._disk is not None:
+            try:
+                blob = self._disk.get(key)
+            except Exception as e:
+                logger.error(f"Query embedding disk cache read failed: {e}")
+                blob = None
+            if blob is not None:
+                vector = np.frombuffer(blob, dtype=np.float32)
+                self._remember(key, vector)
+                with self._lock:
+                    self.disk_hits += 1
+                return vector
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, model: str, text: str, vector) -> np.ndarray:
+        key = self.make_key(model, text)
+        vector = np.asarray(vector, dtype=np.float32)
+        vector.flags.writeable = False
+        self._remember(key, vector)
+
+        if self._disk is not None:
+            try:
+                self._disk.set(key, vector.tobytes())
+            except Exception as e:
+                logger.error(f"Query embedding disk cache write failed: {e}")
+        return vector
+
+    def get_or_create(self, model: str, text: str,
+                      embed: Callable[[str], List[float]]) -> np.ndarray:
+        """Return the cached embedding, computing and storing it with ``embed`` on a miss."""
+        vector = self.get(model, text)
+        if vector is None:
+            vector = self.set(model, text, embed(text))
+        return vector
+
+    def _remember(self, key: str, vector: np.ndarray) -> None:
+        with self._lock:
+            self._memory[key] = vector
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+        if self._disk is not None:
+            self._disk.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """Hit/miss counters for monitoring."""
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            return {
+                "hits": hits,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "memory_entries": len(self._memory),
+                "hit_rate": hits / (hits + self.misses) if hits + self.misses else 0.0,
+            }
+
+
+query_embedding_cache = QueryEmbeddingCache(
+    max_entries=getattr(settings, "QUERY_EMBEDDING_CACHE_SIZE", 10000),
+    directory=getattr(settings, "QUERY_EMBEDDING_CACHE_DIR", None),
+)
+
+# Monotonic time until which cache misses fail fast after an API failure
+_unavailable_until = 0.0
+
+
+def embed_query(text: str, model: Optional[str] = None, timeout: Optional[float] = None) -> np.ndarray:
+    """
+    Embed a search query, serving repeats from the query-embedding cache.
+
+    Args:
+        text (str): Query text
+        model (str, optional): Embedding model. Defaults to settings.EMBEDDING_MODEL.
+        timeout (float, optional): Seconds to wait for the API on a cache miss,
+            without retries. Defaults to the client's own timeout and retries.
+
+    Returns:
+        Read-only float32 numpy array
+
+    Raises:
+        EmbeddingUnavailable: The API failed now or within the last
+            QUERY_EMBEDDING_BACKOFF seconds
+    """
+    model = model or settings.EMBEDDING_MODEL
+
+    def _embed(query: str) -> List[float]:
+        global _unavailable_until
+        if time.monotonic() < _unavailable_until:
+            raise EmbeddingUnavailable("embedding API recently failed")
+
+        client = get_embedding_client()
+        if timeout is not None:
+            client = client.with_options(timeout=timeout, max_retries=0)
+        try:
+            response = client.embeddings.create(model=model, input=query)
+        except Exception as e:
+            _unavailable_until = time.monotonic() + settings.QUERY_EMBEDDING_BACKOFF
+            raise EmbeddingUnavailable(f"{type(e).__name__}: {e}") from e
+        return response.data[0].embedding
+
+    return query_embedding_cache.get_or_create(embedding_cache_model(model), text, _embed)
+
+
+class CachedOpenAIEmbeddings(OpenAIEmbeddings):
+    """OpenAIEmbeddings whose ``embed_query`` goes through the shared query cache."""
+
+    def embed_query(self, text: str) -> List[float]:
+        return query_embedding_cache.get_or_create(
+            self.model, text, super().embed_query
+        ).tolist()
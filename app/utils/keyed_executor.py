@@ -0,0 +1,78 @@
+"""
+Background executor that runs tasks sharing a key one at a time, in the
+order they were submitted, while tasks with different keys run in parallel.
+
+Used for per-learner chat post-processing, where the steps for one
+(user, assistant) pair must not interleave but should never delay a
+response stream.
+"""
+import logging
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Hashable
+
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+
+class KeyedExecutor:
+    """
+    Thread pool with per-key serial ordering.
+
+    Each key with queued tasks occupies at most one worker, which drains that
+    key's queue before moving on, so a busy key cannot reorder its tasks and
+    cannot take more than one worker from the others.
+
+    Args:
+        max_workers (int): Keys processed in parallel
+        thread_name_prefix (str, optional): Name prefix of the worker threads
+    """
+
+    def __init__(self, max_workers: int, thread_name_prefix: str = 'keyed'):
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=thread_name_prefix)
+        self._queues: Dict[Hashable, deque] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, key: Hashable, fn: Callable[..., Any], *args, **kwargs) -> Future:
+        """Queue ``fn(*args, **kwargs)`` after every task already queued under ``key``."""
+        future = Future()
+        with self._lock:
+            queue = self._queues.get(key)
+            if queue is None:
+                self._queues[key] = deque([(future, fn, args, kwargs)])
+                self._pool.submit(self._drain, key)
+            else:
+                queue.append((future, fn, args, kwargs))
+        return future
+
+    def pending(self, key: Hashable) -> int:
+        """Tasks queued or running under ``key``."""
+        with self._lock:
+            return len(self._queues.get(key, ()))
+
+    def _drain(self, key: Hashable) -> None:
+        while True:
+            with self._lock:
+                queue = self._queues[key]
+                future, fn, args, kwargs = queue[0]
+
+            if future.set_running_or_notify_cancel():
+                try:
+                    future.set_result(fn(*args, **kwargs))
+                except Exception as e:
+                    logger.error(f"Background task {getattr(fn, '__name__', fn)} for {key} failed: {e}", exc_info=True)
+                    future.set_exception(e)
+                finally:
+                    # Workers are long-lived threads outside the request cycle
+                    close_old_connections()
+
+            with self._lock:
+                queue.popleft()
+                if not queue:
+                    del self._queues[key]
+                    return
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._pool.shutdown(wait=wait)
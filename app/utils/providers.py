@@ -0,0 +1,289 @@
+"""
+Settings-selected LLM and embedding backends.
+
+LLM_PROVIDER and EMBEDDING_PROVIDER name an entry in the registries below.
+'openai' is the production backend. 'stub' runs fully offline for load
+testing and profiling: chat models stream deterministic pseudo-words after
+STUB_LLM_TTFT seconds with STUB_LLM_TOKEN_DELAY seconds between tokens, and
+embeddings are deterministic unit vectors built from hashed words, so
+texts that share words are similar and retrieval still behaves sensibly.
+The stub has no audio model, so voice chat reports an error under it.
+Other backends can be added with ``register_llm_provider``,
+``register_audio_chat_provider`` and ``register_embedding_provider``.
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import random
+import re
+import threading
+import time
+from functools import lru_cache
+from types import SimpleNamespace
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional
+
+import numpy as np
+from django.conf import settings
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from openai import OpenAI
+
+logger = logging.getLogger(__name__)
+
+# Vocabulary of the stub chat model's replies
+STUB_WORDS = (
+    "the a of to and in is for on with as by this that it from at be are or an was which can "
+    "learning concept example answer question topic lesson student teacher study practice review "
+    "explain understand idea method result value function equation theory model data step process "
+    "first second next then finally because therefore however also important key note"
+).split()
+
+
+def _seed(text: str) -> int:
+    return int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+
+
+class StubChatModel(BaseChatModel):
+    """
+    Offline chat model with deterministic output and configurable timing.
+
+    The reply is a sequence of ``tokens`` words seeded by the prompt, so the
+    same prompt always gets the same reply. The first token arrives after
+    ``ttft`` seconds and each further token ``token_delay`` seconds later.
+    """
+
+    model_name: str = "stub"
+    ttft: float = 0.2
+    token_delay: float = 0.02
+    tokens: int = 64
+
+    @property
+    def _llm_type(self) -> str:
+        return "stub"
+
+    def _reply_tokens(self, messages: List[BaseMessage]) -> List[str]:
+        prompt = "\n".join(str(message.content) for message in messages)
+        rng = random.Random(_seed(f"{self.model_name}\n{prompt}"))
+        words = [rng.choice(STUB_WORDS) for _ in range(self.tokens)]
+        return [words[0].capitalize()] + [f" {word}" for word in words[1:-1]] + [f" {words[-1]}."]
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+        tokens = self._reply_tokens(messages)
+        time.sleep(self.ttft + self.token_delay * (len(tokens) - 1))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="".join(tokens)))])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Optional[AsyncCallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+        tokens = self._reply_tokens(messages)
+        await asyncio.sleep(self.ttft + self.token_delay * (len(tokens) - 1))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="".join(tokens)))])
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        for position, token in enumerate(self._reply_tokens(messages)):
+            time.sleep(self.ttft if position == 0 else self.token_delay)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+                       **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        for position, token in enumerate(self._reply_tokens(messages)):
+            await asyncio.sleep(self.ttft if position == 0 else self.token_delay)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                await run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+
+
+@lru_cache(maxsize=65536)
+def _word_vector(word: str, dims: int) -> np.ndarray:
+    return np.random.default_rng(_seed(word)).standard_normal(dims).astype(np.float32)
+
+
+def stub_embedding(text: str, dims: Optional[int] = None) -> List[float]:
+    """Deterministic unit vector for ``text``: the normalized sum of per-word hashed vectors."""
+    dims = dims or settings.EMBEDDING_DIMENSIONS
+    vector = np.zeros(dims, dtype=np.float32)
+    for word in re.findall(r"\w+", text.lower()) or [text]:
+        vector += _word_vector(word, dims)
+    norm = np.linalg.norm(vector)
+    return (vector / norm if norm else vector).tolist()
+
+
+class StubEmbeddingClient:
+    """
+    Offline stand-in for the parts of ``openai.OpenAI`` used for embeddings:
+    ``embeddings.create(model=, input=)`` and ``with_options``. Each request
+    takes STUB_EMBEDDING_DELAY seconds.
+    """
+
+    def __init__(self):
+        self.embeddings = self
+
+    def with_options(self, **kwargs) -> "StubEmbeddingClient":
+        return self
+
+    def create(self, model: str, input, **kwargs):
+        inputs = [input] if isinstance(input, str) else list(input)
+        time.sleep(settings.STUB_EMBEDDING_DELAY)
+        return SimpleNamespace(
+            model=model,
+            data=[SimpleNamespace(index=i, embedding=stub_embedding(text)) for i, text in enumerate(inputs)]
+        )
+
+
+class StubEmbeddings(Embeddings):
+    """LangChain embeddings backed by ``stub_embedding``."""
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [stub_embedding(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return stub_embedding(text)
+
+
+_openai_client = None
+_openai_client_lock = threading.Lock()
+
+
+def get_openai_client() -> OpenAI:
+    """Process-wide OpenAI client, created on first use."""
+    global _openai_client
+    with _openai_client_lock:
+        if _openai_client is None:
+            _openai_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        return _openai_client
+
+
+def _openai_chat_model(model: str, temperature: float, **kwargs) -> BaseChatModel:
+    from langchain_openai import ChatOpenAI
+
+    return ChatOpenAI(
+        api_key=os.getenv("OPENAI_API_KEY"),
+        model=model,
+        temperature=temperature,
+        max_retries=kwargs.pop('max_retries', 3),
+        **kwargs
+    )
+
+
+def _stub_chat_model(model: str, temperature: float, **kwargs) -> BaseChatModel:
+    return StubChatModel(
+        model_name=model,
+        ttft=settings.STUB_LLM_TTFT,
+        token_delay=settings.STUB_LLM_TOKEN_DELAY,
+        tokens=settings.STUB_LLM_TOKENS
+    )
+
+
+def _openai_embeddings() -> Embeddings:
+    # Query embeddings share the process-wide query cache
+    from app.utils.embedding_cache import CachedOpenAIEmbeddings
+
+    return CachedOpenAIEmbeddings(model=settings.EMBEDDING_MODEL)
+
+
+_stub_embedding_client = StubEmbeddingClient()
+
+LLM_PROVIDERS: Dict[str, Callable[..., BaseChatModel]] = {
+    'openai': _openai_chat_model,
+    'stub': _stub_chat_model,
+}
+
+# name -> factory of an OpenAI-style client for audio-in/audio-out chat completions.
+# Providers without an entry (the stub) do not support voice chat.
+AUDIO_CHAT_PROVIDERS: Dict[str, Callable[[], Any]] = {
+    'openai': get_openai_client,
+}
+
+# name -> (raw embeddings client factory, LangChain embeddings factory)
+EMBEDDING_PROVIDERS: Dict[str, tuple] = {
+    'openai': (get_openai_client, _openai_embeddings),
+    'stub': (lambda: _stub_embedding_client, StubEmbeddings),
+}
+
+
+def register_llm_provider(name: str, factory: Callable[..., BaseChatModel]) -> None:
+    """Add a chat backend; ``factory(model, temperature, **kwargs)`` returns a LangChain chat model."""
+    LLM_PROVIDERS[name] = factory
+
+
+def register_audio_chat_provider(name: str, client_factory: Callable[[], Any]) -> None:
+    """Add a voice backend; ``client_factory()`` returns a client with OpenAI-style ``chat.completions.create``."""
+    AUDIO_CHAT_PROVIDERS[name] = client_factory
+
+
+def register_embedding_provider(name: str, client_factory: Callable[[], Any],
+                                embeddings_factory: Callable[[], Embeddings]) -> None:
+    """
+    Add an embedding backend.
+
+    Args:
+        name: Value of EMBEDDING_PROVIDER selecting it
+        client_factory: Returns an object with OpenAI-style ``embeddings.create`` and ``with_options``
+        embeddings_factory: Returns LangChain ``Embeddings``
+    """
+    EMBEDDING_PROVIDERS[name] = (client_factory, embeddings_factory)
+
+
+def _lookup(registry: Dict[str, Any], name: str, setting: str):
+    try:
+        return registry[name]
+    except KeyError:
+        raise ValueError(f"Unknown {setting} '{name}'; expected one of {', '.join(sorted(registry))}")
+
+
+def get_chat_model(model: Optional[str] = None, temperature: float = 0.5, **kwargs) -> BaseChatModel:
+    """
+    Chat model from the LLM_PROVIDER backend.
+
+    Args:
+        model (str, optional): Model name. Defaults to settings.LLM_MODEL.
+        temperature (float, optional): Sampling temperature. Defaults to 0.5.
+    """
+    factory = _lookup(LLM_PROVIDERS, settings.LLM_PROVIDER, 'LLM_PROVIDER')
+    return factory(model or settings.LLM_MODEL, temperature, **kwargs)
+
+
+def get_audio_chat_client():
+    """
+    Client for audio chat completions from the LLM_PROVIDER backend.
+
+    Raises:
+        ValueError: The backend has no audio support
+    """
+    client_factory = AUDIO_CHAT_PROVIDERS.get(settings.LLM_PROVIDER)
+    if client_factory is None:
+        raise ValueError(f"LLM_PROVIDER '{settings.LLM_PROVIDER}' does not support voice chat")
+    return client_factory()
+
+
+def get_embedding_client():
+    """OpenAI-style embeddings client from the EMBEDDING_PROVIDER backend."""
+    client_factory, _ = _lookup(EMBEDDING_PROVIDERS, settings.EMBEDDING_PROVIDER, 'EMBEDDING_PROVIDER')
+    return client_factory()
+
+
+def get_embeddings() -> Embeddings:
+    """LangChain embeddings from the EMBEDDING_PROVIDER backend."""
+    _, embeddings_factory = _lookup(EMBEDDING_PROVIDERS, settings.EMBEDDING_PROVIDER, 'EMBEDDING_PROVIDER')
+    return embeddings_factory()
+
+
+def embedding_cache_model(model: Optional[str] = None) -> str:
+    """
+    Model name embeddings are cached under. Non-OpenAI providers get their
+    own namespace so stub vectors never mix with real ones in shared caches.
+    """
+    model = model or settings.EMBEDDING_MODEL
+    if settings.EMBEDDING_PROVIDER == 'openai':
+        return model
+    return f"{settings.EMBEDDING_PROVIDER}:{model}"
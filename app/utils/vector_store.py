@@ -1,22 +1,20 @@
-import os
 from langchain_community.vectorstores import SupabaseVectorStore
-from langchain_openai import OpenAIEmbeddings
+from app.utils.providers import get_embeddings
 from app.configs.supabase_config import SUPABASE_CLIENT
 # from langchain_community.document_loaders import TextLoader
 from langchain.docstore.document import Document
-from langchain_community.document_loaders import PyPDFLoader
 from langchain_text_splitters import CharacterTextSplitter
+from users.chunking import get_chunker
+from users.pdf_extraction import iter_pdf_pages
 from app.utils.supabase_methods import supabase_methods
 from app.modals.chat import get_llm
 from langchain.chains import ConversationalRetrievalChain
 import PyPDF2
 import uuid
 
-api_key = os.getenv("OPENAI_API_KEY")
-if not api_key:
-    raise EnvironmentError("OPENAI_API_KEY not found in environment variables")
-
-embeddings = OpenAIEmbeddings()
+# Embedding backend from settings.EMBEDDING_PROVIDER; the OpenAI backend shares the
+# query cache with the chat and voice paths. A missing OPENAI_API_KEY surfaces on first use.
+embeddings = get_embeddings()
 vector_store = SupabaseVectorStore(
     embedding=embeddings,
     client=SUPABASE_CLIENT,
@@ -32,18 +30,22 @@ vector_store = SupabaseVectorStore(
 #         self.metadata = metadata or {}
 
 def get_split_documents(file_path, user_id, ass_id):
-    # Use PyPDFLoader to extract text from the PDF
-    loader = PyPDFLoader(file_path)
-    pages = loader.load_and_split()
-    
-    # Wrap each page in a Document object with metadata
-    docs = [Document(page_content=page.page_content, metadata={
+    # Extract pages in parallel and split them with the shared token chunker
+    chunker = get_chunker()
+    chunks = [
+        chunk
+        for _, page_text in iter_pdf_pages(file_path)
+        for chunk, _ in chunker.split(page_text)
+    ]
+
+    # Wrap each chunk in a Document object with metadata
+    docs = [Document(page_content=chunk, metadata={
         "source": file_path,
         "id": str(uuid.uuid4()),
         "user_id": str(user_id),
         "ass_id": str(ass_id),
         "page_number": i + 1
-    }) for i, page in enumerate(pages)]
+    }) for i, chunk in enumerate(chunks)]
     
     return docs
 
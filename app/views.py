@@ -34,8 +34,7 @@ from app.utils.vector_store import (
     get_answer, 
     is_valid_uuid
 )
-from assistantchat.models import Conversation, QuizAttempt, Quiz, Question
-from assistantchat.views import get_history
+from assistantchat.models import Conversation, QuizAttempt, Quiz, Question, KnowledgeAssessment
 from users.models import Assistant, AssistantRating, Subject, Topic
 from users.add import populate_subjects_and_topics
 
@@ -373,11 +372,7 @@ def assistant_detail(request, assistant_id: Optional[str] = None):
         total_quizzes = len(quiz_attempts)
         
         # Get knowledge level
-        chat_history, keys = get_history(assistant_id=assistant_id, user_id=user_id)
-        knowledge_level = next(
-            (entry["knowledge_level"] for entry in chat_history if "summary" in entry),
-            "Beginner"
-        )
+        knowledge_level = KnowledgeAssessment.level_for(user_id, assistant_id).capitalize() if user_id else "Beginner"
         
         # Calculate grade for display
         grade = "F"
@@ -469,12 +464,8 @@ def quiz_result_modal(request, assistant_id):
     total_score = sum([attempt.calculate_score() for attempt in quiz_attempts])
     avg_score = round(total_score / total_attempts, 2) if total_attempts > 0 else 0
     
-    # Get knowledge level from chat history
-    chat_history, keys = get_history(assistant_id=assistant_id, user_id=user_id)
-    knowledge_level = next(
-        (entry["knowledge_level"] for entry in chat_history if "summary" in entry),
-        "Beginner"
-    )
+    # Get the stored knowledge level
+    knowledge_level = KnowledgeAssessment.level_for(user_id, assistant_id).capitalize() if user_id else "Beginner"
     
     # Calculate grade based on percentage correct
     grade = "F"
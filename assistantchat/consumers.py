@@ -1,9 +1,6 @@
 import json
 from channels.generic.websocket import AsyncWebsocketConsumer
-from langchain_openai import ChatOpenAI
-import os
 import base64
-from openai import OpenAI
 import requests
 from dotenv import load_dotenv
 from .utils import ChatModule
@@ -13,22 +10,13 @@ from django.contrib.auth.models import User
 from typing import Optional
 from asgiref.sync import sync_to_async
 from .views import save_history
+from app.utils.providers import get_audio_chat_client, get_chat_model
 
 
 load_dotenv()
 
 def get_llm(model):
-    api_key = os.getenv("OPENAI_API_KEY")
-
-
-    return ChatOpenAI(
-        api_key=api_key,
-        model=model,
-        temperature=0.5,
-        max_retries=3
-    )
-
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    return get_chat_model(model, temperature=0.5)
 
 chat_module = ChatModule()
 
@@ -120,7 +108,7 @@ class VoiceAssistantConsumer(AsyncWebsocketConsumer):
 
         print(f"\n\n Assistant Config Data: {assistant_config_data}\n\n")
 
-        chat_history = await get_history_async(assistant_id=assistant_id, user_id=user_id)
+        chat_history, _ = await get_history_async(assistant_id=assistant_id, user_id=user_id)
         print(f"Chat history in Consumers: {chat_history}")
 
         chat_summary = next(
@@ -186,6 +174,8 @@ class VoiceAssistantConsumer(AsyncWebsocketConsumer):
         """
 
         try:
+            # Created on first use, so the app boots without an API key under the stub provider
+            client = get_audio_chat_client()
             completion = client.chat.completions.create(
                 model=self.MODEL_NAME,
                 modalities=["text", "audio"],
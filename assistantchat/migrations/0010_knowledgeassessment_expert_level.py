@@ -0,0 +1,18 @@
+# Generated by Django 5.1.3 on 2026-10-18 15:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('assistantchat', '0009_quiz_question_quizattempt_questionattempt'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='knowledgeassessment',
+            name='knowledge_level',
+            field=models.CharField(choices=[('unassessed', 'Unassessed'), ('beginner', 'Beginner'), ('intermediate', 'Intermediate'), ('advanced', 'Advanced'), ('expert', 'Expert')], default='unassessed', max_length=20),
+        ),
+    ]
@@ -1,6 +1,11 @@
 from django.db import models, transaction
+from django.conf import settings
 from users.models import SupabaseUser, Assistant
 from django.contrib.auth.models import User
+from collections import OrderedDict
+from typing import Optional
+import threading
+import time
 import uuid
 import logging
 # Create your models here.
@@ -121,10 +126,63 @@ class AssistantNotes(models.Model):
 
 
 
+class KnowledgeLevelCache:
+    """
+    Bounded in-process cache of learners' knowledge levels, keyed by
+    (user id, assistant id). Entries expire after ``ttl`` seconds so levels
+    recorded by other processes are picked up.
+    """
+
+    def __init__(self, max_entries: int = 10000, ttl: float = 300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._levels: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id, assistant_id) -> Optional[str]:
+        key = (str(user_id), str(assistant_id))
+        with self._lock:
+            entry = self._levels.get(key)
+            if entry is None:
+                return None
+            level, stored_at = entry
+            if time.monotonic() - stored_at > self.ttl:
+                del self._levels[key]
+                return None
+            self._levels.move_to_end(key)
+            return level
+
+    def set(self, user_id, assistant_id, level: str) -> None:
+        key = (str(user_id), str(assistant_id))
+        with self._lock:
+            self._levels[key] = (level, time.monotonic())
+            self._levels.move_to_end(key)
+            while len(self._levels) > self.max_entries:
+                self._levels.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._levels.clear()
+
+
+knowledge_level_cache = KnowledgeLevelCache(
+    max_entries=settings.KNOWLEDGE_LEVEL_CACHE_SIZE,
+    ttl=settings.KNOWLEDGE_LEVEL_CACHE_TTL
+)
+
+
 class KnowledgeAssessment(models.Model):
     """
     Model to store user knowledge assessments for different assistants and subjects
+
+    The chat reads a learner's level with ``level_for`` (cached in process)
+    on every message; the level itself is only recomputed at checkpoints,
+    when the chat window is offloaded or a quiz is completed, via ``record``.
     """
+
+    LEVELS = ('beginner', 'intermediate', 'advanced', 'expert')
+    DEFAULT_LEVEL = 'beginner'
+
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='knowledge_assessments')
     assistant = models.ForeignKey(Assistant, on_delete=models.CASCADE, related_name='knowledge_assessments')
     
@@ -139,7 +197,8 @@ class KnowledgeAssessment(models.Model):
             ('unassessed', 'Unassessed'),
             ('beginner', 'Beginner'),
             ('intermediate', 'Intermediate'), 
-            ('advanced', 'Advanced')
+            ('advanced', 'Advanced'),
+            ('expert', 'Expert')
         ],
         default='unassessed'
     )
@@ -181,6 +240,75 @@ class KnowledgeAssessment(models.Model):
             self.user_answers = answers
         self.save()
 
+    @classmethod
+    def parse_level(cls, text: str) -> Optional[str]:
+        """First knowledge level named in an LLM answer, or None."""
+        text = text.lower()
+        found = [(text.find(level), level) for level in cls.LEVELS if level in text]
+        return min(found)[1] if found else None
+
+    @classmethod
+    def level_from_score(cls, percentage: float) -> str:
+        """Knowledge level implied by a quiz score in percent."""
+        if percentage >= 90:
+            return 'expert'
+        if percentage >= 75:
+            return 'advanced'
+        if percentage >= 50:
+            return 'intermediate'
+        return 'beginner'
+
+    @classmethod
+    def level_for(cls, user_id, assistant_id) -> str:
+        """
+        Learner's stored knowledge level for an assistant, DEFAULT_LEVEL when
+        never assessed. Served from ``knowledge_level_cache`` when possible.
+        """
+        level = knowledge_level_cache.get(user_id, assistant_id)
+        if level is None:
+            level = cls.objects.filter(
+                user_id=user_id,
+                assistant_id=assistant_id
+            ).exclude(knowledge_level='unassessed').order_by('-updated_at').values_list(
+                'knowledge_level', flat=True
+            ).first() or cls.DEFAULT_LEVEL
+            knowledge_level_cache.set(user_id, assistant_id, level)
+        return level
+
+    @classmethod
+    def is_assessed(cls, user_id, assistant_id) -> bool:
+        return cls.objects.filter(
+            user_id=user_id,
+            assistant_id=assistant_id
+        ).exclude(knowledge_level='unassessed').exists()
+
+    @classmethod
+    def record(cls, user_id, assistant_id, knowledge_level: str, score=None, insights=None) -> "KnowledgeAssessment":
+        """
+        Store a learner's new knowledge level for an assistant and refresh the cache.
+
+        Args:
+            user_id: Learner's user id
+            assistant_id: Assistant id
+            knowledge_level (str): One of LEVELS
+            score (float, optional): Quiz score in percent behind the level
+            insights (str, optional): Why the level was assigned
+        """
+        if knowledge_level not in cls.LEVELS:
+            raise ValueError(f"Unknown knowledge level: {knowledge_level}")
+
+        assistant = Assistant.objects.get(id=assistant_id)
+        assessment, _ = cls.objects.get_or_create(
+            user_id=user_id,
+            assistant=assistant,
+            subject=(assistant.subject or '')[:100],
+            topic=(assistant.topic or '')[:100]
+        )
+        assessment.update_assessment(knowledge_level, score=score, insights=insights)
+        knowledge_level_cache.set(user_id, assistant_id, knowledge_level)
+        logger.info(f"Knowledge level of user {user_id} for assistant {assistant_id}: {knowledge_level}")
+        return assessment
+
 
 
 class Quiz(models.Model):
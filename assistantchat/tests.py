@@ -1,3 +1,95 @@
-from django.test import TestCase
+import threading
+import time
+from unittest import mock
 
-# Create your tests here.
+from django.test import SimpleTestCase
+
+from app.utils.keyed_executor import KeyedExecutor
+from .models import KnowledgeAssessment
+
+
+class KnowledgeLevelTests(SimpleTestCase):
+    def test_parse_level_takes_the_first_level_named(self):
+        self.assertEqual(KnowledgeAssessment.parse_level("Intermediate"), 'intermediate')
+        self.assertEqual(
+            KnowledgeAssessment.parse_level("The learner is ADVANCED, not yet an expert."), 'advanced'
+        )
+        self.assertEqual(
+            KnowledgeAssessment.parse_level("Level: beginner (could become intermediate soon)"), 'beginner'
+        )
+
+    def test_parse_level_without_a_level(self):
+        self.assertIsNone(KnowledgeAssessment.parse_level("Not enough information to tell."))
+        self.assertIsNone(KnowledgeAssessment.parse_level(""))
+
+    def test_level_from_score_thresholds(self):
+        cases = [
+            (0, 'beginner'), (49.9, 'beginner'), (50, 'intermediate'), (74.9, 'intermediate'),
+            (75, 'advanced'), (89.9, 'advanced'), (90, 'expert'), (100, 'expert'),
+        ]
+        for score, level in cases:
+            with self.subTest(score=score):
+                self.assertEqual(KnowledgeAssessment.level_from_score(score), level)
+        self.assertTrue(set(level for _, level in cases) <= set(KnowledgeAssessment.LEVELS))
+
+
+@mock.patch('app.utils.keyed_executor.close_old_connections')
+class KeyedExecutorTests(SimpleTestCase):
+    def setUp(self):
+        self.executor = KeyedExecutor(max_workers=4, thread_name_prefix='test-keyed')
+        self.addCleanup(self.executor.shutdown)
+        self.lock = threading.Lock()
+        self.calls = []
+
+    def record(self, key, number, delay=0.0):
+        time.sleep(delay)
+        with self.lock:
+            self.calls.append((key, number))
+        return number
+
+    def test_tasks_of_a_key_run_in_submission_order(self, close_old_connections):
+        futures = [
+            self.executor.submit(key, self.record, key, number, delay=0.01 if number % 2 else 0.0)
+            for number in range(10)
+            for key in ('a', 'b', 'c')
+        ]
+        self.assertEqual([future.result(timeout=5) for future in futures], [n for n in range(10) for _ in 'abc'])
+
+        for key in ('a', 'b', 'c'):
+            self.assertEqual([number for k, number in self.calls if k == key], list(range(10)))
+        # Connections are closed after each result is set, so wait for the workers
+        self.executor.shutdown()
+        self.assertEqual(close_old_connections.call_count, 30)
+
+    def test_tasks_of_a_key_never_overlap(self, close_old_connections):
+        running = []
+
+        def task(number):
+            with self.lock:
+                running.append(number)
+                concurrent = len(running)
+            time.sleep(0.005)
+            with self.lock:
+                running.remove(number)
+            return concurrent
+
+        futures = [self.executor.submit('same', task, number) for number in range(8)]
+        self.assertEqual([future.result(timeout=5) for future in futures], [1] * 8)
+
+    def test_keys_run_in_parallel(self, close_old_connections):
+        started = threading.Barrier(2, timeout=5)
+        futures = [self.executor.submit(key, started.wait) for key in ('a', 'b')]
+        for future in futures:
+            future.result(timeout=5)
+
+    def test_failure_does_not_stop_the_queue(self, close_old_connections):
+        def fail():
+            raise ValueError("boom")
+
+        with self.assertLogs('app.utils.keyed_executor', level='ERROR'):
+            failed = self.executor.submit('a', fail)
+            after = self.executor.submit('a', self.record, 'a', 1)
+            self.assertEqual(after.result(timeout=5), 1)
+        self.assertIsInstance(failed.exception(timeout=5), ValueError)
+        self.executor.shutdown()
+        self.assertEqual(self.executor.pending('a'), 0)
@@ -1,4 +1,4 @@
-from typing import List, Dict, Optional, Any, Generator
+from typing import List, Dict, Optional, Any, AsyncIterator, Generator
 from langchain_core.output_parsers import StrOutputParser, JsonOutputParser
 from langchain_core.prompts import (
     ChatPromptTemplate, 
@@ -10,16 +10,20 @@ from langchain_core.prompts import (
 )
 from langchain_core.messages import HumanMessage, SystemMessage, AIMessage
 from langgraph.store.memory import InMemoryStore
+from asgiref.sync import sync_to_async
 
+import asyncio
 import logging
+import time
 import uuid
 from django.db.models import Q
+from django.conf import settings
 import json
 
 from django.contrib.auth.models import User
 
 from app.modals.chat import get_llm
-from .models import Conversation
+from .models import Conversation, KnowledgeAssessment, knowledge_level_cache
 from users.models import Assistant, DocumentChunk
 
 # Set up logging
@@ -247,8 +251,13 @@ class ChatModule:
                 "error": f"Analysis failed: {str(e)}"
             }
 
-    def assess_user_knowledge(self, messages: Optional[list]=None) -> str:
-        """Assess user's knowledge level with improved error handling."""
+    def assess_user_knowledge(self, messages: Optional[list]=None) -> Optional[str]:
+        """
+        Assess user's knowledge level with an LLM call.
+
+        Returns:
+            One of KnowledgeAssessment.LEVELS, or None when the assessment failed
+        """
         try:
 
             # Join messages to provide full context
@@ -262,22 +271,43 @@ class ChatModule:
             ])
             
             chain = assessment_prompt | self.llm | StrOutputParser()
-            knowledge_level = chain.invoke(combined_messages).strip().lower()
             
             # Validate knowledge level
-            valid_levels = ['Beginner', 'Intermediate', 'Advanced', 'Expert']
-            knowledge_level = knowledge_level if knowledge_level in valid_levels else 'Beginner'
-            
-            
-        
+            knowledge_level = KnowledgeAssessment.parse_level(chain.invoke(combined_messages))
+            if knowledge_level is None:
+                logger.warning("Knowledge assessment did not name a level")
             return knowledge_level
             
         except Exception as e:
             logger.error(f"Error in knowledge assessment: {str(e)}", exc_info=True)
-            return 'beginner'
+            return None
+
+    def update_knowledge_level(self, user_id: str, assistant_id: str, messages: list) -> str:
+        """
+        Checkpoint: reassess the learner from ``messages`` and store the level
+        in KnowledgeAssessment. Keeps the stored level when the assessment fails.
+
+        Returns:
+            The learner's current level
+        """
+        knowledge_level = self.assess_user_knowledge(messages)
+        if knowledge_level is None:
+            return KnowledgeAssessment.level_for(user_id, assistant_id)
+        try:
+            KnowledgeAssessment.record(user_id, assistant_id, knowledge_level)
+        except Exception as e:
+            logger.error(f"Error storing knowledge level: {e}")
+        return knowledge_level
     
-    def get_relevant_context(self, query: str, assistant_id: str, k: int = 3) -> str:
-        """Retrieve relevant context from the DocumentChunk model based on similarity search."""
+    def get_relevant_context(self, query: str, assistant_id: str, k: int = 3,
+                             max_tokens: Optional[int] = None) -> str:
+        """
+        Retrieve relevant context from the DocumentChunk model based on similarity search.
+
+        Chunks are added best first until ``max_tokens`` (default
+        settings.CONTEXT_TOKEN_BUDGET) would be exceeded, using the token
+        counts stored at ingestion.
+        """
         try:
             # Step 1: Call the similarity_search class method from DocumentChunk
             # doc_id = PDFDocument.objects.filter(assistant_id=assistant_id)
@@ -298,13 +328,22 @@ class ChatModule:
                         'page_number': chunk.page_number,
                         'document': chunk.document,
                         'chunk_content': chunk.content,
+                        # Chunks ingested before token counts were stored get a rough estimate
+                        'token_count': chunk.token_count or len(chunk.content) // 4,
                         'similarity_score': similarity_score
                     }
                     for chunk, similarity_score in results
                 ]
             
-            # Step 3: Extract and combine the content of the top-k relevant chunks
-            context = "\n".join([chunk['chunk_content'] for chunk in relevant_chunks])
+            # Step 3: Combine the top-k relevant chunks within the prompt token budget
+            budget = max_tokens or settings.CONTEXT_TOKEN_BUDGET
+            selected, used_tokens = [], 0
+            for chunk in relevant_chunks:
+                if selected and used_tokens + chunk['token_count'] > budget:
+                    break
+                selected.append(chunk['chunk_content'])
+                used_tokens += chunk['token_count']
+            context = "\n".join(selected)
             
             return context if context else "No relevant context found."
         
@@ -312,6 +351,16 @@ class ChatModule:
             logger.error(f"Error retrieving relevant context: {e}")
             return "Error retrieving context."
 
+    async def aget_relevant_context(self, query: str, assistant_id: str, k: int = 3,
+                                    max_tokens: Optional[int] = None) -> str:
+        """
+        Async ``get_relevant_context``. The query embedding and the database
+        read are blocking, so they run in a worker thread off the event loop.
+        """
+        return await sync_to_async(self.get_relevant_context, thread_sensitive=False)(
+            query, assistant_id, k=k, max_tokens=max_tokens
+        )
+
     def save_chat_history(self, user_id: str, assistant_id: str, 
                          messages: list) -> None:
         """Save chat interaction to Django model."""
@@ -386,84 +435,137 @@ class ChatModule:
             logger.error(f"Error retrieving chat history: {e}")
             return []
 
+    def _create_rag_chain(self, prompt: str, assistant_config: dict, chat_history, context: str, knowledge_level: str):
+        """RAG answer chain over the retrieved context, the chat summary and the learner's knowledge level."""
+        # Create contextual RAG prompt
+        rag_prompt = self._create_contextual_rag_prompt(
+            assistant_config=assistant_config, 
+            has_chat_history=chat_history,
+            prompt=prompt
+            )
+
+        chat_summary = next(
+            (entry["summary"] for entry in chat_history if "summary" in entry),
+            "No summary available. Use chat history only to generate chat summary."
+        )
+
+        logger.info(f"chat_summary in process_message: {chat_summary}")
+
+        # Prepare input for RAG chain
+        def prepare_rag_input(input_prompt):
+            return {
+                "context": context,
+                "question": prompt,
+                "chat_summary": chat_summary,
+                "subject": assistant_config.get("subject", ""),
+                "instructions": assistant_config.get("teacher_instructions", ""),
+                "knowledge_level": knowledge_level,
+            }
+        # Generate the response
+        return (
+            prepare_rag_input
+            | rag_prompt
+            | self.llm
+            | StrOutputParser()
+        )
+
     def process_message(self, prompt: str, assistant_id: str, user_id: str, assistant_config: dict, chat_history) -> Generator[Any, Any, Any]:
         """Process message with LangGraph memory integration."""
         try:
             logger.info(f"chat_history in process_message: {chat_history}")
-            
-            # Create a unique key for user-assistant knowledge tracking
-            user_assistant_key = f"{user_id}_{assistant_id}"
                     
             # Retrieve context
             context = self.get_relevant_context(prompt, assistant_id)
-            
-            # Create contextual RAG prompt
-            rag_prompt = self._create_contextual_rag_prompt(
-                assistant_config=assistant_config, 
-                has_chat_history=chat_history,
-                prompt=prompt
-                )
 
-            # Check if user's knowledge level is already assessed for this specific assistant
-            # user_knowledge = self.user_knowledge_levels.get(user_assistant_key, {})
+            knowledge_level = KnowledgeAssessment.level_for(user_id, assistant_id)
 
+            rag_chain = self._create_rag_chain(prompt, assistant_config, chat_history, context, knowledge_level)
+            response = rag_chain.stream(prompt)
 
-            knowledge_level = self.assess_user_knowledge(messages=chat_history)
+            return response
+            
+        except Exception as e:
+            logger.error(f"Error processing message: {e}")
+            return "I apologize, but I encountered an error processing your message. Please try again."
 
-            chat_summary = next(
-                (entry["summary"] for entry in chat_history if "summary" in entry),
-                "No summary available. Use chat history only to generate chat summary."
-            )
+    def _last_knowledge_level(self, chat_history) -> str:
+        """Knowledge level saved in the chat window, for when the stored level is not available in time."""
+        return next(
+            (entry["knowledge_level"] for entry in reversed(chat_history)
+             if entry.get("knowledge_level") in KnowledgeAssessment.LEVELS),
+            KnowledgeAssessment.DEFAULT_LEVEL
+        )
+
+    async def aget_knowledge_level(self, user_id: str, assistant_id: str) -> str:
+        """Learner's stored knowledge level; only a cache miss leaves the event loop."""
+        level = knowledge_level_cache.get(user_id, assistant_id)
+        if level is None:
+            level = await sync_to_async(KnowledgeAssessment.level_for, thread_sensitive=False)(user_id, assistant_id)
+        return level
+
+    async def _within_budget(self, step: str, task: asyncio.Future, timeout: float, timings: dict):
+        """
+        Await ``task`` for at most ``timeout`` seconds without cancelling it.
 
-            logger.info(f"chat_summary in process_message: {chat_summary}")
+        Returns:
+            (result, True), or (None, False) when the budget was missed
+        """
+        started = time.perf_counter()
+        try:
+            result = await asyncio.wait_for(asyncio.shield(task), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"{step} missed its {timeout}s budget")
+            timings[step] = 'timeout'
+            return None, False
+        timings[f"{step}_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        return result, True
+
+    async def aprocess_message(self, prompt: str, assistant_id: str, user_id: str, assistant_config: dict,
+                               chat_history, timings: Optional[dict] = None) -> AsyncIterator[str]:
+        """
+        Async ``process_message``: yields the answer chunks from ``astream`` so
+        a waiting stream holds a coroutine rather than a thread.
 
+        Context retrieval and the learner's stored knowledge level are fetched
+        concurrently, each within its CHAT_*_TIMEOUT budget. A late level
+        falls back to the one saved in the chat window.
 
-            # # If no prior assessment or knowledge level is unassessed
-            # if (not user_knowledge or 
-            #     user_knowledge.get('knowledge_level') == 'unassessed' or 
-            #     user_knowledge.get('assistant_id') != assistant_id):
-                
-            #     # Conduct knowledge assessment for this specific assistant
-            #     assessment_result = self.assess_user_knowledge(assistant_config, user_assistant_key)
-            #     logger.info(f"The result of assessment: {assessment_result}")
-                
-            #     # If assessment generated questions, return them
-            #     if 'diagnostic_questions' in assessment_result:
-            #         return json.dumps({
-            #             'type': 'knowledge_assessment',
-            #             'data': assessment_result
-            #         })
-            # Prepare input for RAG chain
-            def prepare_rag_input(input_prompt):
-                return {
-                    "context": context,
-                    "question": prompt,
-                    "chat_summary": chat_summary,
-                    "subject": assistant_config.get("subject", ""),
-                    "instructions": assistant_config.get("teacher_instructions", ""),
-                    "knowledge_level": knowledge_level,
-                    # "diagnostic_questions": json.dumps(user_knowledge.get('diagnostic_questions', [])),
-                    # "assessment_context": json.dumps(user_knowledge.get('assessment_context', {}))
-                }
-            # Generate the response
-            rag_chain = (
-                prepare_rag_input
-                | rag_prompt
-                | self.llm
-                | StrOutputParser()
-            )
-            response = rag_chain.stream(prompt)
+        Args:
+            timings (dict, optional): Filled with per-step durations in ms and
+                the outcome of each step, for reporting
+        """
+        timings = timings if timings is not None else {}
+        try:
+            logger.info(f"chat_history in aprocess_message: {chat_history}")
+            started = time.perf_counter()
+
+            context_task = asyncio.ensure_future(self.aget_relevant_context(prompt, assistant_id))
+            steps = [self._within_budget('context', context_task, settings.CHAT_CONTEXT_TIMEOUT, timings)]
+            if settings.CHAT_ASSESSMENT_TIMEOUT > 0:
+                level_task = asyncio.ensure_future(self.aget_knowledge_level(user_id, assistant_id))
+                steps.append(self._within_budget('assessment', level_task, settings.CHAT_ASSESSMENT_TIMEOUT, timings))
+            else:
+                timings['assessment'] = 'skipped'
 
-            # full_response = ""
-            # for chunk in response:
-            #     full_response += chunk
-            #     yield chunk
+            (context, has_context), *assessment = await asyncio.gather(*steps)
+            if not has_context:
+                context = "No relevant context found."
+
+            if assessment and assessment[0][1]:
+                knowledge_level = assessment[0][0]
+                timings['assessment'] = 'stored'
+            else:
+                knowledge_level = self._last_knowledge_level(chat_history)
+                timings.setdefault('assessment', 'last_known')
+            timings['pre_generation_ms'] = round((time.perf_counter() - started) * 1000, 1)
+
+            rag_chain = self._create_rag_chain(prompt, assistant_config, chat_history, context, knowledge_level)
+            async for chunk in rag_chain.astream(prompt):
+                yield chunk
 
-            return response
-            
         except Exception as e:
             logger.error(f"Error processing message: {e}")
-            return "I apologize, but I encountered an error processing your message. Please try again."
+            yield "I apologize, but I encountered an error processing your message. Please try again."
         
     def clear_chat_history(self, assistant_id: str, user_id: str, 
                           conversation_id: Optional[uuid.UUID] = None) -> bool:
@@ -9,10 +9,12 @@ import json
 import logging
 import uuid
 from users.models import Assistant, SupabaseUser, AssistantRating
-from .models import AssistantNotes,Quiz, QuestionAttempt, Question, QuizAttempt
+from .models import AssistantNotes,Quiz, QuestionAttempt, Question, QuizAttempt, KnowledgeAssessment
 from .utils import ChatModule
 from django.contrib.auth.models import User
 from django.contrib.auth.decorators import login_required
+from asgiref.sync import sync_to_async
+from django.conf import settings
 import os
 from langgraph.store.memory import InMemoryStore
 from PIL import Image
@@ -20,7 +22,9 @@ import pytesseract
 from PyPDF2 import PdfReader
 from django.shortcuts import render, get_object_or_404, redirect
 from app.modals.chat import get_llm
+from app.utils.keyed_executor import KeyedExecutor
 from langchain_core.messages import HumanMessage
+import threading
 import time
 import sys
 import re
@@ -38,13 +42,90 @@ MAX_MEMORY_SIZE = 20  # Maximum allowed entries in memory
 
 chat_module = ChatModule()
 
+# Guards memory_store, which request threads, the event loop and post-processing share
+history_lock = threading.Lock()
+
+# Runs post_process_history off the response path, in order for each (user, assistant)
+post_processing_executor = KeyedExecutor(
+    max_workers=settings.CHAT_POST_PROCESSING_WORKERS,
+    thread_name_prefix='chat-post-processing'
+)
+
+def _extract_upload_text(uploaded_file):
+    """
+    Text of an uploaded image (OCR) or PDF for ``chat_query``.
+
+    Returns:
+        (text, error): the extracted text, or an error message for the client
+    """
+    # Validate file size (20MB limit)
+    MAX_FILE_SIZE = 20 * 1024 * 1024
+    if uploaded_file.size > MAX_FILE_SIZE:
+        return None, "File size exceeds 20MB limit"
+
+    file_extension = uploaded_file.name.split('.')[-1].lower()
+
+    try:
+        # Process image files
+        if file_extension in ['jpg', 'jpeg', 'png']:
+            try:
+                image = Image.open(uploaded_file)
+                # Convert to RGB if necessary
+                if image.mode not in ('L', 'RGB'):
+                    image = image.convert('RGB')
+                
+                extracted_text = pytesseract.image_to_string(image)
+                if not extracted_text.strip():
+                    return None, "No text could be extracted from the image"
+                    
+                return f"\nExtracted from image: {extracted_text}", None
+                
+            except Exception as e:
+                return None, f"Error processing image: {str(e)}"
+        
+        
+        # Process PDF files
+        elif file_extension == 'pdf':
+            try:
+                pdf_reader = PdfReader(uploaded_file)
+                extracted_text = ''
+                
+                # Extract text from all pages
+                for page in pdf_reader.pages:
+                    page_text = page.extract_text()
+                    if page_text:
+                        extracted_text += page_text + "\n"
+                
+                if not extracted_text.strip():
+                    return None, "No text could be extracted from the PDF"
+                    
+                return f"\nExtracted from PDF: {extracted_text}", None
+                
+            except Exception as e:
+                return None, f"Error processing PDF: {str(e)}"
+
+    except Exception as e:
+        return None, f"Unexpected error: {str(e)}"
+
+    return "", None
+
+
 @login_required(login_url='accounts/login/')
 @csrf_exempt
 @require_http_methods(["POST", "OPTIONS", "GET"])
-def chat_query(request, ass_id=None):
+async def chat_query(request, ass_id=None):
     """
     Endpoint to process chat queries using LangGraph's memory store.
+
+    Runs natively under ASGI: the answer is streamed from the chain's
+    ``astream`` through an async generator, and blocking work (ORM, OCR,
+    retrieval, history offload) runs in worker threads, so a stream waiting
+    on the LLM costs a coroutine instead of a thread.
+
+    The final frame reports ``ttftMs``, the time from receiving the request
+    to the first answer chunk, and ``timings`` of the pre-generation steps.
     """
+    started = time.perf_counter()
     try:
         # Parse request body
         data = json.loads(request.body)
@@ -55,75 +136,20 @@ def chat_query(request, ass_id=None):
         if not prompt:
             return StreamingHttpResponse("Prompt is required", content_type='text/plain')
 
-        if not request.user.is_authenticated:
+        user = await request.auser()
+        if not user.is_authenticated:
             return StreamingHttpResponse("User not authenticated", content_type='text/plain')
 
-        
-        logger.info(f"we got instance of memorystore: {memory_store.list_namespaces(prefix=("chat", "21"))}")
-
         # Handle file uploads (images, PDFs)
         if 'file' in request.FILES:
-            uploaded_file = request.FILES['file']
-            # Validate file size (20MB limit)
-            MAX_FILE_SIZE = 20 * 1024 * 1024
-            if uploaded_file.size > MAX_FILE_SIZE:
-                error_message = "File size exceeds 20MB limit"
-                return JsonResponse({'status': 'error', 'message': error_message})
-            
-
-            file_extension = uploaded_file.name.split('.')[-1].lower()
-
-            try:
-                # Process image files
-                if file_extension in ['jpg', 'jpeg', 'png']:
-                    try:
-                        image = Image.open(uploaded_file)
-                        # Convert to RGB if necessary
-                        if image.mode not in ('L', 'RGB'):
-                            image = image.convert('RGB')
-                        
-                        extracted_text = pytesseract.image_to_string(image)
-                        if not extracted_text.strip():
-                            error_message = "No text could be extracted from the image"
-                            return JsonResponse({'status': 'error', 'message': error_message})
-                            
-                        prompt += f"\nExtracted from image: {extracted_text}"
-                        
-                    except Exception as e:
-                        error_message = f"Error processing image: {str(e)}"
-                        return JsonResponse({'status': 'error', 'message': error_message})
-                
-                
-                # Process PDF files
-                elif file_extension == 'pdf':
-                    try:
-                        pdf_reader = PdfReader(uploaded_file)
-                        extracted_text = ''
-                        
-                        # Extract text from all pages
-                        for page in pdf_reader.pages:
-                            page_text = page.extract_text()
-                            if page_text:
-                                extracted_text += page_text + "\n"
-                        
-                        if not extracted_text.strip():
-                            error_message = "No text could be extracted from the PDF"
-                            return JsonResponse({'status': 'error', 'message': error_message})
-                            
-                        prompt += f"\nExtracted from PDF: {extracted_text}"
-                        
-                    except Exception as e:
-                        error_message = f"Error processing PDF: {str(e)}"
-                        return JsonResponse({'status': 'error', 'message': error_message})
-
-            except Exception as e:
-                error_message = f"Unexpected error: {str(e)}"
+            extracted_text, error_message = await sync_to_async(_extract_upload_text, thread_sensitive=False)(
+                request.FILES['file']
+            )
+            if error_message:
                 return JsonResponse({'status': 'error', 'message': error_message})
-
-
+            prompt += extracted_text
 
         # Get user and assistant details
-        user = User.objects.get(id=request.user.id)
         user_id = str(user.id)
 
         logger.info(f"User_id: {user_id}")
@@ -131,39 +157,41 @@ def chat_query(request, ass_id=None):
         if not assistant_id:
             return StreamingHttpResponse("Assistant ID is required", content_type='text/plain')
 
-        assistant = Assistant.objects.get(id=assistant_id)
+        assistant = await Assistant.objects.aget(id=assistant_id)
 
 
-        chat_history, keys = get_history(assistant_id=assistant_id, user_id=user_id)
+        # get_history takes history_lock, which post-processing threads also hold, so it runs off the event loop
+        chat_history, keys = await sync_to_async(get_history, thread_sensitive=False)(
+            assistant_id=assistant_id, user_id=user_id
+        )
 
-        has_reviewed = AssistantRating.objects.filter(user=request.user, assistant=assistant).exists()
+        has_reviewed = await AssistantRating.objects.filter(user=user, assistant=assistant).aexists()
         show_review = len(chat_history) >= 1 and not has_reviewed
 
-        # Define assistant configuration
-        # assistant_config = {
-        #     "subject": assistant.subject,
-        #     "topic": assistant.topic,
-        #     "teacher_instructions": assistant.teacher_instructions,
-        #     "user_name": user.first_name,
-        #     "prompt_instructions": mermaid_instructions
-        # }
+        config = await sync_to_async(assistant_config, thread_sensitive=False)(
+            assistant_id=assistant_id, user_id=user_id
+        )
 
         # Process the message with chat history
-        response = chat_module.process_message(
+        timings = {}
+        response = chat_module.aprocess_message(
             prompt=prompt,
             assistant_id=str(assistant.id),
-            user_id=str(user),
-            assistant_config=assistant_config(assistant_id=assistant_id, user_id=user_id),
-            chat_history=chat_history
+            user_id=user_id,
+            assistant_config=config,
+            chat_history=chat_history,
+            timings=timings
         )
 
-        logger.info(f"Response: {response}")
-
-        def response_stream():
+        async def response_stream():
             full_response = ""
+            ttft_ms = None
             try:
-                for chunk in response:
+                async for chunk in response:
                     if chunk:
+                        if ttft_ms is None:
+                            ttft_ms = round((time.perf_counter() - started) * 1000, 1)
+                            logger.info(f"Time to first token: {ttft_ms} ms, {timings}")
                         full_response += chunk
                         
                         logger.info(f"streaming chunks: {chunk}\n")
@@ -175,14 +203,17 @@ def chat_query(request, ass_id=None):
                         }
                         yield f"data: {json.dumps(data)}\n\n"
                 
-                # Save history after all chunks processed
-                save_history(assistant_id, user_id, prompt, full_response)
+                # Save history after all chunks processed; offloading and checkpoints run in the background.
+                # It takes history_lock, so it runs off the event loop.
+                await sync_to_async(save_history, thread_sensitive=False)(assistant_id, user_id, prompt, full_response)
                 
                 # Final event
                 yield f"data: {json.dumps({
                     'text': '',
                     'showReview': show_review,
-                    'isLastChunk': True
+                    'isLastChunk': True,
+                    'ttftMs': ttft_ms,
+                    'timings': timings
                 })}\n\n"
                 
             except Exception as e:
@@ -496,6 +527,7 @@ def quiz_view(request, assistant_id):
         # Calculate the percentage of correct answers
         total_questions = quiz_attempt.questionattempt_set.count()
         correct_percentage = (quiz_attempt.total_correct / total_questions) * 100 if total_questions > 0 else 0
+        record_quiz_knowledge_level(quiz_attempt)
 
         # Redirect to the quiz result page
         return render(request, 'quiz_result.html', {
@@ -544,6 +576,7 @@ def check_answer(request, question_id):
         quiz_attempt.completed_at = timezone.now()
         quiz_attempt.total_correct = quiz_attempt.questionattempt_set.filter(is_correct=True).count()
         quiz_attempt.save()
+        record_quiz_knowledge_level(quiz_attempt)
         
         return render(request, 'quiz_result.html', {
             'attempt': quiz_attempt
@@ -552,6 +585,23 @@ def check_answer(request, question_id):
 
 # Helper Functions
 
+def record_quiz_knowledge_level(quiz_attempt):
+    """Checkpoint: store the knowledge level implied by a completed quiz."""
+    if not quiz_attempt.questionattempt_set.exists():
+        return
+    score = quiz_attempt.calculate_score()
+    try:
+        KnowledgeAssessment.record(
+            quiz_attempt.user_id_id,
+            quiz_attempt.assistant_id_id,
+            KnowledgeAssessment.level_from_score(score),
+            score=round(score, 2),
+            insights=f"Quiz {quiz_attempt.quiz_id}: {quiz_attempt.total_correct} correct ({score:.0f}%)"
+        )
+    except Exception as e:
+        logger.error(f"Error storing quiz knowledge level: {e}")
+
+
 def generate_study_guide(messages):
     study_guide_prompt = f"""
     Create educational study notes that focus on learning and retention:
@@ -662,14 +712,16 @@ def generate_quiz_questions(
 def get_history(assistant_id, user_id):
     # Define the namespace
         namespace = ("chat", user_id, assistant_id)
-        print(f"Fetching chat history from namespace: {namespace}")  # Debugging
+        logger.debug(f"Fetching chat history from namespace: {namespace}")
 
 
 
         count = 0
         # Retrieve all keys and values in the namespace
         try:
-            items = memory_store.search(namespace)  # Retrieve all items in namespace
+            # The window can grow past MAX_MEMORY_SIZE while its offload is queued
+            with history_lock:
+                items = memory_store.search(namespace, limit=MAX_MEMORY_SIZE * 10)  # Retrieve all items in namespace
             items.sort(key=lambda x: x.key)  # Ensure items are ordered by keys
             chat_history = [item.value for item in items]  # Extract chat data
             keys = [item.key for item in items]  # Extract keys
@@ -677,15 +729,11 @@ def get_history(assistant_id, user_id):
             return chat_history, keys
         except Exception as e:
             logger.error(f"Error retrieving keys: {e}")
-            chat_history, keys = [], []
-
-# Save chat history to memory
-def save_history(assistant_id, user_id, prompt, full_response):
-
-    namespace = ("chat", user_id, assistant_id)
+            return [], []
 
-    chat_history, keys = get_history(assistant_id, user_id)
 
+def _window_state(chat_history):
+    """Current chat summary and knowledge level saved in a chat window."""
     chat_summary = next(
             (entry["summary"] for entry in chat_history if "summary" in entry),
             "No summary available. Use chat history only to generate chat summary."
@@ -694,16 +742,69 @@ def save_history(assistant_id, user_id, prompt, full_response):
         (entry["knowledge_level"] for entry in chat_history if "knowledge_level" in entry),
         "No knowledge level available. Use chat history only to generate assessment."
     )
+    return chat_summary, knowledge_level
+
+
+def _needs_post_processing(chat_history, knowledge_level):
+    # Levels are only recomputed at checkpoints, see KnowledgeAssessment
+    has_level = knowledge_level in KnowledgeAssessment.LEVELS
+    return len(chat_history) >= MAX_MEMORY_SIZE or (
+        not has_level and len(chat_history) >= settings.KNOWLEDGE_ASSESSMENT_FIRST_MESSAGES
+    )
+
+
+# Save chat history to memory
+def save_history(assistant_id, user_id, prompt, full_response):
+    """
+    Append an exchange to the in-memory chat window. Only touches memory, so
+    it is cheap enough for the end of a response stream; offloading and
+    checkpoints are queued for ``post_process_history``.
+    """
+    namespace = ("chat", user_id, assistant_id)
 
-    # Add the new user message to memory
-    next_key = f"chat-{len(keys)}"
-    new_entry = {"User": prompt, "AI": "", "summary": chat_summary}  # Placeholder for assistant response
-    memory_store.put(namespace, next_key, new_entry)
+    chat_history, keys = get_history(assistant_id, user_id)
+    chat_summary, knowledge_level = _window_state(chat_history)
+
+    # Zero-padded, increasing keys keep the window in order after offloads
+    next_index = int(keys[-1].rsplit('-', 1)[-1]) + 1 if keys else 0
+    next_key = f"chat-{next_index:06d}"
+    new_entry = {
+        "User": prompt,
+        "AI": full_response,
+        "summary": chat_summary,
+        "knowledge_level": knowledge_level
+    }
+
+    # Save the current interaction in memory
+    try:
+        with history_lock:
+            memory_store.put(namespace, next_key, new_entry)
+    except Exception as e:
+        logger.error(f"Error saving chat memory: {e}")
+        return
     chat_history.append(new_entry)
-    keys.append(next_key)
+
+    if _needs_post_processing(chat_history, knowledge_level):
+        post_processing_executor.submit((user_id, assistant_id), post_process_history, assistant_id, user_id)
+
+
+def post_process_history(assistant_id, user_id):
+    """
+    Background part of ``save_history``, run one task at a time per
+    (user, assistant) by ``post_processing_executor``: offload the oldest
+    messages of a full window to the database with a new summary, and store
+    knowledge level checkpoints.
+    """
+    namespace = ("chat", user_id, assistant_id)
+
+    chat_history, keys = get_history(assistant_id, user_id)
+    chat_summary, knowledge_level = _window_state(chat_history)
+    if not _needs_post_processing(chat_history, knowledge_level):
+        # An earlier queued task already handled it
+        return
 
     # Dynamically apply sliding window logic if memory exceeds MAX_MEMORY_SIZE
-    if len(chat_history) >= 20:
+    if len(chat_history) >= MAX_MEMORY_SIZE:
 
         oldest_keys = keys[:10]
         # Offload the oldest 10 messages to the database
@@ -713,29 +814,34 @@ def save_history(assistant_id, user_id, prompt, full_response):
 
         logger.info(f"\n\nCurrent sumamry : {chat_summary}\n\n")
 
-        chat_summary = chat_module.analyze_chat_history(offloaded_messages, chat_summary)
-
-        knowledge_level = chat_module.assess_user_knowledge(offloaded_messages)
+        summary = chat_module.analyze_chat_history(offloaded_messages, chat_summary)
+        if isinstance(summary, str):
+            chat_summary = summary
 
+        knowledge_level = chat_module.update_knowledge_level(user_id, assistant_id, chat_history)
 
         # **Delete old messages using BaseStore.delete()**
-        for key in oldest_keys:
-            memory_store.delete(namespace, key)
+        with history_lock:
+            for key in oldest_keys:
+                memory_store.delete(namespace, key)
 
-    # Save the current interaction in memory
-    try:
-        key = f"chat-{len(memory_store.search(namespace))}"
-        memory_store.put(namespace, next_key, {
-            "User": prompt,
-            "AI": full_response,
-            "summary": chat_summary,
-            "knowledge_level": knowledge_level
-            }
-        )
-
-        # logger.info(f"Saved memory: namespace={namespace}, key={key}, data={{'user': '{prompt}', 'assistant': '{full_response}', 'summary': '{chat_summary}'}}")
-    except Exception as e:
-        logger.error(f"Error saving chat memory: {e}")
+    else:
+        # First assessment of a new learner, unless one was stored earlier (e.g. by a quiz)
+        if KnowledgeAssessment.is_assessed(user_id, assistant_id):
+            knowledge_level = KnowledgeAssessment.level_for(user_id, assistant_id)
+        else:
+            knowledge_level = chat_module.update_knowledge_level(user_id, assistant_id, chat_history)
+
+    # Later messages read the summary and level from the window. Re-read it:
+    # save_history may have appended messages during the LLM calls above.
+    with history_lock:
+        items = memory_store.search(namespace, limit=MAX_MEMORY_SIZE * 10)
+        for item in items:
+            memory_store.put(namespace, item.key, {
+                **item.value,
+                "summary": chat_summary,
+                "knowledge_level": knowledge_level
+            })
 
 # Get assistant config
 def assistant_config(assistant_id, user_id):
@@ -1,9 +1,13 @@
 from django.contrib import admin
-from .models import Assistant, PDFDocument
+from .models import Assistant, PDFDocument, IngestionJob, EmbeddingCacheEntry
 
 # Register your models here.
 admin.site.register(Assistant)
 
 admin.site.register(PDFDocument)
+
+admin.site.register(IngestionJob)
+
+admin.site.register(EmbeddingCacheEntry)
 # admin.site.register(AnonConvo)
 
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class DemoConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'users'
+
+    def ready(self):
+        # Register retrieval index invalidation hooks
+        from . import signals  # noqa: F401
@@ -0,0 +1,235 @@
+"""
+Synthetic knowledge bases and a deterministic fake embedder for retrieval
+benchmarks.
+
+Chunk text is drawn from a fixed vocabulary split into topics, and the fake
+embedding of a text is the normalized sum of fixed random word vectors, so
+texts that share words are similar. Vector, full-text and hybrid search
+get realistic work without calls to the embedding API, and the same seed
+always produces the same corpus and queries.
+"""
+import hashlib
+import re
+import subprocess
+import time
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+from django.conf import settings
+from django.test.utils import override_settings
+
+from .vector_index import AssistantIndex, IVFLists, Prefilter, assign_clusters, normalize_rows, spherical_kmeans
+
+# In-process index layouts that can be built straight from a matrix
+INDEX_MODES = ('flat', 'prefilter', 'ivf')
+
+
+class SyntheticCorpus:
+    """
+    Deterministic synthetic corpus.
+
+    Args:
+        dims (int): Embedding dimensions
+        topics (int, optional): Number of topics; each chunk mostly uses the words of one
+        vocabulary_size (int, optional): Number of distinct words
+        words_per_chunk (int, optional): Words in each chunk
+        seed (int, optional): Seed for word vectors, chunks and queries
+    """
+
+    # Share of a chunk's words drawn from its topic rather than the whole vocabulary
+    TOPIC_SHARE = 0.8
+    # Chunks generated per block; blocks are seeded by position so any size is reproducible
+    BLOCK_ROWS = 4096
+
+    def __init__(self, dims: int, topics: int = 100, vocabulary_size: int = 5000,
+                 words_per_chunk: int = 60, seed: int = 0):
+        self.dims = dims
+        self.words_per_chunk = words_per_chunk
+        self.seed = seed
+
+        rng = np.random.default_rng(seed)
+        self.word_vectors = rng.standard_normal((vocabulary_size, dims)).astype(np.float32)
+        self.words = [f"term{i:05d}" for i in range(vocabulary_size)]
+        self._word_index = {word: i for i, word in enumerate(self.words)}
+
+        topic_size = max(1, vocabulary_size // topics)
+        self.topic_words = rng.permutation(vocabulary_size)[:topics * topic_size].reshape(topics, topic_size)
+
+    def _sample_words(self, rng: np.random.Generator, count: int, length: int) -> np.ndarray:
+        topics, topic_size = self.topic_words.shape
+        chunk_topics = rng.integers(0, topics, count)
+        topic_ids = self.topic_words[chunk_topics[:, None], rng.integers(0, topic_size, (count, length))]
+        other_ids = rng.integers(0, len(self.words), (count, length))
+        return np.where(rng.random((count, length)) < self.TOPIC_SHARE, topic_ids, other_ids)
+
+    def embed_word_ids(self, word_ids: np.ndarray) -> np.ndarray:
+        """Normalized fake embeddings of rows of word ids."""
+        matrix = np.zeros((len(word_ids), self.dims), dtype=np.float32)
+        for column in range(word_ids.shape[1]):
+            matrix += self.word_vectors[word_ids[:, column]]
+        return normalize_rows(matrix)
+
+    def text(self, word_ids: Sequence[int]) -> str:
+        return " ".join(self.words[i] for i in word_ids)
+
+    def embed_text(self, text: str) -> List[float]:
+        """Fake embedding of arbitrary text; unknown words get a vector seeded by their hash."""
+        vector = np.zeros(self.dims, dtype=np.float32)
+        for word in re.findall(r"\w+", text.lower()):
+            index = self._word_index.get(word)
+            if index is not None:
+                vector += self.word_vectors[index]
+            else:
+                seed = int.from_bytes(hashlib.sha256(word.encode("utf-8")).digest()[:8], "little")
+                vector += np.random.default_rng(seed).standard_normal(self.dims).astype(np.float32)
+        return normalize_rows(vector[None, :])[0].tolist()
+
+    def iter_chunks(self, size: int) -> Iterator[Tuple[int, np.ndarray, np.ndarray]]:
+        """Yield ``(start, word_ids, embeddings)`` blocks covering ``size`` chunks."""
+        for start in range(0, size, self.BLOCK_ROWS):
+            count = min(self.BLOCK_ROWS, size - start)
+            rng = np.random.default_rng([self.seed, start])
+            word_ids = self._sample_words(rng, count, self.words_per_chunk)
+            yield start, word_ids, self.embed_word_ids(word_ids)
+
+    def embeddings(self, size: int) -> np.ndarray:
+        """Normalized embeddings of the first ``size`` chunks as one float32 matrix."""
+        matrix = np.empty((size, self.dims), dtype=np.float32)
+        for start, _, block in self.iter_chunks(size):
+            matrix[start:start + len(block)] = block
+        return matrix
+
+    def queries(self, count: int, words: int = 6) -> Tuple[List[str], np.ndarray]:
+        """Short topical queries and their fake embeddings."""
+        rng = np.random.default_rng([self.seed, 2 ** 32 - 1])
+        word_ids = self._sample_words(rng, count, words)
+        return [self.text(row) for row in word_ids], self.embed_word_ids(word_ids)
+
+
+def build_index(matrix: np.ndarray, mode: str) -> AssistantIndex:
+    """
+    Build an in-process index over normalized ``matrix`` rows (chunk ids are
+    row numbers) the way ingestion would for a large assistant.
+
+    Args:
+        matrix: Normalized embeddings
+        mode: 'flat' (exact scan), 'prefilter' (reduced-dimension first stage,
+            forced on regardless of VECTOR_PREFILTER_MIN_CHUNKS) or 'ivf'
+            (k-means lists with the VECTOR_IVF_* training settings)
+    """
+    chunk_ids = np.arange(len(matrix), dtype=np.int64)
+    if mode == 'flat':
+        return AssistantIndex(chunk_ids, matrix)
+
+    if mode == 'prefilter':
+        prefilter_mode = settings.VECTOR_PREFILTER if settings.VECTOR_PREFILTER != 'off' else 'pca'
+        with override_settings(VECTOR_PREFILTER=prefilter_mode, VECTOR_PREFILTER_MIN_CHUNKS=0):
+            return AssistantIndex(chunk_ids, matrix, prefilter=Prefilter.fit(matrix))
+
+    if mode == 'ivf':
+        clusters = max(1, min(len(matrix), settings.VECTOR_IVF_CLUSTERS or int(np.sqrt(len(matrix)))))
+        sample_size = min(len(matrix), clusters * settings.VECTOR_IVF_TRAIN_SAMPLE_PER_CLUSTER)
+        sample = matrix[np.sort(np.random.default_rng(0).choice(len(matrix), sample_size, replace=False))]
+        centroids = spherical_kmeans(sample, clusters, iterations=settings.VECTOR_IVF_TRAIN_ITERATIONS)
+        chunk_ids, grouped, ivf = IVFLists.group(chunk_ids, matrix, assign_clusters(matrix, centroids), centroids)
+        return AssistantIndex(chunk_ids, grouped, ivf=ivf)
+
+    raise ValueError(f"Unknown index mode: {mode}")
+
+
+def read_rss_mb(pid='self') -> Optional[float]:
+    """Current resident set size of process ``pid`` in MiB from /proc, or None when it cannot be read."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        return None
+    return None
+
+
+def rss_delta_mb(before: Optional[float]) -> Optional[float]:
+    """RSS growth of this process since ``before`` (a read_rss_mb value), rounded."""
+    after = read_rss_mb()
+    if before is None or after is None:
+        return None
+    return round(after - before, 1)
+
+
+def time_queries(search: Callable[[int], object], count: int, warmup: int = 0) -> Dict[str, object]:
+    """
+    Run ``search(i)`` for ``i`` in ``range(count)`` and summarize the latencies.
+
+    Returns:
+        Dict with p50/p95/p99/mean latency in milliseconds and queries per second
+    """
+    for i in range(min(warmup, count)):
+        search(i)
+
+    latencies = np.empty(count)
+    started = time.perf_counter()
+    for i in range(count):
+        query_started = time.perf_counter()
+        search(i)
+        latencies[i] = time.perf_counter() - query_started
+    elapsed = time.perf_counter() - started
+
+    return {
+        'latency_ms': latency_summary(latencies),
+        'qps': round(count / elapsed, 1) if elapsed else None,
+    }
+
+
+def latency_summary(seconds: Sequence[float]) -> Optional[Dict[str, float]]:
+    """p50/p95/p99/mean/max in milliseconds of durations given in seconds, or None when empty."""
+    milliseconds = np.asarray(seconds, dtype=np.float64) * 1000
+    if not len(milliseconds):
+        return None
+    p50, p95, p99 = np.percentile(milliseconds, [50, 95, 99])
+    return {
+        'p50': round(float(p50), 3),
+        'p95': round(float(p95), 3),
+        'p99': round(float(p99), 3),
+        'mean': round(float(milliseconds.mean()), 3),
+        'max': round(float(milliseconds.max()), 3),
+    }
+
+
+def git_commit() -> Optional[str]:
+    """Short hash of the checked-out commit, recorded in reports for regression comparison."""
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=settings.BASE_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def exact_top_k(matrix: np.ndarray, queries: np.ndarray, k: int, block_rows: int = 256) -> np.ndarray:
+    """Row numbers of the exact ``k`` nearest rows for each normalized query, best first."""
+    k = min(k, len(matrix))
+    neighbours = np.empty((len(queries), k), dtype=np.int64)
+    for start in range(0, len(queries), block_rows):
+        scores = queries[start:start + block_rows] @ matrix.T
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        order = np.argsort(-np.take_along_axis(scores, top, axis=1), axis=1)
+        neighbours[start:start + len(scores)] = np.take_along_axis(top, order, axis=1)
+    return neighbours
+
+
+def recall_at_k(found: Sequence[int], exact: Sequence[int]) -> float:
+    """Share of the exact top-k that the approximate search returned."""
+    return len(set(found) & set(exact)) / len(exact) if len(exact) else 1.0
+
+
+def ndcg_at_k(found_gains: np.ndarray, ideal_gains: np.ndarray) -> float:
+    """
+    nDCG of an approximate ranking. Gains are exact cosine similarities to
+    the query: of the rows returned, in order, and of the exact top-k.
+    """
+    discounts = 1.0 / np.log2(np.arange(2, len(ideal_gains) + 2))
+    ideal = float(np.sum(np.asarray(ideal_gains) * discounts))
+    gained = float(np.sum(np.asarray(found_gains) * discounts[:len(found_gains)]))
+    return gained / ideal if ideal > 0 else 0.0
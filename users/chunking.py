@@ -0,0 +1,45 @@
+"""
+Token-based chunking shared by PDF, web and YouTube ingestion.
+
+Text is split recursively on paragraph, line and word boundaries with
+tiktoken lengths, so every chunk is close to CHUNK_TARGET_TOKENS tokens
+with CHUNK_OVERLAP_TOKENS of overlap regardless of source. Each chunk's
+token count is returned alongside it so it can be stored and used for
+prompt budgeting without re-tokenizing at request time.
+"""
+import logging
+from functools import lru_cache
+from typing import List, Optional, Tuple
+
+from django.conf import settings
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+from .ingestion import get_encoding
+
+logger = logging.getLogger(__name__)
+
+
+class TokenChunker:
+    """Recursive splitter measuring length in tokens of the embedding model's encoding."""
+
+    def __init__(self, target_tokens: int, overlap_tokens: int, model: Optional[str] = None):
+        self.encoding = get_encoding(model or settings.EMBEDDING_MODEL)
+        self.splitter = RecursiveCharacterTextSplitter(
+            chunk_size=target_tokens,
+            chunk_overlap=overlap_tokens,
+            length_function=self.count_tokens,
+            separators=["\n\n", "\n", ". ", " ", ""]
+        )
+
+    def count_tokens(self, text: str) -> int:
+        return len(self.encoding.encode(text, disallowed_special=()))
+
+    def split(self, text: str) -> List[Tuple[str, int]]:
+        """Split ``text`` into ``(chunk, token_count)`` pairs."""
+        return [(chunk, self.count_tokens(chunk)) for chunk in self.splitter.split_text(text)]
+
+
+@lru_cache(maxsize=None)
+def get_chunker() -> TokenChunker:
+    """Chunker configured from CHUNK_TARGET_TOKENS and CHUNK_OVERLAP_TOKENS."""
+    return TokenChunker(settings.CHUNK_TARGET_TOKENS, settings.CHUNK_OVERLAP_TOKENS)
@@ -0,0 +1,89 @@
+"""
+Compact binary encoding of chunk embeddings.
+
+Vectors are stored in a bytea column either as little-endian float16
+(2 bytes per dimension) or as int8 with a per-vector scale (1 byte per
+dimension), instead of a double-precision array (8 bytes per dimension plus
+per-element overhead). Decoding is a single ``np.frombuffer`` over the
+concatenated blobs, so no Python float objects are created.
+"""
+from typing import Optional, Sequence, Tuple
+
+import numpy as np
+
+FLOAT16 = 'f16'
+INT8 = 'i8'
+
+CODECS = {
+    'float16': FLOAT16,
+    'int8': INT8,
+}
+
+_DTYPES = {
+    FLOAT16: np.dtype('<f2'),
+    INT8: np.dtype('i1'),
+}
+
+
+def encode_embedding(vector, codec: str = FLOAT16) -> Tuple[bytes, str, Optional[float]]:
+    """
+    Encode one embedding.
+
+    Returns:
+        ``(blob, codec, scale)``; ``scale`` is None for float16
+    """
+    vector = np.asarray(vector, dtype=np.float32)
+
+    if codec == INT8:
+        peak = float(np.abs(vector).max()) if vector.size else 0.0
+        scale = peak / 127.0 if peak else 1.0
+        quantized = np.clip(np.rint(vector / scale), -127, 127).astype(_DTYPES[INT8])
+        return quantized.tobytes(), INT8, scale
+
+    return vector.astype(_DTYPES[FLOAT16]).tobytes(), FLOAT16, None
+
+
+def decode_embedding(blob, codec: str, scale: Optional[float] = None) -> np.ndarray:
+    """Decode one embedding to a float32 array."""
+    vector = np.frombuffer(blob, dtype=_DTYPES[codec]).astype(np.float32)
+    if codec == INT8:
+        vector *= scale
+    return vector
+
+
+def decode_matrix(blobs: Sequence, codecs: Sequence[str], scales: Sequence[Optional[float]]) -> np.ndarray:
+    """
+    Decode many equally sized embeddings into one float32 matrix.
+
+    Blobs of each codec are concatenated and reinterpreted with one
+    ``np.frombuffer`` call; int8 rows are rescaled with a broadcast multiply.
+    """
+    if not blobs:
+        return np.empty((0, 0), dtype=np.float32)
+
+    codecs = np.asarray(codecs)
+    matrix = None
+    for codec in np.unique(codecs):
+        rows = np.flatnonzero(codecs == codec)
+        raw = np.frombuffer(b"".join(blobs[i] for i in rows), dtype=_DTYPES[codec])
+        block = raw.reshape(len(rows), -1).astype(np.float32)
+        if codec == INT8:
+            block *= np.asarray([scales[i] for i in rows], dtype=np.float32)[:, None]
+
+        if matrix is None:
+            matrix = np.empty((len(blobs), block.shape[1]), dtype=np.float32)
+        matrix[rows] = block
+    return matrix
+
+
+def quantize_matrix(matrix: np.ndarray, codec: str) -> np.ndarray:
+    """
+    Round-trip every row of ``matrix`` through ``codec`` at once, giving the
+    float32 values search would see after storage. Used to evaluate codecs.
+    """
+    matrix = np.asarray(matrix, dtype=np.float32)
+    if codec == INT8:
+        scales = np.abs(matrix).max(axis=1, keepdims=True) / 127.0
+        scales[scales == 0] = 1.0
+        return np.clip(np.rint(matrix / scales), -127, 127).astype(_DTYPES[INT8]).astype(np.float32) * scales
+    return matrix.astype(_DTYPES[codec]).astype(np.float32)
@@ -0,0 +1,253 @@
+"""
+Embedding stage for knowledge-base ingestion.
+
+Chunks are packed into token-budgeted batches, a bounded number of batches
+are embedded in parallel, and rate-limited requests are retried with jittered
+exponential backoff. Chunks are identified by a SHA-256 content hash so
+identical text, within or across documents and assistants, is embedded once.
+"""
+import hashlib
+import logging
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from collections import Counter
+from typing import Callable, Dict, List, Optional, Sequence
+
+import openai
+import tiktoken
+from django.conf import settings
+
+from app.utils.providers import get_embedding_client
+
+logger = logging.getLogger(__name__)
+
+# Maximum tokens a single input may have for the OpenAI embedding models
+MAX_INPUT_TOKENS = 8191
+
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.InternalServerError,
+)
+
+
+def get_encoding(model: str):
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+
+def content_hash(text: str) -> str:
+    """SHA-256 hex digest of chunk text, the key embeddings are shared under."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def file_hash(path: str, block_size: int = 1024 * 1024) -> str:
+    """SHA-256 hex digest of a file's bytes, read in blocks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _retry_delay(attempt: int, error: Exception) -> float:
+    """Full-jitter exponential backoff, honouring Retry-After when the API sends one."""
+    response = getattr(error, "response", None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    if retry_after:
+        try:
+            return float(retry_after) + random.uniform(0, 1)
+        except ValueError:
+            pass
+    cap = settings.EMBEDDING_RETRY_MAX_DELAY
+    return random.uniform(0, min(cap, settings.EMBEDDING_RETRY_BASE_DELAY * 2 ** attempt))
+
+
+def _embed_batch(inputs: List[str], model: str) -> List[List[float]]:
+    # Retries are handled here so backoff is jittered across concurrent batches
+    client = get_embedding_client().with_options(max_retries=0)
+    attempts = settings.EMBEDDING_MAX_RETRIES
+
+    for attempt in range(attempts + 1):
+        try:
+            response = client.embeddings.create(model=model, input=inputs)
+            return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+        except RETRYABLE_ERRORS as e:
+            if attempt == attempts:
+                raise
+            delay = _retry_delay(attempt, e)
+            logger.warning(
+                f"Embedding batch of {len(inputs)} failed ({type(e).__name__}); "
+                f"retry {attempt + 1}/{attempts} in {delay:.1f}s"
+            )
+            time.sleep(delay)
+
+
+class EmbeddingPipeline:
+    """
+    Incremental embedding stage.
+
+    Chunks are added as they are produced; each time the pending chunks fill
+    a token-budgeted batch it is submitted to a bounded thread pool, so
+    embedding overlaps with extraction and chunking. ``finish`` returns all
+    embeddings in the order the chunks were added.
+
+    Chunks are keyed by content hash: repeats within the run are embedded
+    once, and ``lookup`` (hashes -> {hash: embedding}) is consulted in groups
+    of ``lookup_batch_size`` so previously stored embeddings are reused
+    instead of requested again. ``store`` receives each batch's new
+    embeddings as it completes, so a retried run keeps finished batches.
+    """
+
+    def __init__(self, model: Optional[str] = None, max_workers: Optional[int] = None,
+                 progress: Optional[Callable[[int], None]] = None,
+                 lookup: Optional[Callable[[List[str]], Dict[str, List[float]]]] = None,
+                 lookup_batch_size: int = 256,
+                 store: Optional[Callable[[Dict[str, List[float]]], None]] = None):
+        self.model = model or settings.EMBEDDING_MODEL
+        self.encoding = get_encoding(self.model)
+        self.progress = progress
+        self.lookup = lookup
+        self.lookup_batch_size = lookup_batch_size
+        self.store = store
+        self.max_tokens = settings.EMBEDDING_BATCH_MAX_TOKENS
+        self.max_inputs = settings.EMBEDDING_BATCH_MAX_INPUTS
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers or settings.EMBEDDING_MAX_CONCURRENCY
+        )
+        # Content hash of every chunk added, in order
+        self.hashes: List[str] = []
+        self.reused = 0
+        self._seen = set()
+        self._vectors: Dict[str, List[float]] = {}
+        self._unresolved = []
+        self._batches = []
+        self._pending = []
+        self._pending_tokens = 0
+
+    def _prepare(self, text: str):
+        """Return the API input for ``text`` (truncated to the model limit) and its token count."""
+        text = text or " "
+        tokens = self.encoding.encode(text, disallowed_special=())
+        if len(tokens) > MAX_INPUT_TOKENS:
+            logger.warning(f"Truncating chunk of {len(tokens)} tokens to {MAX_INPUT_TOKENS} for embedding")
+            tokens = tokens[:MAX_INPUT_TOKENS]
+            text = self.encoding.decode(tokens)
+        return text, len(tokens)
+
+    def add(self, texts: Sequence[str]) -> None:
+        for text in texts:
+            chunk_hash = content_hash(text)
+            self.hashes.append(chunk_hash)
+            if chunk_hash in self._seen:
+                continue
+            self._seen.add(chunk_hash)
+            self._unresolved.append((chunk_hash, text))
+
+        if len(self._unresolved) >= self.lookup_batch_size:
+            self._resolve()
+
+    def _resolve(self) -> None:
+        """Reuse stored embeddings for unresolved chunks and queue the rest for the API."""
+        if not self._unresolved:
+            return
+
+        found = {}
+        if self.lookup:
+            try:
+                found = self.lookup([chunk_hash for chunk_hash, _ in self._unresolved])
+            except Exception as e:
+                logger.error(f"Embedding reuse lookup failed: {e}")
+        for chunk_hash, text in self._unresolved:
+            if chunk_hash in found:
+                self._vectors[chunk_hash] = found[chunk_hash]
+                self.reused += 1
+            else:
+                self._queue(chunk_hash, text)
+        self._unresolved = []
+
+    def _queue(self, chunk_hash: str, text: str) -> None:
+        api_input, token_count = self._prepare(text)
+        if self._pending and (
+            self._pending_tokens + token_count > self.max_tokens
+            or len(self._pending) >= self.max_inputs
+        ):
+            self._submit()
+        self._pending.append((chunk_hash, api_input))
+        self._pending_tokens += token_count
+
+    def _submit(self) -> None:
+        future = self._executor.submit(
+            _embed_batch, [api_input for _, api_input in self._pending], self.model
+        )
+        self._batches.append((future, [chunk_hash for chunk_hash, _ in self._pending]))
+        self._pending, self._pending_tokens = [], 0
+
+    def finish(self) -> List[List[float]]:
+        """Embed any remaining chunks and wait for every batch."""
+        self._resolve()
+        if self._pending:
+            self._submit()
+        logger.info(
+            f"Embedding {len(self.hashes)} chunks: {self.reused} reused, "
+            f"{len(self._seen) - self.reused} unique in {len(self._batches)} batches"
+        )
+
+        try:
+            # Progress counts chunk positions, so repeated chunks count each time
+            occurrences = Counter(self.hashes)
+            embedded = sum(occurrences[chunk_hash] for chunk_hash in self._vectors)
+            if self.progress and embedded:
+                self.progress(embedded)
+
+            batch_hashes = {future: hashes for future, hashes in self._batches}
+            for future in as_completed(batch_hashes):
+                hashes = batch_hashes[future]
+                vectors = dict(zip(hashes, future.result()))
+                self._vectors.update(vectors)
+                if self.store:
+                    try:
+                        self.store(vectors)
+                    except Exception as e:
+                        logger.error(f"Storing {len(vectors)} embeddings failed: {e}")
+                embedded += sum(occurrences[chunk_hash] for chunk_hash in hashes)
+                if self.progress:
+                    self.progress(embedded)
+            return [self._vectors[chunk_hash] for chunk_hash in self.hashes]
+        finally:
+            self.cancel()
+
+    def cancel(self) -> None:
+        """Drop queued batches and release the pool."""
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        self._batches, self._pending, self._pending_tokens = [], [], 0
+        self._unresolved = []
+
+
+def embed_texts(texts: Sequence[str], model: Optional[str] = None,
+                max_workers: Optional[int] = None,
+                progress: Optional[Callable[[int], None]] = None,
+                lookup: Optional[Callable[[List[str]], Dict[str, List[float]]]] = None) -> List[List[float]]:
+    """
+    Embed document chunks in token-budgeted batches, several batches at a time.
+
+    Args:
+        texts: Chunk contents to embed
+        model (str, optional): Embedding model. Defaults to settings.EMBEDDING_MODEL.
+        max_workers (int, optional): Concurrent requests. Defaults to settings.EMBEDDING_MAX_CONCURRENCY.
+        progress (callable, optional): Called with the number of chunks embedded so far
+        lookup (callable, optional): Maps content hashes to already stored embeddings
+
+    Returns:
+        Embeddings in the same order as ``texts``
+    """
+    if not texts:
+        return []
+
+    pipeline = EmbeddingPipeline(model=model, max_workers=max_workers, progress=progress, lookup=lookup)
+    pipeline.add(texts)
+    return pipeline.finish()
@@ -0,0 +1,241 @@
+import json
+import time
+from unittest import mock
+
+import numpy as np
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from users.benchmarking import (
+    INDEX_MODES, SyntheticCorpus, build_index, git_commit, read_rss_mb, rss_delta_mb, time_queries
+)
+from users.embedding_codec import CODECS
+from users.models import Assistant, DocumentChunk, IVFQuantizer, PDFDocument
+from users.pgvector_storage import HNSW_INDEX_NAME
+from users.vector_index import vector_index_cache
+
+# Modes that run against a synthetic assistant written to the configured database
+DATABASE_MODES = ('vector', 'pgvector', 'lexical', 'hybrid', 'context')
+BENCH_USERNAME = 'retrieval-benchmark'
+# Recorded on synthetic chunks so ingestion never reuses their vectors
+SYNTHETIC_EMBEDDING_MODEL = 'synthetic-benchmark'
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark knowledge-base retrieval on synthetic assistants with a fake embedder and "
+        "print latency percentiles, throughput, peak RSS and index build time as JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='1000,10000,100000',
+                            help="Comma-separated chunk counts, e.g. 1000,100000,1000000.")
+        parser.add_argument('--modes', default=','.join(INDEX_MODES),
+                            help=f"Comma-separated modes. In-process index: {', '.join(INDEX_MODES)}. "
+                                 f"Database (creates and deletes a synthetic assistant): "
+                                 f"{', '.join(DATABASE_MODES)}.")
+        parser.add_argument('--queries', type=int, default=200, help="Timed queries per mode.")
+        parser.add_argument('--warmup', type=int, default=10, help="Untimed queries before timing.")
+        parser.add_argument('-k', type=int, default=5, help="Results per query.")
+        parser.add_argument('--dims', type=int, default=settings.EMBEDDING_DIMENSIONS,
+                            help="Embedding dimensions. Database modes require EMBEDDING_DIMENSIONS.")
+        parser.add_argument('--documents', type=int, default=10,
+                            help="Documents the synthetic chunks are spread over (database modes).")
+        parser.add_argument('--allow-db-writes', action='store_true',
+                            help="Required by the database modes, which write a synthetic assistant with up to "
+                                 "--sizes chunks to the configured database and delete it afterwards.")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help="Write the JSON report to this file instead of stdout.")
+
+    def handle(self, *args, **options):
+        sizes = [int(size) for size in options['sizes'].split(',') if size]
+        modes = [mode for mode in options['modes'].split(',') if mode]
+        unknown = set(modes) - set(INDEX_MODES) - set(DATABASE_MODES)
+        if unknown:
+            raise CommandError(f"Unknown modes: {', '.join(sorted(unknown))}")
+        if set(modes) & set(DATABASE_MODES) and not options['allow_db_writes']:
+            raise CommandError(
+                f"Database modes write to the '{connection.alias}' database "
+                f"({connection.settings_dict['NAME']}); pass --allow-db-writes to run them."
+            )
+        if set(modes) & set(DATABASE_MODES) and options['dims'] != settings.EMBEDDING_DIMENSIONS:
+            raise CommandError("Database modes need --dims equal to EMBEDDING_DIMENSIONS.")
+
+        corpus = SyntheticCorpus(options['dims'], seed=options['seed'])
+        query_texts, query_vectors = corpus.queries(options['queries'])
+
+        results = []
+        for size in sizes:
+            index_modes = [mode for mode in modes if mode in INDEX_MODES]
+            if index_modes:
+                matrix = corpus.embeddings(size)
+                for mode in index_modes:
+                    results.append(self._bench_index(matrix, mode, query_vectors, options))
+                del matrix
+
+            database_modes = [mode for mode in modes if mode in DATABASE_MODES]
+            if database_modes:
+                results.extend(self._bench_database(corpus, size, database_modes, query_texts, options))
+
+        report = {
+            'run': {
+                'started_at': timezone.now().isoformat(),
+                'commit': git_commit(),
+                'queries': options['queries'],
+                'k': options['k'],
+                'dims': options['dims'],
+                'seed': options['seed'],
+                'settings': {
+                    name: getattr(settings, name)
+                    for name in (
+                        'RETRIEVAL_MODE', 'HYBRID_CANDIDATE_MULTIPLIER', 'VECTOR_PREFILTER',
+                        'VECTOR_PREFILTER_DIMS', 'VECTOR_RERANK_MULTIPLIER', 'VECTOR_IVF_MIN_CHUNKS',
+                        'VECTOR_IVF_CLUSTERS', 'VECTOR_IVF_NPROBE', 'DOCUMENT_ROUTING_MIN_DOCUMENTS',
+                        'DOCUMENT_ROUTING_TOP_DOCUMENTS', 'EMBEDDING_STORAGE_CODEC',
+                    )
+                },
+            },
+            'results': results,
+        }
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output + "\n")
+            self.stderr.write(f"Wrote {len(results)} results to {options['output']}")
+        else:
+            self.stdout.write(output)
+
+    def _bench_index(self, matrix, mode, query_vectors, options):
+        self.stderr.write(f"{mode}: building index over {len(matrix)} chunks")
+        rss_before = read_rss_mb()
+        started = time.perf_counter()
+        index = build_index(matrix, mode)
+        build_seconds = time.perf_counter() - started
+
+        k = options['k']
+        timing = time_queries(
+            lambda i: index.search(query_vectors[i], k),
+            len(query_vectors),
+            warmup=options['warmup']
+        )
+        return {
+            'size': len(matrix),
+            'mode': mode,
+            'build_seconds': round(build_seconds, 3),
+            'index_mb': round(index.nbytes / 2 ** 20, 1),
+            **timing,
+            # Growth of this process during the mode; a process-lifetime peak would carry over
+            'rss_delta_mb': rss_delta_mb(rss_before),
+        }
+
+    def _create_assistant(self, size):
+        user, _ = User.objects.get_or_create(username=BENCH_USERNAME)
+        return Assistant.objects.create(user_id=user, name=f"Retrieval benchmark ({size} chunks)")
+
+    def _populate_assistant(self, assistant, corpus, size, documents):
+        """Write ``size`` embedded chunks spread over ``documents`` documents for a synthetic assistant."""
+        user = assistant.user_id
+        document_rows = [
+            PDFDocument.objects.create(
+                assistant_id=assistant,
+                user_id=user,
+                title=f"Synthetic document {number}",
+                status='completed'
+            )
+            for number in range(documents)
+        ]
+
+        codec = CODECS[settings.EMBEDDING_STORAGE_CODEC]
+        summaries = np.zeros((documents, corpus.dims), dtype=np.float32)
+        for start, word_ids, embeddings in corpus.iter_chunks(size):
+            owners = (start + np.arange(len(embeddings))) % documents
+            np.add.at(summaries, owners, embeddings)
+            DocumentChunk.objects.bulk_create(
+                [
+                    DocumentChunk(
+                        document=document_rows[owner],
+                        page_number=start + offset + 1,
+                        content=corpus.text(row),
+                        **DocumentChunk.encoded_fields(vector, codec, model=SYNTHETIC_EMBEDDING_MODEL)
+                    )
+                    for offset, (owner, row, vector) in enumerate(zip(owners, word_ids, embeddings))
+                ],
+                batch_size=settings.CHUNK_BULK_CREATE_BATCH_SIZE
+            )
+            self.stderr.write(f"  {min(start + len(embeddings), size)}/{size} chunks written")
+
+        for document, summary in zip(document_rows, summaries):
+            document.summary_embedding = PDFDocument.summarize_embeddings(summary[None, :])
+            document.save(update_fields=['summary_embedding'])
+
+        # Large assistants get their IVF quantizer as after ingestion
+        IVFQuantizer.update(assistant.id)
+
+    def _bench_database(self, corpus, size, modes, query_texts, options):
+        self.stderr.write(f"Creating synthetic assistant with {size} chunks")
+        if 'pgvector' in modes and not self._has_hnsw_index():
+            self.stderr.write(f"pgvector: {HNSW_INDEX_NAME} does not exist (run sync_pgvector with "
+                              f"VECTOR_SEARCH_BACKEND=pgvector), timing exact scans")
+        k = options['k']
+
+        def fake_embed_query(text, model=None, timeout=None):
+            return corpus.embed_text(text)
+
+        results = []
+        # Deleting the assistant cascades to its documents and chunks, also after a partial write
+        assistant = self._create_assistant(size)
+        try:
+            # The pgvector column is only written while that backend is enabled
+            backend = 'pgvector' if 'pgvector' in modes else settings.VECTOR_SEARCH_BACKEND
+            with override_settings(VECTOR_SEARCH_BACKEND=backend):
+                self._populate_assistant(assistant, corpus, size, options['documents'])
+
+            # Query embeddings come from the fake embedder; nothing calls the OpenAI API
+            with mock.patch('users.models.embed_query', fake_embed_query):
+                for mode in modes:
+                    backend = 'pgvector' if mode == 'pgvector' else 'numpy'
+                    with override_settings(VECTOR_SEARCH_BACKEND=backend):
+                        results.append(self._bench_database_mode(assistant, size, mode, query_texts, k, options))
+        finally:
+            assistant.delete()
+        return results
+
+    def _has_hnsw_index(self):
+        with connection.cursor() as cursor:
+            return HNSW_INDEX_NAME in connection.introspection.get_constraints(cursor, DocumentChunk._meta.db_table)
+
+    def _bench_database_mode(self, assistant, size, mode, query_texts, k, options):
+        self.stderr.write(f"{mode}: {len(query_texts)} queries over {size} chunks")
+        rss_before = read_rss_mb()
+
+        build_seconds = None
+        if mode in ('vector', 'hybrid', 'context'):
+            # Time the cold in-process index load separately from the queries
+            vector_index_cache.invalidate(assistant.id)
+            started = time.perf_counter()
+            vector_index_cache.get(assistant.id, lambda: DocumentChunk.load_vector_index(assistant.id))
+            build_seconds = round(time.perf_counter() - started, 3)
+
+        if mode == 'context':
+            from assistantchat.utils import ChatModule
+
+            chat_module = ChatModule()
+            search = lambda i: chat_module.get_relevant_context(query_texts[i], assistant.id, k=k)
+        else:
+            retrieval_mode = 'vector' if mode == 'pgvector' else mode
+            search = lambda i: DocumentChunk.similarity_search(query_texts[i], assistant.id, k=k, mode=retrieval_mode)
+
+        timing = time_queries(search, len(query_texts), warmup=options['warmup'])
+        return {
+            'size': size,
+            'mode': mode,
+            'build_seconds': build_seconds,
+            **timing,
+            # Growth of this process during the mode; a process-lifetime peak would carry over
+            'rss_delta_mb': rss_delta_mb(rss_before),
+        }
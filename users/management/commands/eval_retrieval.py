@@ -0,0 +1,232 @@
+import json
+import time
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from app.utils.embedding_cache import embed_query
+from users.benchmarking import (
+    SyntheticCorpus, build_index, exact_top_k, ndcg_at_k, recall_at_k, time_queries
+)
+from users.embedding_codec import CODECS, decode_embedding, quantize_matrix
+from users.models import DocumentChunk
+from users.vector_index import normalize_rows
+
+
+def _int_list(value):
+    return [int(item) for item in value.split(',') if item]
+
+
+def _str_list(value):
+    return [item for item in value.split(',') if item]
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure recall@k and nDCG@k of approximate vector search configurations (storage codec, "
+        "prefilter truncation/PCA, IVF nprobe) against exact cosine search, with query latency."
+    )
+
+    def add_arguments(self, parser):
+        source = parser.add_mutually_exclusive_group()
+        source.add_argument('--assistant', help="Evaluate on this assistant's stored chunk embeddings.")
+        source.add_argument('--synthetic', type=int, default=10000,
+                            help="Evaluate on a synthetic corpus of this many chunks (default).")
+        parser.add_argument('--queries', help="File with one query per line. Defaults to a sample of "
+                                              "chunk embeddings (assistant) or topical queries (synthetic).")
+        parser.add_argument('--query-count', type=int, default=200, help="Queries sampled when --queries is not given.")
+        parser.add_argument('-k', type=int, default=10)
+        parser.add_argument('--codecs', default=f"float32,{settings.EMBEDDING_STORAGE_CODEC}",
+                            help="Storage codecs to compare: float32 (no quantization), float16, int8.")
+        parser.add_argument('--prefilter-modes', default='pca,truncate', help="Prefilter modes: pca, truncate.")
+        parser.add_argument('--prefilter-dims', default='64,128,256', help="Reduced dimensions to try.")
+        parser.add_argument('--rerank', default=str(settings.VECTOR_RERANK_MULTIPLIER),
+                            help="VECTOR_RERANK_MULTIPLIER values to try with the prefilter.")
+        parser.add_argument('--nprobe', default='1,2,4,8,16,32', help="VECTOR_IVF_NPROBE values to try.")
+        parser.add_argument('--ivf-clusters', type=int, default=settings.VECTOR_IVF_CLUSTERS,
+                            help="IVF clusters; 0 uses sqrt(chunks).")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help="Write the JSON report to this file instead of stdout.")
+        parser.add_argument('--plot', help="Save a recall-vs-latency chart to this image file (needs matplotlib).")
+
+    def handle(self, *args, **options):
+        # Fail before the evaluation, not after it, when the plot cannot be drawn
+        pyplot = self._pyplot() if options['plot'] else None
+        matrix, queries, source = self._load(options)
+        k = min(options['k'], len(matrix))
+        self.stderr.write(f"{source}: {len(matrix)} chunks, {len(queries)} queries, k={k}")
+
+        exact = exact_top_k(matrix, queries, k)
+
+        results, indexes = [], {}
+        for config in self._configurations(options):
+            label = self._label(config)
+            key = (config['codec'], config['mode'], tuple(sorted(config['build'].items())))
+            if key not in indexes:
+                stored = matrix if config['codec'] == 'float32' else normalize_rows(
+                    quantize_matrix(matrix, CODECS[config['codec']])
+                )
+                started = time.perf_counter()
+                with override_settings(**config['build']):
+                    indexes[key] = (build_index(stored, config['mode']), time.perf_counter() - started)
+            index, build_seconds = indexes[key]
+
+            found = [None] * len(queries)
+
+            def search(i):
+                found[i] = [chunk_id for chunk_id, _ in index.search(queries[i], k)]
+
+            with override_settings(**config['search']):
+                timing = time_queries(search, len(queries), warmup=min(10, len(queries)))
+
+            recalls, ndcgs = [], []
+            for i, query in enumerate(queries):
+                recalls.append(recall_at_k(found[i], exact[i]))
+                found_gains = matrix[np.asarray(found[i], dtype=np.int64)] @ query if found[i] else np.empty(0)
+                ndcgs.append(ndcg_at_k(found_gains, matrix[exact[i]] @ query))
+
+            result = {
+                'label': label,
+                'codec': config['codec'],
+                'mode': config['mode'],
+                **{name.lower(): value for name, value in {**config['build'], **config['search']}.items()},
+                f'recall_at_{k}': round(float(np.mean(recalls)), 4),
+                f'ndcg_at_{k}': round(float(np.mean(ndcgs)), 4),
+                'build_seconds': round(build_seconds, 3),
+                **timing,
+            }
+            results.append(result)
+            self.stderr.write(
+                f"{label}: recall@{k} {result[f'recall_at_{k}']:.3f}, nDCG@{k} {result[f'ndcg_at_{k}']:.3f}, "
+                f"p50 {timing['latency_ms']['p50']:.2f} ms"
+            )
+
+        report = {
+            'source': source,
+            'chunks': len(matrix),
+            'queries': len(queries),
+            'k': k,
+            'results': results,
+        }
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output + "\n")
+        else:
+            self.stdout.write(output)
+
+        if options['plot']:
+            self._plot(pyplot, results, k, options['plot'], source)
+
+    def _load(self, options):
+        """Normalized float32 chunk matrix, normalized query matrix and a description of the source."""
+        rng = np.random.default_rng(options['seed'])
+        query_texts = None
+        if options['queries']:
+            with open(options['queries']) as f:
+                query_texts = [line.strip() for line in f if line.strip()]
+
+        if options['assistant']:
+            # Ground truth is the float32 pgvector copy when the pgvector backend keeps one, otherwise
+            # the decoded blob (already quantized with the stored codec, so that codec scores as exact)
+            rows = DocumentChunk.objects.filter(
+                document__assistant_id=options['assistant'],
+                embedding_blob__isnull=False
+            ).values_list('embedding', 'embedding_blob', 'embedding_codec', 'embedding_scale')
+            vectors = [
+                vector if vector is not None else decode_embedding(blob, codec, scale)
+                for vector, blob, codec, scale in rows
+            ]
+            if not vectors:
+                raise CommandError(f"Assistant {options['assistant']} has no embedded chunks.")
+            matrix = normalize_rows(np.array(vectors, dtype=np.float32))
+
+            if query_texts:
+                queries = np.array([embed_query(text) for text in query_texts], dtype=np.float32)
+            else:
+                sample = rng.choice(len(matrix), min(options['query_count'], len(matrix)), replace=False)
+                queries = matrix[sample]
+            return matrix, normalize_rows(queries), f"assistant {options['assistant']}"
+
+        corpus = SyntheticCorpus(settings.EMBEDDING_DIMENSIONS, seed=options['seed'])
+        matrix = corpus.embeddings(options['synthetic'])
+        if query_texts:
+            queries = np.array([corpus.embed_text(text) for text in query_texts], dtype=np.float32)
+        else:
+            _, queries = corpus.queries(options['query_count'])
+        return matrix, queries, f"synthetic ({options['synthetic']} chunks)"
+
+    def _configurations(self, options):
+        """Every configuration to evaluate, exact search first for each codec."""
+        for codec in _str_list(options['codecs']):
+            if codec != 'float32' and codec not in CODECS:
+                raise CommandError(f"Unknown codec: {codec}")
+
+            yield {'codec': codec, 'mode': 'flat', 'build': {}, 'search': {}}
+            for prefilter_mode in _str_list(options['prefilter_modes']):
+                for dims in _int_list(options['prefilter_dims']):
+                    for rerank in _int_list(options['rerank']):
+                        yield {
+                            'codec': codec,
+                            'mode': 'prefilter',
+                            'build': {'VECTOR_PREFILTER': prefilter_mode, 'VECTOR_PREFILTER_DIMS': dims},
+                            'search': {'VECTOR_RERANK_MULTIPLIER': rerank},
+                        }
+            for nprobe in _int_list(options['nprobe']):
+                yield {
+                    'codec': codec,
+                    'mode': 'ivf',
+                    'build': {'VECTOR_IVF_CLUSTERS': options['ivf_clusters']},
+                    'search': {'VECTOR_IVF_NPROBE': nprobe},
+                }
+
+    def _label(self, config):
+        params = {**config['build'], **config['search']}
+        if config['mode'] == 'prefilter':
+            detail = (f"{params['VECTOR_PREFILTER']} {params['VECTOR_PREFILTER_DIMS']}d "
+                      f"x{params['VECTOR_RERANK_MULTIPLIER']}")
+        elif config['mode'] == 'ivf':
+            detail = f"nprobe={params['VECTOR_IVF_NPROBE']}"
+        else:
+            detail = "exact"
+        return f"{config['codec']} {config['mode']} {detail}"
+
+    def _pyplot(self):
+        try:
+            import matplotlib
+            matplotlib.use('Agg')
+            import matplotlib.pyplot as plt
+        except ImportError:
+            raise CommandError("--plot needs matplotlib (pip install matplotlib).")
+        return plt
+
+    def _plot(self, plt, results, k, path, source):
+        figure, axes = plt.subplots(figsize=(10, 6))
+        families = {}
+        for result in results:
+            family = f"{result['codec']} {result['mode']}"
+            if result['mode'] == 'prefilter':
+                family += f" {result['vector_prefilter']}"
+            families.setdefault(family, []).append(result)
+
+        for family, points in families.items():
+            points = sorted(points, key=lambda point: point['latency_ms']['p50'])
+            latencies = [point['latency_ms']['p50'] for point in points]
+            recalls = [point[f'recall_at_{k}'] for point in points]
+            axes.plot(latencies, recalls, marker='o', label=family)
+            for point, latency, recall in zip(points, latencies, recalls):
+                axes.annotate(point['label'].split(' ', 2)[-1], (latency, recall), fontsize=7,
+                              textcoords='offset points', xytext=(3, 3))
+
+        axes.set_xscale('log')
+        axes.set_xlabel('p50 query latency (ms)')
+        axes.set_ylabel(f'recall@{k}')
+        axes.set_title(f'Recall vs latency, {source}')
+        axes.grid(True, which='both', alpha=0.3)
+        axes.legend(fontsize=8)
+        figure.tight_layout()
+        figure.savefig(path, dpi=150)
+        plt.close(figure)
+        self.stderr.write(f"Saved plot to {path}")
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from users.models import Assistant, DocumentChunk
+from users.vector_shards import shard_store
+
+
+class Command(BaseCommand):
+    help = "Export assistants' chunk embeddings to memory-mapped shard files under VECTOR_SHARD_DIR."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--assistant', action='append',
+                            help="Assistant id to export (repeatable). Defaults to every assistant with chunks.")
+
+    def handle(self, *args, **options):
+        if not shard_store.enabled:
+            raise CommandError("VECTOR_SHARD_DIR is not set.")
+
+        assistant_ids = options['assistant'] or list(
+            Assistant.objects.filter(pdf_documents__chunks__isnull=False).distinct().values_list('id', flat=True)
+        )
+        for assistant_id in assistant_ids:
+            version = shard_store.rebuild(assistant_id, lambda: DocumentChunk.build_vector_index(assistant_id))
+            self.stdout.write(f"Assistant {assistant_id}: shard {version}")
@@ -0,0 +1,77 @@
+import logging
+import os
+import signal
+import socket
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from users.models import IngestionJob
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Process queued knowledge-base ingestion jobs (PDF and URL documents)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=2,
+                            help="Number of jobs processed in parallel by this worker.")
+        parser.add_argument('--poll-interval', type=float, default=2.0,
+                            help="Seconds to wait before polling again when the queue is empty.")
+        parser.add_argument('--max-attempts', type=int, default=3,
+                            help="Attempts before a job is marked failed.")
+        parser.add_argument('--stale-after', type=int, default=900,
+                            help="Seconds without progress after which a processing job is re-claimed.")
+        parser.add_argument('--once', action='store_true',
+                            help="Exit once the queue is empty instead of polling forever.")
+
+    def handle(self, *args, **options):
+        self.stop = threading.Event()
+        signal.signal(signal.SIGTERM, lambda *_: self.stop.set())
+        signal.signal(signal.SIGINT, lambda *_: self.stop.set())
+
+        worker_name = f"{socket.gethostname()}:{os.getpid()}"
+        concurrency = max(1, options['concurrency'])
+        self.stdout.write(f"Ingestion worker {worker_name} started with concurrency {concurrency}")
+
+        threads = [
+            threading.Thread(
+                target=self.work_loop,
+                args=(f"{worker_name}/{slot}", options),
+                daemon=True
+            )
+            for slot in range(concurrency)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.stdout.write(f"Ingestion worker {worker_name} stopped")
+
+    def work_loop(self, worker: str, options):
+        while not self.stop.is_set():
+            close_old_connections()
+            try:
+                job = IngestionJob.claim_next(worker, stale_after=options['stale_after'])
+            except Exception as e:
+                logger.error(f"Failed to claim ingestion job: {e}")
+                job = None
+
+            if job is None:
+                if options['once']:
+                    return
+                self.stop.wait(options['poll_interval'])
+                continue
+
+            started = time.monotonic()
+            logger.info(f"{worker} processing ingestion job {job.id} for document {job.document_id}")
+            job.run(max_attempts=options['max_attempts'])
+            logger.info(
+                f"{worker} finished ingestion job {job.id} with status {job.status} "
+                f"in {time.monotonic() - started:.1f}s"
+            )
+        close_old_connections()
@@ -0,0 +1,270 @@
+import asyncio
+import itertools
+import json
+import time
+from importlib import import_module
+
+import aiohttp
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from users.benchmarking import git_commit, latency_summary, read_rss_mb
+from users.models import Assistant
+
+LOADTEST_USERNAME = 'chat-loadtest-{}'
+DEFAULT_PROMPTS = (
+    "Can you explain the main idea of this topic?",
+    "Give me an example and a short exercise.",
+    "What is the difference between the two methods we discussed?",
+    "I understand, what should I practice next?",
+    "Summarize the key steps of the process.",
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Load-test the /chat/ SSE endpoint of a running server: log in synthetic users, hold many "
+        "concurrent streams and report time-to-first-token, inter-chunk gaps, stream time, errors "
+        "and server RSS as JSON. Run the server with LLM_PROVIDER=stub (and EMBEDDING_PROVIDER=stub) "
+        "against the same database as this command."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000', help="Base URL of the server under test.")
+        parser.add_argument('--assistant', help="Assistant to chat with. Defaults to an empty synthetic assistant "
+                                                "that is deleted afterwards.")
+        parser.add_argument('--users', type=int, default=50, help="Synthetic users, each with its own session.")
+        parser.add_argument('--concurrency', type=int, default=50, help="Streams held open at the same time.")
+        parser.add_argument('--messages', type=int, default=5, help="Messages each user sends, one after another.")
+        parser.add_argument('--ramp-up', type=float, default=5.0, help="Seconds over which users start.")
+        parser.add_argument('--timeout', type=float, default=120.0, help="Seconds before a stream counts as failed.")
+        parser.add_argument('--prompts', help="File with one prompt per line; users cycle through them.")
+        parser.add_argument('--server-pid', type=int, help="Sample this local process's RSS during the run "
+                                                           "(e.g. the daphne worker).")
+        parser.add_argument('--rss-interval', type=float, default=0.5, help="Seconds between RSS samples.")
+        parser.add_argument('--output', help="Write the JSON report to this file instead of stdout.")
+
+    def handle(self, *args, **options):
+        if options['users'] < 1 or options['messages'] < 1 or options['concurrency'] < 1:
+            raise CommandError("--users, --messages and --concurrency must be positive.")
+        if options['server_pid'] and read_rss_mb(options['server_pid']) is None:
+            raise CommandError(f"Cannot read the RSS of process {options['server_pid']}.")
+
+        prompts = list(DEFAULT_PROMPTS)
+        if options['prompts']:
+            with open(options['prompts']) as f:
+                prompts = [line.strip() for line in f if line.strip()]
+            if not prompts:
+                raise CommandError(f"No prompts in {options['prompts']}.")
+
+        users = [
+            User.objects.get_or_create(username=LOADTEST_USERNAME.format(number))[0]
+            for number in range(options['users'])
+        ]
+        sessions = [self._login(user) for user in users]
+
+        created = None
+        if options['assistant']:
+            if not Assistant.objects.filter(id=options['assistant']).exists():
+                raise CommandError(f"Assistant {options['assistant']} does not exist.")
+            assistant_id = options['assistant']
+        else:
+            created = Assistant.objects.create(
+                user_id=users[0],
+                name="Chat load test",
+                subject="Load testing",
+                topic="Streaming",
+            )
+            assistant_id = str(created.id)
+
+        self.stderr.write(
+            f"{options['users']} users x {options['messages']} messages against {options['url']}, "
+            f"{options['concurrency']} concurrent streams"
+        )
+        try:
+            started_at = timezone.now().isoformat()
+            run = asyncio.run(self._run(sessions, assistant_id, prompts, options))
+        finally:
+            for session in sessions:
+                session.delete()
+            if created:
+                created.delete()
+
+        streams, elapsed, rss_samples = run['streams'], run['elapsed'], run['rss_samples']
+        completed = [stream for stream in streams if stream['error'] is None]
+        errors = {}
+        for stream in streams:
+            if stream['error']:
+                errors[stream['error']] = errors.get(stream['error'], 0) + 1
+
+        report = {
+            'run': {
+                'started_at': started_at,
+                'commit': git_commit(),
+                'url': options['url'],
+                'assistant': options['assistant'] or 'synthetic',
+                'users': options['users'],
+                'messages_per_user': options['messages'],
+                'concurrency': options['concurrency'],
+                'ramp_up_seconds': options['ramp_up'],
+                'timeout_seconds': options['timeout'],
+                # This process's view; the server under test must be started with the same values
+                'settings': {
+                    name: getattr(settings, name)
+                    for name in (
+                        'LLM_PROVIDER', 'EMBEDDING_PROVIDER', 'STUB_LLM_TTFT', 'STUB_LLM_TOKEN_DELAY',
+                        'STUB_LLM_TOKENS', 'STUB_EMBEDDING_DELAY', 'RETRIEVAL_MODE',
+                    )
+                },
+            },
+            'summary': {
+                'streams': len(streams),
+                'completed': len(completed),
+                'error_rate': round(1 - len(completed) / len(streams), 4) if streams else None,
+                'errors': errors,
+                'elapsed_seconds': round(elapsed, 3),
+                'streams_per_second': round(len(completed) / elapsed, 2) if elapsed else None,
+                'peak_open_streams': run['peak_open'],
+                'ttft_ms': latency_summary([stream['ttft'] for stream in completed]),
+                # As measured by the server from request arrival, when it reports it
+                'server_ttft_ms': latency_summary(
+                    [stream['server_ttft'] for stream in completed if stream['server_ttft'] is not None]
+                ),
+                'inter_chunk_gap_ms': latency_summary(
+                    [gap for stream in completed for gap in stream['gaps']]
+                ),
+                'stream_ms': latency_summary([stream['total'] for stream in completed]),
+                'chunks_per_stream': round(
+                    sum(stream['chunks'] for stream in completed) / len(completed), 1
+                ) if completed else None,
+                'server_rss_mb': {
+                    'start': round(rss_samples[0], 1),
+                    'peak': round(max(rss_samples), 1),
+                    'end': round(rss_samples[-1], 1),
+                } if rss_samples else None,
+            },
+        }
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output + "\n")
+            self.stderr.write(f"Wrote report for {len(streams)} streams to {options['output']}")
+        else:
+            self.stdout.write(output)
+
+    def _login(self, user):
+        """Create a database session for ``user`` as ``django.contrib.auth.login`` would."""
+        session = import_module(settings.SESSION_ENGINE).SessionStore()
+        session[SESSION_KEY] = user._meta.pk.value_to_string(user)
+        session[BACKEND_SESSION_KEY] = 'django.contrib.auth.backends.ModelBackend'
+        session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+        session.create()
+        return session
+
+    async def _run(self, sessions, assistant_id, prompts, options):
+        semaphore = asyncio.Semaphore(options['concurrency'])
+        state = {'open': 0, 'peak_open': 0}
+        streams, rss_samples = [], []
+        prompt_cycle = itertools.cycle(prompts)
+        finished = asyncio.Event()
+
+        async def sample_rss():
+            while not finished.is_set():
+                rss = read_rss_mb(options['server_pid'])
+                if rss is not None:
+                    rss_samples.append(rss)
+                try:
+                    await asyncio.wait_for(finished.wait(), options['rss_interval'])
+                except asyncio.TimeoutError:
+                    pass
+            rss = read_rss_mb(options['server_pid'])
+            if rss is not None:
+                rss_samples.append(rss)
+
+        async def user_session(number, session):
+            await asyncio.sleep(options['ramp_up'] * number / len(sessions))
+            cookies = {settings.SESSION_COOKIE_NAME: session.session_key}
+            timeout = aiohttp.ClientTimeout(total=options['timeout'])
+            async with aiohttp.ClientSession(cookies=cookies, timeout=timeout) as http:
+                for message in range(options['messages']):
+                    # Distinct prompts per user and turn so the stub replies differ
+                    prompt = f"{next(prompt_cycle)} ({number}.{message})"
+                    async with semaphore:
+                        state['open'] += 1
+                        state['peak_open'] = max(state['peak_open'], state['open'])
+                        try:
+                            streams.append(await self._stream(http, options['url'], assistant_id, prompt))
+                        finally:
+                            state['open'] -= 1
+
+        rss_task = asyncio.create_task(sample_rss()) if options['server_pid'] else None
+        started = time.perf_counter()
+        await asyncio.gather(*(user_session(number, session) for number, session in enumerate(sessions)))
+        elapsed = time.perf_counter() - started
+        finished.set()
+        if rss_task:
+            await rss_task
+
+        return {'streams': streams, 'elapsed': elapsed, 'rss_samples': rss_samples, 'peak_open': state['peak_open']}
+
+    async def _stream(self, http, url, assistant_id, prompt):
+        """
+        POST one chat message and read its SSE stream to the end.
+
+        Returns:
+            Dict with client and server-reported ttft and total seconds, inter-chunk gaps, chunk count and
+            an error kind (None on success)
+        """
+        result = {'ttft': None, 'server_ttft': None, 'total': None, 'gaps': [], 'chunks': 0, 'error': None}
+        started = time.perf_counter()
+        last = None
+        try:
+            async with http.post(
+                f"{url.rstrip('/')}/chat/",
+                json={'message': prompt, 'id': assistant_id},
+                allow_redirects=False,
+            ) as response:
+                if response.status != 200:
+                    result['error'] = f"http_{response.status}"
+                    return result
+                if not response.headers.get('Content-Type', '').startswith('text/event-stream'):
+                    result['error'] = 'not_event_stream'
+                    return result
+
+                finished = False
+                async for line in response.content:
+                    line = line.decode('utf-8').strip()
+                    if not line.startswith('data:'):
+                        continue
+                    frame = json.loads(line[len('data:'):])
+                    now = time.perf_counter()
+                    if frame.get('text'):
+                        if frame['text'].startswith('Error:') and frame.get('isLastChunk'):
+                            result['error'] = 'stream_error'
+                            return result
+                        result['chunks'] += 1
+                        if last is None:
+                            result['ttft'] = now - started
+                        else:
+                            result['gaps'].append(now - last)
+                        last = now
+                    if frame.get('isLastChunk'):
+                        if frame.get('ttftMs') is not None:
+                            result['server_ttft'] = frame['ttftMs'] / 1000
+                        finished = True
+                        break
+
+                result['total'] = time.perf_counter() - started
+                if not finished:
+                    result['error'] = 'truncated'
+                elif result['ttft'] is None:
+                    result['error'] = 'empty'
+        except asyncio.TimeoutError:
+            result['error'] = 'timeout'
+        except (aiohttp.ClientError, ValueError) as e:
+            result['error'] = type(e).__name__
+        return result
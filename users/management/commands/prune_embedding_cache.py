@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from users.models import EmbeddingCacheEntry
+
+
+class Command(BaseCommand):
+    help = "Remove stale entries from the persistent embedding cache and print its counters."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--retention-days', type=int, default=None,
+                            help="Delete entries unused for this many days (default: EMBEDDING_CACHE_RETENTION_DAYS).")
+        parser.add_argument('--max-entries', type=int, default=None,
+                            help="Keep at most this many most recently used entries (default: EMBEDDING_CACHE_MAX_ENTRIES).")
+
+    def handle(self, *args, **options):
+        deleted = EmbeddingCacheEntry.prune(
+            retention_days=options['retention_days'],
+            max_entries=options['max_entries']
+        )
+        self.stdout.write(f"Pruned {deleted} embedding cache entries")
+        for name, value in EmbeddingCacheEntry.stats().items():
+            self.stdout.write(f"  {name}: {value}")
@@ -0,0 +1,40 @@
+import logging
+
+from django.core.management.base import BaseCommand
+
+from users.models import PDFDocument
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = (
+        "Re-fetch URL knowledge-base sources with conditional requests and "
+        "re-ingest only documents whose pages changed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--assistant', help="Only refresh documents of this assistant id.")
+        parser.add_argument('--document', help="Only refresh this document id.")
+
+    def handle(self, *args, **options):
+        documents = PDFDocument.objects.filter(status='completed', urls__len__gt=0, file='')
+        if options['assistant']:
+            documents = documents.filter(assistant_id=options['assistant'])
+        if options['document']:
+            documents = documents.filter(doc_id=options['document'])
+
+        checked = refreshed = failed = 0
+        for document in documents:
+            checked += 1
+            try:
+                if document.process_pdf(refresh=True):
+                    refreshed += 1
+            except Exception as e:
+                failed += 1
+                logger.error(f"Refreshing '{document}' failed: {e}")
+
+        self.stdout.write(
+            f"Checked {checked} URL documents: {refreshed} re-ingested, "
+            f"{checked - refreshed - failed} unchanged, {failed} failed"
+        )
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from users.models import DocumentChunk
+from users.pgvector_storage import pgvector_enabled, sync_storage
+
+
+class Command(BaseCommand):
+    help = (
+        "Match the pgvector embedding column and its HNSW index to VECTOR_SEARCH_BACKEND: fill them from "
+        "the stored blobs when it is 'pgvector', otherwise drop the index and clear the column. "
+        "Run after changing the backend."
+    )
+
+    def handle(self, *args, **options):
+        enabled = pgvector_enabled()
+        with connection.schema_editor(atomic=False) as schema_editor:
+            changed = sync_storage(DocumentChunk, schema_editor, enabled)
+        action = "Filled" if enabled else "Cleared"
+        self.stdout.write(f"{action} the pgvector embedding of {changed} chunks")
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from users.models import Assistant, IVFQuantizer
+
+
+class Command(BaseCommand):
+    help = "Train IVF quantizers for assistants with at least VECTOR_IVF_MIN_CHUNKS embedded chunks."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--assistant', action='append',
+                            help="Assistant id to train (repeatable). Defaults to every assistant with chunks.")
+        parser.add_argument('--clusters', type=int,
+                            help="Number of clusters. Defaults to VECTOR_IVF_CLUSTERS or sqrt(chunks).")
+
+    def handle(self, *args, **options):
+        assistant_ids = options['assistant'] or list(
+            Assistant.objects.filter(pdf_documents__chunks__isnull=False).distinct().values_list('id', flat=True)
+        )
+        for assistant_id in assistant_ids:
+            if options['assistant'] or options['clusters']:
+                try:
+                    quantizer = IVFQuantizer.train(assistant_id, clusters=options['clusters'])
+                except ValueError as e:
+                    self.stderr.write(str(e))
+                    continue
+            else:
+                quantizer = IVFQuantizer.update(assistant_id)
+            if quantizer is None:
+                self.stdout.write(f"Assistant {assistant_id}: below VECTOR_IVF_MIN_CHUNKS, flat scan")
+            else:
+                self.stdout.write(f"Assistant {assistant_id}: {quantizer.clusters} clusters")
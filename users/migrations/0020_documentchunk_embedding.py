@@ -0,0 +1,39 @@
+# Generated by Django 5.1.3 on 2026-10-18 15:13
+
+import pgvector.django.indexes
+import pgvector.django.vector
+from django.db import migrations
+from pgvector.django import VectorExtension
+
+
+# Copy existing ArrayField embeddings into the pgvector column. Rows whose
+# dimensionality does not match the column are left NULL and keep using the
+# in-process search path.
+BACKFILL_EMBEDDINGS_SQL = """
+    UPDATE users_documentchunk
+    SET embedding = vector_embedding::vector
+    WHERE embedding IS NULL
+      AND vector_embedding IS NOT NULL
+      AND array_length(vector_embedding, 1) = 1536;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0019_alter_assistant_total_reviews'),
+    ]
+
+    operations = [
+        VectorExtension(),
+        migrations.AddField(
+            model_name='documentchunk',
+            name='embedding',
+            field=pgvector.django.vector.VectorField(blank=True, dimensions=1536, null=True),
+        ),
+        migrations.RunSQL(BACKFILL_EMBEDDINGS_SQL, reverse_sql=migrations.RunSQL.noop),
+        migrations.AddIndex(
+            model_name='documentchunk',
+            index=pgvector.django.indexes.HnswIndex(ef_construction=64, fields=['embedding'], m=16, name='documentchunk_embedding_hnsw', opclasses=['vector_cosine_ops']),
+        ),
+    ]
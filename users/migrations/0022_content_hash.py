@@ -0,0 +1,50 @@
+# Generated by Django 5.1.3 on 2026-10-18 15:21
+
+import hashlib
+
+from django.db import migrations, models
+
+
+# Hash existing chunk text in SQL; sha256(convert_to(...)) matches the
+# Python-side hashlib.sha256(content.encode('utf-8')) used at ingestion.
+BACKFILL_CHUNK_HASHES_SQL = """
+    UPDATE users_documentchunk
+    SET content_hash = encode(sha256(convert_to(content, 'UTF8')), 'hex')
+    WHERE content_hash IS NULL;
+"""
+
+
+def backfill_document_hashes(apps, schema_editor):
+    PDFDocument = apps.get_model('users', 'PDFDocument')
+    for document in PDFDocument.objects.filter(content_hash__isnull=True).exclude(file='').only('doc_id', 'file'):
+        digest = hashlib.sha256()
+        try:
+            with document.file.open('rb') as f:
+                for block in iter(lambda: f.read(1024 * 1024), b''):
+                    digest.update(block)
+        except (FileNotFoundError, OSError):
+            # Uploads that are no longer on disk keep a NULL hash
+            continue
+        PDFDocument.objects.filter(pk=document.pk).update(content_hash=digest.hexdigest())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0021_ingestionjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='documentchunk',
+            name='content_hash',
+            field=models.CharField(blank=True, db_index=True, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name='pdfdocument',
+            name='content_hash',
+            field=models.CharField(blank=True, db_index=True, max_length=64, null=True),
+        ),
+        migrations.RunSQL(BACKFILL_CHUNK_HASHES_SQL, reverse_sql=migrations.RunSQL.noop),
+        migrations.RunPython(backfill_document_hashes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.3 on 2026-10-18 15:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0023_embeddingcacheentry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='documentchunk',
+            name='token_count',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+    ]
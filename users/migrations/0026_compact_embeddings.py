@@ -0,0 +1,95 @@
+# Generated by Django 5.1.3 on 2026-10-18 15:28
+
+from django.conf import settings
+from django.db import migrations, models
+
+from users.embedding_codec import CODECS, decode_embedding, encode_embedding
+
+BATCH_SIZE = 500
+
+
+def encode_existing_embeddings(apps, schema_editor):
+    """Move double-precision array embeddings into embedding_blob, batch by batch."""
+    DocumentChunk = apps.get_model('users', 'DocumentChunk')
+    codec = CODECS[settings.EMBEDDING_STORAGE_CODEC]
+
+    last_id = 0
+    while True:
+        batch = list(
+            DocumentChunk.objects.filter(
+                id__gt=last_id,
+                vector_embedding__isnull=False,
+                embedding_blob__isnull=True
+            ).order_by('id').values_list('id', 'vector_embedding')[:BATCH_SIZE]
+        )
+        if not batch:
+            break
+
+        updates = []
+        for chunk_id, vector in batch:
+            blob, chunk_codec, scale = encode_embedding(vector, codec)
+            # embedding_blob is the stored embedding from here on, so the array can be dropped
+            updates.append(DocumentChunk(
+                id=chunk_id,
+                embedding_blob=blob,
+                embedding_codec=chunk_codec,
+                embedding_scale=scale,
+                vector_embedding=None
+            ))
+        DocumentChunk.objects.bulk_update(
+            updates, ['embedding_blob', 'embedding_codec', 'embedding_scale', 'vector_embedding']
+        )
+        last_id = batch[-1][0]
+
+
+def decode_to_arrays(apps, schema_editor):
+    DocumentChunk = apps.get_model('users', 'DocumentChunk')
+
+    last_id = 0
+    while True:
+        batch = list(
+            DocumentChunk.objects.filter(
+                id__gt=last_id,
+                embedding_blob__isnull=False,
+                vector_embedding__isnull=True
+            ).order_by('id').values_list('id', 'embedding_blob', 'embedding_codec', 'embedding_scale')[:BATCH_SIZE]
+        )
+        if not batch:
+            break
+
+        DocumentChunk.objects.bulk_update(
+            [
+                DocumentChunk(id=chunk_id, vector_embedding=decode_embedding(blob, codec, scale).tolist())
+                for chunk_id, blob, codec, scale in batch
+            ],
+            ['vector_embedding']
+        )
+        last_id = batch[-1][0]
+
+
+class Migration(migrations.Migration):
+    # Each conversion batch commits on its own so large tables are not held in one transaction
+    atomic = False
+
+    dependencies = [
+        ('users', '0025_documentchunk_search_vector'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='documentchunk',
+            name='embedding_blob',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='documentchunk',
+            name='embedding_codec',
+            field=models.CharField(blank=True, max_length=8, null=True),
+        ),
+        migrations.AddField(
+            model_name='documentchunk',
+            name='embedding_scale',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.RunPython(encode_existing_embeddings, decode_to_arrays),
+    ]
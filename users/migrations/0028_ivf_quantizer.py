@@ -0,0 +1,36 @@
+# Generated by Django 5.1.3 on 2026-10-18 15:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0027_indexchange'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='documentchunk',
+            name='ivf_cluster',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='indexchange',
+            name='rebuild',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.CreateModel(
+            name='IVFQuantizer',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('centroids', models.BinaryField()),
+                ('clusters', models.IntegerField()),
+                ('dimensions', models.IntegerField()),
+                ('trained_chunks', models.IntegerField()),
+                ('trained_at', models.DateTimeField(auto_now=True)),
+                ('assistant', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='ivf_quantizer', to='users.assistant')),
+            ],
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.1.3 on 2026-10-18 15:41
+
+import pgvector.django.vector
+from django.db import migrations
+
+
+# Summaries of existing documents: the mean of their chunks' pgvector embeddings.
+# Routing normalizes summaries when loading them, so the norm does not matter.
+BACKFILL_SUMMARIES_SQL = """
+    UPDATE users_pdfdocument AS document
+    SET summary_embedding = centroids.summary
+    FROM (
+        SELECT document_id, AVG(embedding) AS summary
+        FROM users_documentchunk
+        WHERE embedding IS NOT NULL
+        GROUP BY document_id
+    ) AS centroids
+    WHERE document.doc_id = centroids.document_id;
+"""
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0028_ivf_quantizer'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pdfdocument',
+            name='summary_embedding',
+            field=pgvector.django.vector.VectorField(blank=True, dimensions=1536, null=True),
+        ),
+        migrations.RunSQL(BACKFILL_SUMMARIES_SQL, reverse_sql=migrations.RunSQL.noop),
+    ]
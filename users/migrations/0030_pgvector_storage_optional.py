@@ -0,0 +1,36 @@
+from django.db import migrations
+
+from users.pgvector_storage import HNSW_INDEX_NAME, pgvector_enabled, sync_storage
+
+
+def sync_pgvector_storage(apps, schema_editor):
+    """Keep the float32 copy and HNSW index only when the pgvector backend is enabled."""
+    sync_storage(apps.get_model('users', 'DocumentChunk'), schema_editor, pgvector_enabled())
+
+
+def restore_pgvector_storage(apps, schema_editor):
+    sync_storage(apps.get_model('users', 'DocumentChunk'), schema_editor, True)
+
+
+class Migration(migrations.Migration):
+    # Each batch commits on its own so large tables are not held in one transaction
+    atomic = False
+
+    dependencies = [
+        ('users', '0029_pdfdocument_summary_embedding'),
+    ]
+
+    operations = [
+        # The index leaves the model state; users/pgvector_storage.py creates and drops it
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.RemoveIndex(
+                    model_name='documentchunk',
+                    name=HNSW_INDEX_NAME,
+                ),
+            ],
+            database_operations=[
+                migrations.RunPython(sync_pgvector_storage, restore_pgvector_storage),
+            ],
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.1.3 on 2026-10-18 16:07
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+from users.ingestion import content_hash
+
+
+def link_existing_duplicates(apps, schema_editor):
+    """Point chunkless same-assistant duplicates at their original and drop hashes of empty text."""
+    PDFDocument = apps.get_model('users', 'PDFDocument')
+
+    PDFDocument.objects.filter(content_hash=content_hash("")).update(content_hash=None)
+
+    duplicates = PDFDocument.objects.filter(
+        status='completed',
+        chunks__isnull=True,
+        metadata__duplicate_of__isnull=False
+    )
+    for document in duplicates:
+        original = PDFDocument.objects.filter(
+            doc_id=document.metadata['duplicate_of'],
+            assistant_id=document.assistant_id
+        ).first()
+        if original:
+            document.duplicate_of = original
+            document.content_hash = None
+            document.save(update_fields=['duplicate_of', 'content_hash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0030_pgvector_storage_optional'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pdfdocument',
+            name='duplicate_of',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='duplicates', to='users.pdfdocument'),
+        ),
+        migrations.RunPython(link_existing_duplicates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.3 on 2026-10-18 16:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0031_pdfdocument_duplicate_of'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='documentchunk',
+            name='embedding_model',
+            field=models.CharField(blank=True, max_length=100, null=True),
+        ),
+    ]
@@ -1,35 +1,57 @@
 from django.db import models, transaction
+from django.utils import timezone
 import uuid
-from typing import Optional
-import requests
+from datetime import timedelta
+import threading
+import time
+from collections import Counter
+import operator
+import re
+from functools import reduce
+from typing import Callable, Dict, List, Optional, Tuple
 from urllib.parse import urlparse
 
 import numpy as np
 from django.core.files.storage import default_storage
 
-import os
 from dotenv import load_dotenv
 import logging
 from django.contrib.auth.models import User 
 from django.contrib.postgres.fields import ArrayField
-import tempfile
-from langchain_community.document_loaders import PyPDFLoader, WebBaseLoader, YoutubeLoader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_openai import OpenAIEmbeddings
-from openai import OpenAI
-import shutil
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector, SearchVectorField
+from django.conf import settings
+from django.db import connection
+from pgvector.django import VectorField, CosineDistance
 from django.core.validators import MinValueValidator, MaxValueValidator
 from decimal import Decimal
 from django.core.exceptions import ValidationError
-from django.db.models import Avg
+from django.db.models import Avg, F
 from django.core.validators import URLValidator
 
+from app.utils.embedding_cache import EmbeddingUnavailable, embed_query
+from app.utils.providers import embedding_cache_model
+from .chunking import get_chunker
+from .embedding_codec import CODECS, decode_embedding, encode_embedding
+from .ingestion import EmbeddingPipeline, content_hash, file_hash
+from .pdf_extraction import iter_pdf_pages
+from .pgvector_storage import pgvector_enabled
+from .url_fetching import fetch_urls, is_youtube_url
+from .vector_index import (
+    AssistantIndex, DocumentRouter, assign_clusters, decode_rows, document_router_cache, normalize_rows,
+    reciprocal_rank_fusion, spherical_kmeans, vector_index_cache
+)
+from .vector_shards import shard_store
+
 
 load_dotenv()
 
 # Initialize logger
 logger = logging.getLogger(__name__)
 
+# Postgres text search configuration used for DocumentChunk.search_vector
+TEXT_SEARCH_CONFIG = 'english'
+
 # Create your models here.
 
 class SupabaseUser(models.Model):
@@ -225,9 +247,94 @@ class PDFDocument(models.Model):
     title = models.CharField(max_length=255, null=True, blank=True)
     status = models.CharField(max_length=20, choices=PROCESSING_STATUS_CHOICES, default='pending')
     metadata = models.JSONField(null=True, blank=True)
+    # SHA-256 of the uploaded file (or of the fetched URL text), used to reuse identical documents.
+    # Null for duplicates and for sources that yielded no text
+    content_hash = models.CharField(max_length=64, null=True, blank=True, db_index=True)
+    # Completed document of the same assistant with identical content; a duplicate has no chunks
+    # of its own and goes away with the original
+    duplicate_of = models.ForeignKey(
+        'self',
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='duplicates'
+    )
+    # Normalized mean of the chunk embeddings, used to route queries to relevant documents
+    summary_embedding = VectorField(
+        dimensions=settings.EMBEDDING_DIMENSIONS,
+        null=True,
+        blank=True
+    )
 
     def __str__(self):
         return self.title or str(self.doc_id)
+
+    @staticmethod
+    def summarize_embeddings(embeddings) -> Optional[np.ndarray]:
+        """Summary embedding of a document: the normalized centroid of its chunk embeddings."""
+        if not len(embeddings):
+            return None
+        centroid = normalize_rows(np.asarray(embeddings, dtype=np.float32)).mean(axis=0)
+        return normalize_rows(centroid[None, :])[0]
+
+    @classmethod
+    def load_router(cls, assistant_id) -> DocumentRouter:
+        """Summary embeddings of the assistant's completed documents."""
+        document_ids, summaries, unsummarized = [], [], []
+        rows = cls.objects.filter(assistant_id=assistant_id, status='completed').values_list(
+            'doc_id', 'summary_embedding'
+        )
+        for doc_id, summary in rows:
+            if summary is None:
+                unsummarized.append(doc_id)
+            else:
+                document_ids.append(doc_id)
+                summaries.append(summary)
+
+        matrix = normalize_rows(np.array(summaries, dtype=np.float32)) if summaries else np.empty((0, 0))
+        return DocumentRouter(document_ids, matrix, unsummarized)
+
+    @classmethod
+    def route(cls, query_embedding, assistant_id) -> Optional[List[uuid.UUID]]:
+        """
+        Pick the documents whose summary embeddings are closest to the query.
+
+        Routing applies only to assistants with at least
+        DOCUMENT_ROUTING_MIN_DOCUMENTS documents; the cached summaries are
+        reloaded at most every VECTOR_INDEX_SYNC_INTERVAL seconds.
+
+        Returns:
+            Ids of the DOCUMENT_ROUTING_TOP_DOCUMENTS best documents (plus any
+            without a summary yet), or None to search every document
+        """
+        min_documents = settings.DOCUMENT_ROUTING_MIN_DOCUMENTS
+        if not min_documents:
+            return None
+
+        router = document_router_cache.get(assistant_id, lambda: cls.load_router(assistant_id))
+        if time.monotonic() - router.synced_at > settings.VECTOR_INDEX_SYNC_INTERVAL:
+            router = cls.load_router(assistant_id)
+            document_router_cache.put(assistant_id, router)
+
+        if len(router) < min_documents:
+            return None
+        return router.route(query_embedding, settings.DOCUMENT_ROUTING_TOP_DOCUMENTS)
+
+    def _find_duplicate(self):
+        """
+        Completed document with the same content hash, preferring one in this assistant.
+        A document of another assistant only counts when every chunk was embedded by the
+        configured model, since its vectors are copied as they are.
+        """
+        duplicates = PDFDocument.objects.filter(
+            content_hash=self.content_hash,
+            status='completed'
+        ).exclude(pk=self.pk)
+        other_models = DocumentChunk.objects.exclude(embedding_model=embedding_cache_model())
+        return (
+            duplicates.filter(assistant_id=self.assistant_id).first()
+            or duplicates.filter(chunks__isnull=False).exclude(chunks__in=other_models).distinct().first()
+        )
     
 
     def _validate_document_input(self):
@@ -235,35 +342,12 @@ class PDFDocument(models.Model):
         if self.urls:
             for url in self.urls:
                 try:
-                    # YouTube URL validation
-                    def is_youtube_url(url):
-                        parsed_url = urlparse(url)
-                        youtube_domains = [
-                            'youtube.com', 
-                            'www.youtube.com', 
-                            'youtu.be', 
-                            'm.youtube.com'
-                        ]
-                        return (
-                            parsed_url.netloc in youtube_domains or
-                            'youtube.com/watch' in url or
-                            'youtu.be/' in url
-                        )
-
-                    # Basic URL validation
+                    # Basic URL validation; reachability is left to the single
+                    # fetch made during processing
                     result = urlparse(url)
                     if not all([result.scheme, result.netloc]):
                         raise ValidationError(f"Invalid URL format: {url}")
-                    
-                    # Optional: Check if URL is reachable
-                    try:
-                        response = requests.head(url, timeout=5)
-                        if response.status_code != 200:
-                            raise ValidationError(f"Unable to access URL: {url}")
-                    except requests.RequestException:
-                        # Allow URLs that might not respond to HEAD requests
-                        pass
-                    
+
                     # Log YouTube URL
                     if is_youtube_url(url):
                         logger.info(f"YouTube URL detected: {url}")
@@ -271,105 +355,190 @@ class PDFDocument(models.Model):
                 except Exception as e:
                     raise ValidationError(f"URL validation error for {url}: {str(e)}")
 
-    def process_pdf(self):
+    def process_pdf(self, progress: Optional[Callable[..., None]] = None, refresh: bool = False):
+        """
+        Extract, chunk and embed the document into DocumentChunk rows.
+
+        Args:
+            progress (callable, optional): Called with keyword counters
+                (pages_extracted, chunks_total, chunks_embedded) as work advances
+            refresh (bool): Re-fetch URL sources conditionally with the stored
+                ETag/Last-Modified validators, leaving the document untouched
+                when every page is unchanged
+
+        Returns:
+            bool: False if a refresh found every source unchanged, True otherwise
+
+        Blocks on extraction, fetching and embedding, so call it from sync code only
+        (the ingestion worker, a management command, or sync_to_async).
+        """
+        report = progress or (lambda **counters: None)
+
         # Validate input
         self._validate_document_input()
 
+        pipeline = None
         try:
             self.status = 'processing'
             self.save()
 
-            # Initialize text splitter
-            text_splitter = RecursiveCharacterTextSplitter(
-                chunk_size=1000,
-                chunk_overlap=200,
-                length_function=len,
-                separators=["\n\n", "\n", " ", ""]
-            )
+            # Token-based chunker shared by every source type
+            chunker = get_chunker()
             # Check if the document already exists
             existing_document = PDFDocument.objects.filter(
                 assistant_id=self.assistant_id,
                 title=self.title,
                 status='completed'
-            ).first()
+            ).exclude(pk=self.pk).first()
+
+            text_chunks = []
+            chunk_token_counts = []
+            chunk_hashes = []
+            chunk_embeddings = []
+            duplicate = None
+            pipeline = EmbeddingPipeline(
+                progress=lambda embedded: report(chunks_embedded=embedded),
+                lookup=EmbeddingCacheEntry.lookup,
+                store=EmbeddingCacheEntry.store
+            )
 
             # Process PDF file
             if self.file:
-                
-                
+                self.content_hash = file_hash(self.file.path)
+                duplicate = self._find_duplicate()
+
                 if existing_document:
                     # Log that the document already exists
                     logger.info(f"Document '{self.title}' already processed. Skipping.")
+                elif duplicate and duplicate.assistant_id_id == self.assistant_id_id:
+                    logger.info(
+                        f"Document '{self.title}' has the same content as '{duplicate.title}'. Skipping."
+                    )
+                    # Only the original carries the hash, so later uploads match it rather than this row
+                    self.duplicate_of = duplicate
+                    self.content_hash = None
+                elif duplicate:
+                    # Identical file already ingested for another assistant: copy its chunks
+                    logger.info(f"Reusing chunks of identical document '{duplicate.title}' ({duplicate.doc_id})")
+                    source_chunks = duplicate.chunks.filter(embedding_blob__isnull=False).order_by(
+                        'page_number'
+                    ).values_list(
+                        'content', 'token_count', 'content_hash',
+                        'embedding_blob', 'embedding_codec', 'embedding_scale'
+                    )
+                    for chunk_content, token_count, chunk_hash, blob, codec, scale in source_chunks:
+                        text_chunks.append(chunk_content)
+                        chunk_token_counts.append(token_count or chunker.count_tokens(chunk_content))
+                        chunk_hashes.append(chunk_hash or content_hash(chunk_content))
+                        chunk_embeddings.append(decode_embedding(blob, codec, scale))
                 else:
-                    temp_dir = tempfile.mkdtemp(prefix='pdf_processing_')
-                    original_file_path = self.file.path
-                    temp_file_path = os.path.join(temp_dir, os.path.basename(original_file_path))
-                    logger.info(f"Processing file: {temp_file_path}")
-                    shutil.copy2(original_file_path, temp_file_path)
-
+                    # Pages stream in from the extraction pool and are embedded
+                    # while later pages are still being parsed
+                    logger.info(f"Processing file: {self.file.path}")
                     try:
-                        loader = PyPDFLoader(temp_file_path)
-                        pages = loader.load_and_split()
-                        text_chunks = [page.page_content for page in pages]
+                        for page_number, page_text in iter_pdf_pages(
+                            self.file.path,
+                            workers=settings.PDF_EXTRACTION_WORKERS,
+                            pages_per_task=settings.PDF_EXTRACTION_PAGES_PER_TASK,
+                            min_parallel_pages=settings.PDF_EXTRACTION_MIN_PAGES
+                        ):
+                            page_chunks = chunker.split(page_text)
+                            for chunk, token_count in page_chunks:
+                                text_chunks.append(chunk)
+                                chunk_token_counts.append(token_count)
+                            pipeline.add([chunk for chunk, _ in page_chunks])
+                            report(pages_extracted=page_number)
                     except Exception as e:
                         logger.error(f"Error processing PDF: {e}")
-                        text_chunks = []
-                    finally:
-                        # Cleanup temp files
-                        if os.path.exists(temp_file_path):
-                            os.remove(temp_file_path)
-                        if os.path.exists(temp_dir):
-                            os.rmdir(temp_dir)
+                        raise
 
             # Process URL content
             elif self.urls:
                 text_chunks = []
-                for url in self.urls:
-                    if existing_document:
-                        logger.info(f"URL '{self.title}' already processed. Skipping.")
-                    else:
-                        # Check if YouTube URL
-                        if any(yt_domain in url for yt_domain in ['youtube.com', 'youtu.be', 'www.youtube.com', 'm.youtube.com']):
-                            try:
-                                # Use YoutubeLoader to extract transcript
-                                youtube_loader = YoutubeLoader.from_youtube_url(url, add_video_info=False)
-                                youtube_docs = youtube_loader.load()
-                                # logger.info(f"Youtube docs are: {youtube_docs}")
-                                youtube_text = " ".join([doc.page_content for doc in youtube_docs])
-                                youtube_chunks = text_splitter.split_text(youtube_text)
-                                text_chunks.extend(youtube_chunks)
-                            except Exception as e:
-                                logger.error(f"Error processing YouTube URL {url}: {str(e)}")
-                        else:
-                            # Process regular web URLs
-                            try:
-                                loader = WebBaseLoader(url)
-                                web_docs = loader.load()
-                                # logger.info(f"Web docs are: {web_docs}")
-                                web_text = " ".join([doc.page_content for doc in web_docs])
-                                web_chunks = text_splitter.split_text(web_text)
-                                text_chunks.extend(web_chunks)
-                            except Exception as e:
-                                logger.error(f"Error processing web URL {url}: {str(e)}")
+                chunk_token_counts = []
+                url_validators = {}
+                if existing_document:
+                    logger.info(f"URL '{self.title}' already processed. Skipping.")
+                else:
+                    # Fetch every URL concurrently, one request each
+                    previous_validators = (self.metadata or {}).get('url_validators', {}) if refresh else {}
+                    results = fetch_urls(self.urls, validators=previous_validators)
+
+                    # Keep the current chunks when nothing changed, or when a source could not
+                    # be fetched and re-ingesting would silently drop its content
+                    if refresh and (
+                        all(result.not_modified for result in results)
+                        or any(result.error for result in results)
+                    ):
+                        logger.info(f"URL sources of '{self.title}' unchanged or unreachable. Skipping refresh.")
+                        self.status = 'completed'
+                        self.metadata = {**(self.metadata or {}), 'checked_at': timezone.now().isoformat()}
+                        self.save()
+                        return False
+
+                    # Some pages changed: fetch the unchanged ones in full too, since
+                    # chunks are rebuilt for the whole document
+                    unchanged = [result.url for result in results if result.not_modified]
+                    if unchanged:
+                        refetched = {result.url: result for result in fetch_urls(unchanged)}
+                        results = [refetched.get(result.url, result) for result in results]
+
+                    for result in results:
+                        url_validators[result.url] = result.validators
+                        for chunk, token_count in chunker.split(result.text):
+                            text_chunks.append(chunk)
+                            chunk_token_counts.append(token_count)
+
+                # An empty or failed fetch must not become the original of every later one
+                self.content_hash = content_hash("\n".join(text_chunks)) if text_chunks else None
+                pipeline.add(text_chunks)
 
             else:
                 raise ValidationError("No valid document source found.")
 
-            # Initialize Langchain OpenAIEmbeddings client
-            embeddings_model = OpenAIEmbeddings()
-
-            # Process each chunk and store it
-            for chunk_number, chunk_content in enumerate(text_chunks, start=1):
-                # Generate embedding for the chunk's content
-                chunk_embedding = embeddings_model.embed_documents([chunk_content])[0]
+            report(chunks_total=len(text_chunks))
+            if chunk_embeddings:
+                pipeline.cancel()
+                report(chunks_embedded=len(chunk_embeddings))
+            else:
+                # Wait for the remaining token-budgeted, concurrent embedding batches
+                chunk_embeddings = pipeline.finish()
+                chunk_hashes = pipeline.hashes
 
-                # Store the chunk content and its embedding in the DocumentChunk model
-                DocumentChunk.objects.create(
-                    document=self,
-                    page_number=chunk_number,
-                    content=chunk_content,
-                    vector_embedding=chunk_embedding
+            # Replace the chunks and their embeddings in bulk, all or nothing so a retry starts clean
+            storage_codec = CODECS[settings.EMBEDDING_STORAGE_CODEC]
+            with transaction.atomic():
+                replaced_ids = list(self.chunks.values_list('id', flat=True))
+                self.chunks.all().delete()
+                created_chunks = DocumentChunk.objects.bulk_create(
+                    [
+                        DocumentChunk(
+                            document=self,
+                            page_number=chunk_number,
+                            content=chunk_content,
+                            token_count=token_count,
+                            content_hash=chunk_hash,
+                            **DocumentChunk.encoded_fields(chunk_embedding, storage_codec)
+                        )
+                        for chunk_number, (chunk_content, token_count, chunk_hash, chunk_embedding)
+                        in enumerate(zip(text_chunks, chunk_token_counts, chunk_hashes, chunk_embeddings), start=1)
+                    ],
+                    batch_size=settings.CHUNK_BULK_CREATE_BATCH_SIZE
                 )
+                # bulk_create and queryset delete skip signals, so record the edit explicitly
+                IndexChange.record(
+                    self.assistant_id_id,
+                    added=[chunk.id for chunk in created_chunks],
+                    removed=replaced_ids
+                )
+
+            # Cluster the new chunks for IVF search; large assistants get their quantizer trained here
+            try:
+                IVFQuantizer.update(self.assistant_id_id, [chunk.id for chunk in created_chunks])
+            except Exception as e:
+                logger.error(f"IVF quantizer update failed for assistant {self.assistant_id_id}: {str(e)}")
+
+            self.summary_embedding = self.summarize_embeddings(chunk_embeddings)
 
             # Prepare metadata for the document
             self.metadata = {
@@ -378,16 +547,26 @@ class PDFDocument(models.Model):
                 'user_id': str(self.user_id.id) if self.user_id else None,
                 'assistant_id': str(self.assistant_id.id) if self.assistant_id else None,
                 'total_chunks': len(text_chunks),
-                'document_type': 'pdf' if self.file else 'url'
+                'total_tokens': sum(chunk_token_counts),
+                'document_type': 'pdf' if self.file else 'url',
+                'duplicate_of': str(duplicate.doc_id) if duplicate else None
             }
+            if self.urls and not self.file:
+                self.metadata['url_validators'] = url_validators
+                self.metadata['checked_at'] = timezone.now().isoformat()
 
             self.status = 'completed'
             self.save()
+            return True
 
         except Exception as e:
             self.status = 'failed'
             self.save()
             raise RuntimeError(f"Document Processing Error: {str(e)}")
+        finally:
+            # Release the embedding pool on every exit, including an unchanged refresh
+            if pipeline is not None:
+                pipeline.cancel()
 
 
 class DocumentChunk(models.Model):
@@ -398,62 +577,749 @@ class DocumentChunk(models.Model):
     )
     page_number = models.IntegerField(null=True, blank=True)
     content = models.TextField()
+    # Tokens in content under the embedding model's encoding, for prompt budgeting
+    token_count = models.IntegerField(null=True, blank=True)
+    # Full-text index of content, maintained by Postgres
+    search_vector = models.GeneratedField(
+        expression=SearchVector('content', config=TEXT_SEARCH_CONFIG),
+        output_field=SearchVectorField(),
+        db_persist=True
+    )
+    # SHA-256 of content; chunks with the same hash share one embedding
+    content_hash = models.CharField(max_length=64, null=True, blank=True, db_index=True)
+    # Legacy double-precision embeddings; new rows use embedding_blob and
+    # migration 0026 moves existing rows over
     vector_embedding = ArrayField(
         models.FloatField(), 
         null=True, 
         blank=True
     )
+    # Compact embedding read by the in-process index: float16, or int8 times
+    # embedding_scale (see users/embedding_codec.py)
+    embedding_blob = models.BinaryField(null=True, blank=True)
+    embedding_codec = models.CharField(max_length=8, null=True, blank=True)
+    embedding_scale = models.FloatField(null=True, blank=True)
+    # Model namespace that produced the embedding (see embedding_cache_model);
+    # null for chunks ingested before it was recorded, which are never reused
+    embedding_model = models.CharField(max_length=100, null=True, blank=True)
+    # float32 pgvector copy of the embedding, searchable in SQL through the HNSW index.
+    # Only written, and only indexed, while VECTOR_SEARCH_BACKEND is 'pgvector'
+    # (see users/pgvector_storage.py)
+    embedding = VectorField(
+        dimensions=settings.EMBEDDING_DIMENSIONS,
+        null=True,
+        blank=True
+    )
+    # Nearest centroid of the assistant's IVFQuantizer; null until assigned
+    ivf_cluster = models.IntegerField(null=True, blank=True)
+
+    class Meta:
+        # The HNSW index on embedding is managed by users/pgvector_storage.py
+        indexes = [
+            GinIndex(name='documentchunk_search_gin', fields=['search_vector']),
+        ]
 
     def __str__(self):
         return f"Chunk {self.page_number} of {self.document.title}"
     
+    @staticmethod
+    def encoded_fields(vector, codec: str, model: Optional[str] = None) -> Dict[str, object]:
+        """
+        Field values storing ``vector`` in compact form with ``codec`` and the model that
+        produced it (default: the configured one), plus the float32 pgvector copy when the
+        pgvector backend is enabled.
+        """
+        blob, codec, scale = encode_embedding(vector, codec)
+        fields = {
+            'embedding_blob': blob,
+            'embedding_codec': codec,
+            'embedding_scale': scale,
+            'embedding_model': embedding_cache_model(model),
+        }
+        if pgvector_enabled():
+            fields['embedding'] = vector
+        return fields
+
     @classmethod
-    def similarity_search(cls, query: str, assistant_id: str, k: int = 5):
+    def stored_embeddings(cls, hashes, model: Optional[str] = None):
         """
-        Find most similar document chunks to the query using cosine similarity.
-        
+        Map each content hash that already has an embedding stored by ``model`` (default:
+        the configured one) to that embedding, as decoded from its compact blob.
+        """
+        rows = (
+            cls.objects
+            .filter(content_hash__in=hashes, embedding_blob__isnull=False,
+                    embedding_model=embedding_cache_model(model))
+            .order_by('content_hash')
+            .distinct('content_hash')
+            .values_list('content_hash', 'embedding_blob', 'embedding_codec', 'embedding_scale')
+        )
+        return {
+            chunk_hash: decode_embedding(blob, codec, scale).tolist()
+            for chunk_hash, blob, codec, scale in rows
+        }
+
+    @classmethod
+    def build_vector_index(cls, assistant_id: str) -> AssistantIndex:
+        """Load every embedded chunk of an assistant into an AssistantIndex."""
+        # Read the change watermark first so changes committed during the load are replayed
+        change_id = IndexChange.latest_id(assistant_id)
+        chunks = cls.objects.filter(document__assistant_id=assistant_id, embedding_blob__isnull=False)
+
+        quantizer = IVFQuantizer.objects.filter(assistant_id=assistant_id).first()
+        if quantizer is not None:
+            rows = chunks.values_list('id', 'embedding_blob', 'embedding_codec', 'embedding_scale', 'ivf_cluster')
+            return AssistantIndex.from_clustered(rows, quantizer.centroid_matrix(), change_id=change_id)
+
+        rows = chunks.values_list('id', 'embedding_blob', 'embedding_codec', 'embedding_scale')
+        return AssistantIndex.from_encoded(rows, change_id=change_id)
+
+    @classmethod
+    def sync_vector_index(cls, assistant_id: str, force: bool = False) -> Optional[AssistantIndex]:
+        """
+        Apply IndexChange rows recorded since the cached index was built.
+
+        Only the added chunks are read from the database, so a small edit to a
+        large knowledge base costs O(edit) rather than a rebuild. Checks run at
+        most every VECTOR_INDEX_SYNC_INTERVAL seconds unless ``force`` is set.
+
+        Returns:
+            The up-to-date cached index, or None if none is cached
+        """
+        index = vector_index_cache.peek(assistant_id)
+        if index is None:
+            return None
+
+        now = time.monotonic()
+        if not force and now - index.synced_at < settings.VECTOR_INDEX_SYNC_INTERVAL:
+            return index
+        if now - index.synced_at > settings.VECTOR_INDEX_CHANGE_RETENTION:
+            # Changes this index never saw may already be pruned
+            vector_index_cache.invalidate(assistant_id)
+            return None
+
+        changes = list(
+            IndexChange.objects.filter(
+                assistant_id=assistant_id,
+                id__gt=index.change_id
+            ).order_by('id').values_list('id', 'added', 'removed', 'rebuild')
+        )
+        if not changes:
+            index.synced_at = now
+            return index
+
+        if any(rebuild for *_, rebuild in changes):
+            # The IVF quantizer was retrained or dropped, so the base layout is outdated
+            if index.version and shard_store.current_version(assistant_id) == index.version:
+                shard_store.invalidate(assistant_id)
+            vector_index_cache.invalidate(assistant_id)
+            return None
+
+        added, removed = set(), set()
+        for _, change_added, change_removed, _ in changes:
+            added.difference_update(change_removed)
+            removed.update(change_removed)
+            added.update(change_added)
+
+        added_ids, added_matrix = decode_rows(
+            cls.objects.filter(id__in=added, embedding_blob__isnull=False).values_list(
+                'id', 'embedding_blob', 'embedding_codec', 'embedding_scale'
+            )
+        )
+        updated = index.apply(added_ids, added_matrix, removed, changes[-1][0])
+
+        if updated.garbage_ratio > settings.VECTOR_INDEX_COMPACT_RATIO:
+            updated = cls.compact_vector_index(assistant_id, updated)
+
+        vector_index_cache.put(assistant_id, updated)
+        return updated
+
+    @classmethod
+    def compact_vector_index(cls, assistant_id: str, index: AssistantIndex) -> AssistantIndex:
+        """Fold deltas and tombstones into a new base, published as a shard when shards are enabled."""
+        logger.info(
+            f"Compacting vector index for assistant {assistant_id} "
+            f"({len(index.delta_ids)} added, {index.dead_count} removed)"
+        )
+        if index.version and shard_store.enabled:
+            # None means another worker already published a newer base; ours is remapped on next search
+            return shard_store.publish_compacted(assistant_id, index) or index
+        return index.compacted()
+
+    @classmethod
+    def load_vector_index(cls, assistant_id: str) -> AssistantIndex:
+        """
+        Memory-mapped shard shared by all workers when VECTOR_SHARD_DIR is set,
+        otherwise an in-process matrix built from the database.
+        """
+        if shard_store.enabled:
+            return shard_store.load_or_build(assistant_id, lambda: cls.build_vector_index(assistant_id))
+        return cls.build_vector_index(assistant_id)
+
+    @classmethod
+    def pgvector_search(cls, query_embedding, assistant_id: str, k: int = 5,
+                        document_ids: Optional[List] = None) -> List[Tuple[int, float]]:
+        """
+        Nearest-neighbour search executed in Postgres (``ORDER BY embedding <=> q LIMIT k``).
+
+        Returns:
+            List of ``(chunk_id, cosine_similarity)`` pairs, best first
+        """
+        queryset = cls.objects.filter(
+            document__assistant_id=assistant_id,
+            embedding__isnull=False
+        )
+        if document_ids is not None:
+            queryset = queryset.filter(document_id__in=document_ids)
+        queryset = queryset.annotate(
+            distance=CosineDistance('embedding', list(map(float, query_embedding)))
+        ).order_by('distance').values_list('id', 'distance')[:k]
+
+        with transaction.atomic():
+            # Widen the HNSW candidate list so the assistant filter still leaves k rows
+            with connection.cursor() as cursor:
+                cursor.execute("SET LOCAL hnsw.ef_search = %s", [settings.PGVECTOR_EF_SEARCH])
+            rows = list(queryset)
+
+        return [(chunk_id, 1.0 - distance) for chunk_id, distance in rows]
+
+    @classmethod
+    def vector_search(cls, query_embedding, assistant_id: str, k: int = 5,
+                      document_ids: Optional[List] = None) -> List[Tuple[int, float]]:
+        """
+        Top-k chunks by embedding similarity, as ``(chunk_id, cosine_similarity)`` pairs.
+        ``document_ids`` limits the search to the chunks of those documents.
+        """
+        if settings.VECTOR_SEARCH_BACKEND == 'pgvector':
+            return cls.pgvector_search(query_embedding, assistant_id, k, document_ids=document_ids)
+
+        # Score against the assistant's cached, pre-normalized embedding matrix
+        index = vector_index_cache.get(assistant_id, lambda: cls.load_vector_index(assistant_id))
+        if index.version and index.version != shard_store.current_version(assistant_id):
+            # Another process compacted or invalidated the shard since it was mapped
+            vector_index_cache.invalidate(assistant_id)
+
+        # Catch up with edits made by this or other workers
+        index = cls.sync_vector_index(assistant_id) or vector_index_cache.get(
+            assistant_id, lambda: cls.load_vector_index(assistant_id)
+        )
+        chunk_ids = None
+        if document_ids is not None:
+            chunk_ids = cls.objects.filter(document_id__in=document_ids).values_list('id', flat=True)
+        return index.search(query_embedding, k, chunk_ids=chunk_ids)
+
+    @classmethod
+    def lexical_search(cls, query: str, assistant_id: str, k: int = 5,
+                       document_ids: Optional[List] = None) -> List[Tuple[int, float]]:
+        """
+        Top-k chunks by full-text rank over the GIN-indexed ``search_vector``.
+
+        Chunks must match every query term (websearch syntax, stop words
+        dropped). When that finds fewer than ``k`` chunks the terms are OR-ed
+        instead, so a chunk matching any of them (a formula name, a code
+        identifier) is still a candidate. At most LEXICAL_MAX_CANDIDATES
+        matches are ranked by ts_rank. ``document_ids`` limits the search to
+        the chunks of those documents.
+
+        Returns:
+            List of ``(chunk_id, rank)`` pairs, best first
+        """
+        terms = re.findall(r"\w+", query)[:settings.LEXICAL_MAX_TERMS]
+        if not terms:
+            return []
+
+        queryset = cls.objects.filter(document__assistant_id=assistant_id)
+        if document_ids is not None:
+            queryset = queryset.filter(document_id__in=document_ids)
+
+        rows = cls._ranked_matches(
+            queryset, SearchQuery(" ".join(terms), config=TEXT_SEARCH_CONFIG, search_type='websearch'), k
+        )
+        if len(rows) < k and len(terms) > 1:
+            any_term = reduce(
+                operator.or_,
+                [SearchQuery(term, config=TEXT_SEARCH_CONFIG, search_type='plain') for term in terms]
+            )
+            rows = cls._ranked_matches(queryset, any_term, k)
+        return rows
+
+    @classmethod
+    def _ranked_matches(cls, queryset, search_query, k: int) -> List[Tuple[int, float]]:
+        """Rank a bounded set of the chunks in ``queryset`` matching ``search_query``."""
+        candidates = queryset.filter(search_vector=search_query).values('id')[:settings.LEXICAL_MAX_CANDIDATES]
+        rows = cls.objects.filter(id__in=candidates).annotate(
+            rank=SearchRank(F('search_vector'), search_query)
+        ).order_by('-rank').values_list('id', 'rank')[:k]
+        return list(rows)
+
+    @classmethod
+    def similarity_search(cls, query: str, assistant_id: str, k: int = 5, mode: Optional[str] = None):
+        """
+        Find the document chunks most relevant to the query.
+
+        In 'hybrid' mode vector and full-text candidates are merged with
+        reciprocal-rank fusion. If the query cannot be embedded in time (the
+        embedding API is slow or down) search falls back to full-text only.
+        On assistants with many documents the query is first routed to the
+        documents with the closest summary embeddings (see PDFDocument.route)
+        and only their chunks are searched.
+
         Args:
             query (str): Search query text
+            assistant_id (str): Assistant whose knowledge base is searched
             k (int, optional): Number of top similar chunks. Defaults to 5.
-            api_key (str): OpenAI API key
-        
+            mode (str, optional): 'hybrid', 'vector' or 'lexical'. Defaults to settings.RETRIEVAL_MODE.
+
         Returns:
-            List of tuples with chunks and similarity scores
+            List of tuples with chunks and relevance scores (cosine similarity,
+            text rank or fused score, depending on the mode)
         """
+        mode = mode or settings.RETRIEVAL_MODE
+        candidates = k * settings.HYBRID_CANDIDATE_MULTIPLIER if mode == 'hybrid' else k
+
         try:
-            api_key = os.getenv("OPENAI_API_KEY")
-            
-            client = OpenAI(api_key=api_key)
+            rankings = []
+            document_ids = None
+            if mode != 'lexical':
+                try:
+                    # Repeat queries are served from the cache; misses are time-bounded
+                    query_embedding = embed_query(query, timeout=settings.QUERY_EMBEDDING_TIMEOUT)
+                    document_ids = PDFDocument.route(query_embedding, assistant_id)
+                    rankings.append(
+                        cls.vector_search(query_embedding, assistant_id, candidates, document_ids=document_ids)
+                    )
+                except EmbeddingUnavailable as e:
+                    logger.warning(f"Query embedding unavailable, using full-text search only: {e}")
 
-            # Generate query embedding
-            query_response = client.embeddings.create(
-                model="text-embedding-ada-002",
-                input=query
-            )
-            query_embedding = np.array(query_response.data[0].embedding)
+            if mode != 'vector' or not rankings:
+                rankings.append(cls.lexical_search(query, assistant_id, candidates, document_ids=document_ids))
 
-            # Fetch document chunks with embeddings only for the specified assistant
-            chunks = cls.objects.filter(
-                document__assistant_id=assistant_id,
-                vector_embedding__isnull=False
-            )
+            if len(rankings) == 1:
+                matches = rankings[0][:k]
+            else:
+                matches = reciprocal_rank_fusion(rankings, k=settings.RRF_K)[:k]
 
-            # Calculate similarities
-            similarities = [
-                (chunk, np.dot(query_embedding, np.array(chunk.vector_embedding)) / (
-                    np.linalg.norm(query_embedding) * np.linalg.norm(chunk.vector_embedding)
-                ))
-                for chunk in chunks
-            ]
+            # Only the top-k rows are loaded as model instances
+            chunks = cls.objects.select_related('document').defer(
+                'vector_embedding', 'embedding_blob', 'embedding', 'search_vector'
+            ).in_bulk([chunk_id for chunk_id, _ in matches])
 
-            # Sort and return top k results
-            return sorted(similarities, key=lambda x: x[1], reverse=True)[:k]
+            return [
+                (chunks[chunk_id], score)
+                for chunk_id, score in matches
+                if chunk_id in chunks
+            ]
 
         except Exception as e:
             logger.error(f"Similarity search error: {str(e)}")
             return []
 
 
+class IndexChange(models.Model):
+    """
+    Append-only log of chunk additions and removals per assistant.
+
+    Every worker replays the entries newer than its cached index (see
+    DocumentChunk.sync_vector_index), which broadcasts knowledge-base edits
+    to all processes and machines. Entries older than
+    VECTOR_INDEX_CHANGE_RETENTION seconds are pruned; an index that has not
+    synced for that long is rebuilt instead.
+    """
+    id = models.BigAutoField(primary_key=True)
+    # Not a foreign key: changes are still recorded while an assistant is being deleted
+    assistant_id = models.UUIDField(db_index=True)
+    added = ArrayField(models.BigIntegerField(), default=list, blank=True)
+    removed = ArrayField(models.BigIntegerField(), default=list, blank=True)
+    # The whole index must be rebuilt, e.g. after the IVF quantizer was retrained
+    rebuild = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Index change {self.id} for assistant {self.assistant_id}"
+
+    @classmethod
+    def latest_id(cls, assistant_id) -> int:
+        latest = cls.objects.filter(assistant_id=assistant_id).order_by('-id').values_list('id', flat=True).first()
+        return latest or 0
+
+    @classmethod
+    def record(cls, assistant_id, added: List[int] = (), removed: List[int] = (), rebuild: bool = False) -> None:
+        """Log an edit and, once it commits, apply it to this process's cached index."""
+        if not assistant_id or not (added or removed or rebuild):
+            return
+
+        cls.objects.create(assistant_id=assistant_id, added=list(added), removed=list(removed), rebuild=rebuild)
+        cls.objects.filter(
+            assistant_id=assistant_id,
+            created_at__lt=timezone.now() - timedelta(seconds=settings.VECTOR_INDEX_CHANGE_RETENTION)
+        ).delete()
+
+        transaction.on_commit(lambda: DocumentChunk.sync_vector_index(assistant_id, force=True))
+
+
+class IVFQuantizer(models.Model):
+    """
+    Coarse quantizer of an assistant's chunk embeddings, for IVF search.
+
+    Once an assistant has VECTOR_IVF_MIN_CHUNKS embedded chunks, a sample
+    of its embeddings is clustered with spherical k-means at ingestion time
+    and each chunk's nearest centroid is stored in DocumentChunk.ivf_cluster.
+    Searches then scan only the VECTOR_IVF_NPROBE clusters nearest to the
+    query (see AssistantIndex); smaller assistants keep the flat scan.
+    """
+    assistant = models.OneToOneField(
+        Assistant,
+        on_delete=models.CASCADE,
+        related_name='ivf_quantizer'
+    )
+    # float32 centroids, clusters x dimensions, L2-normalized
+    centroids = models.BinaryField()
+    clusters = models.IntegerField()
+    dimensions = models.IntegerField()
+    # Embedded chunks when trained; retrained once the assistant grows VECTOR_IVF_RETRAIN_GROWTH times
+    trained_chunks = models.IntegerField()
+    trained_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"IVF quantizer ({self.clusters} clusters) for assistant {self.assistant_id}"
+
+    def centroid_matrix(self) -> np.ndarray:
+        return np.frombuffer(bytes(self.centroids), dtype=np.float32).reshape(self.clusters, self.dimensions)
+
+    @staticmethod
+    def _embedded_chunks(assistant_id):
+        return DocumentChunk.objects.filter(document__assistant_id=assistant_id, embedding_blob__isnull=False)
+
+    @classmethod
+    def update(cls, assistant_id, chunk_ids: List[int] = ()) -> Optional["IVFQuantizer"]:
+        """
+        Keep an assistant's quantizer current after ingestion.
+
+        Trains it when the assistant reaches VECTOR_IVF_MIN_CHUNKS chunks or
+        has grown VECTOR_IVF_RETRAIN_GROWTH times since the last training,
+        drops it when the assistant shrank below the threshold, and otherwise
+        just assigns ``chunk_ids`` to their nearest centroid.
+
+        Returns:
+            The assistant's quantizer, or None when it uses the flat scan
+        """
+        if not assistant_id:
+            return None
+
+        min_chunks = settings.VECTOR_IVF_MIN_CHUNKS
+        total = cls._embedded_chunks(assistant_id).count()
+        quantizer = cls.objects.filter(assistant_id=assistant_id).first()
+
+        if not min_chunks or total < min_chunks:
+            if quantizer is not None:
+                quantizer.delete()
+                IndexChange.record(assistant_id, rebuild=True)
+            return None
+
+        if (
+            quantizer is None
+            or quantizer.dimensions != settings.EMBEDDING_DIMENSIONS
+            or total >= quantizer.trained_chunks * settings.VECTOR_IVF_RETRAIN_GROWTH
+        ):
+            return cls.train(assistant_id)
+
+        quantizer.assign(chunk_ids)
+        return quantizer
+
+    @classmethod
+    def train(cls, assistant_id, clusters: Optional[int] = None) -> "IVFQuantizer":
+        """
+        Cluster a sample of the assistant's embeddings and reassign every chunk.
+
+        Args:
+            assistant_id: Assistant to train the quantizer for
+            clusters (int, optional): Number of clusters. Defaults to
+                settings.VECTOR_IVF_CLUSTERS, or sqrt(chunks) when that is 0.
+        """
+        chunks = cls._embedded_chunks(assistant_id)
+        total = chunks.count()
+        if not total:
+            raise ValueError(f"Assistant {assistant_id} has no embedded chunks to cluster.")
+        clusters = clusters or settings.VECTOR_IVF_CLUSTERS or int(np.sqrt(total))
+        clusters = max(1, min(clusters, total))
+        sample_size = min(total, clusters * settings.VECTOR_IVF_TRAIN_SAMPLE_PER_CLUSTER)
+
+        started = time.monotonic()
+        _, sample = decode_rows(
+            chunks.order_by('?').values_list('id', 'embedding_blob', 'embedding_codec', 'embedding_scale')[:sample_size]
+        )
+        centroids = spherical_kmeans(sample, clusters, iterations=settings.VECTOR_IVF_TRAIN_ITERATIONS)
+
+        quantizer, _ = cls.objects.update_or_create(
+            assistant_id=assistant_id,
+            defaults={
+                'centroids': centroids.tobytes(),
+                'clusters': len(centroids),
+                'dimensions': centroids.shape[1],
+                'trained_chunks': total,
+            }
+        )
+        quantizer.assign(chunks.values_list('id', flat=True))
+        IndexChange.record(assistant_id, rebuild=True)
+
+        logger.info(
+            f"Trained IVF quantizer for assistant {assistant_id}: {len(centroids)} clusters "
+            f"from {len(sample)} of {total} chunks in {time.monotonic() - started:.1f}s"
+        )
+        return quantizer
+
+    def assign(self, chunk_ids: List[int], batch_size: int = 5000) -> None:
+        """Store the nearest centroid of each chunk in ``DocumentChunk.ivf_cluster``."""
+        chunk_ids = list(chunk_ids)
+        if not chunk_ids:
+            return
+
+        centroids = self.centroid_matrix()
+        members: Dict[int, List[int]] = {}
+        for start in range(0, len(chunk_ids), batch_size):
+            ids, matrix = decode_rows(
+                DocumentChunk.objects.filter(
+                    id__in=chunk_ids[start:start + batch_size],
+                    embedding_blob__isnull=False
+                ).values_list('id', 'embedding_blob', 'embedding_codec', 'embedding_scale')
+            )
+            if not len(ids):
+                continue
+            for chunk_id, cluster in zip(ids.tolist(), assign_clusters(matrix, centroids).tolist()):
+                members.setdefault(cluster, []).append(chunk_id)
+
+        # One UPDATE per cluster rather than per chunk
+        with transaction.atomic():
+            for cluster, ids in members.items():
+                DocumentChunk.objects.filter(id__in=ids).update(ivf_cluster=cluster)
+
+
+class EmbeddingCacheEntry(models.Model):
+    """
+    Durable embedding cache keyed by (embedding model, chunk text hash).
+
+    Ingestion checks it before calling the embedding API, so re-adding a
+    deleted document, adding the same URL to another assistant or retrying
+    a failed job costs no API calls. Entries unused for
+    EMBEDDING_CACHE_RETENTION_DAYS, or beyond EMBEDDING_CACHE_MAX_ENTRIES
+    least recently used, are removed by ``manage.py prune_embedding_cache``.
+    """
+    model = models.CharField(max_length=100)
+    text_hash = models.CharField(max_length=64)
+    vector = ArrayField(models.FloatField())
+    hits = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    # Process-wide lookup counters
+    counters = Counter()
+    _counters_lock = threading.Lock()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['model', 'text_hash'], name='embeddingcache_model_text_hash'),
+        ]
+
+    def __str__(self):
+        return f"{self.model}:{self.text_hash}"
+
+    @classmethod
+    def _count(cls, **increments) -> None:
+        with cls._counters_lock:
+            cls.counters.update(increments)
+
+    @classmethod
+    def lookup(cls, hashes: List[str], model: Optional[str] = None) -> Dict[str, List[float]]:
+        """
+        Return cached embeddings for the given text hashes, falling back to
+        embeddings DocumentChunk rows store for the same model.
+
+        Args:
+            hashes: Chunk text hashes
+            model (str, optional): Embedding model. Defaults to settings.EMBEDDING_MODEL.
+        """
+        cache_model = embedding_cache_model(model)
+        found = dict(
+            cls.objects.filter(model=cache_model, text_hash__in=hashes).values_list('text_hash', 'vector')
+        )
+        if found:
+            cls.objects.filter(model=cache_model, text_hash__in=list(found)).update(
+                hits=F('hits') + 1,
+                last_used_at=timezone.now()
+            )
+
+        # Pruned entries may still be stored on chunks. Those are quantized, so they are
+        # reused as stored but not cached as exact embeddings
+        missing = [text_hash for text_hash in hashes if text_hash not in found]
+        from_chunks = DocumentChunk.stored_embeddings(missing, model=model) if missing else {}
+        found.update(from_chunks)
+
+        cls._count(hits=len(found), misses=len(hashes) - len(found))
+        return found
+
+    @classmethod
+    def store(cls, vectors: Dict[str, List[float]], model: Optional[str] = None) -> None:
+        """Save new embeddings; existing (model, hash) entries are left untouched."""
+        model = embedding_cache_model(model)
+        cls.objects.bulk_create(
+            [cls(model=model, text_hash=text_hash, vector=vector) for text_hash, vector in vectors.items()],
+            batch_size=settings.CHUNK_BULK_CREATE_BATCH_SIZE,
+            ignore_conflicts=True
+        )
+        cls._count(stored=len(vectors))
+
+    @classmethod
+    def prune(cls, retention_days: Optional[int] = None, max_entries: Optional[int] = None) -> int:
+        """
+        Delete entries unused for ``retention_days`` and, beyond ``max_entries``,
+        the least recently used ones. Returns the number of entries deleted.
+        """
+        if retention_days is None:
+            retention_days = settings.EMBEDDING_CACHE_RETENTION_DAYS
+        if max_entries is None:
+            max_entries = settings.EMBEDDING_CACHE_MAX_ENTRIES
+
+        deleted, _ = cls.objects.filter(
+            last_used_at__lt=timezone.now() - timedelta(days=retention_days)
+        ).delete()
+
+        cutoff = next(iter(cls.objects.order_by('-last_used_at').values_list(
+            'last_used_at', flat=True
+        )[max_entries:max_entries + 1]), None)
+        if cutoff is not None:
+            overflow, _ = cls.objects.filter(last_used_at__lte=cutoff).delete()
+            deleted += overflow
+
+        cls._count(pruned=deleted)
+        return deleted
+
+    @classmethod
+    def stats(cls) -> Dict[str, float]:
+        """Process counters plus the current size of the cache."""
+        with cls._counters_lock:
+            counters = dict(cls.counters)
+        hits, misses = counters.get('hits', 0), counters.get('misses', 0)
+        return {
+            **counters,
+            'entries': cls.objects.count(),
+            'hit_rate': hits / (hits + misses) if hits + misses else 0.0,
+        }
+
+
+class IngestionJob(models.Model):
+    """
+    Queued knowledge-base ingestion for a PDFDocument.
+
+    Jobs are claimed by ``manage.py ingestion_worker`` processes with
+    SELECT ... FOR UPDATE SKIP LOCKED, so uploads return immediately and
+    several workers can drain the queue concurrently.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, unique=True)
+    document = models.ForeignKey(
+        PDFDocument,
+        on_delete=models.CASCADE,
+        related_name='ingestion_jobs'
+    )
+    status = models.CharField(
+        max_length=20,
+        choices=PDFDocument.PROCESSING_STATUS_CHOICES,
+        default='pending'
+    )
+    attempts = models.IntegerField(default=0)
+    worker = models.CharField(max_length=255, null=True, blank=True)
+    error = models.TextField(null=True, blank=True)
+
+    # Progress counters reported while the document is processed
+    pages_extracted = models.IntegerField(default=0)
+    chunks_total = models.IntegerField(default=0)
+    chunks_embedded = models.IntegerField(default=0)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='ingestionjob_status_created'),
+        ]
+
+    def __str__(self):
+        return f"Ingestion of {self.document} ({self.status})"
+
+    @classmethod
+    def enqueue(cls, document: PDFDocument) -> "IngestionJob":
+        """Queue a document for background processing."""
+        return cls.objects.create(document=document)
+
+    @classmethod
+    def claim_next(cls, worker: str, stale_after: Optional[int] = None) -> Optional["IngestionJob"]:
+        """
+        Atomically claim the oldest pending job for ``worker``.
+
+        Args:
+            worker (str): Identifier of the claiming worker
+            stale_after (int, optional): Seconds after which a 'processing' job whose
+                worker stopped reporting progress is considered abandoned and re-claimed
+        """
+        with transaction.atomic():
+            claimable = models.Q(status='pending')
+            if stale_after:
+                claimable |= models.Q(
+                    status='processing',
+                    updated_at__lt=timezone.now() - timedelta(seconds=stale_after)
+                )
+
+            job = cls.objects.select_for_update(skip_locked=True).filter(
+                claimable
+            ).order_by('created_at').first()
+
+            if job is None:
+                return None
+
+            job.status = 'processing'
+            job.worker = worker
+            job.attempts += 1
+            job.started_at = timezone.now()
+            job.save()
+            return job
+
+    def report_progress(self, **counters) -> None:
+        """Persist progress counters without touching the rest of the row."""
+        for field, value in counters.items():
+            setattr(self, field, value)
+        IngestionJob.objects.filter(pk=self.pk).update(updated_at=timezone.now(), **counters)
+
+    def run(self, max_attempts: int = 3) -> None:
+        """Process the job's document, recording the outcome on the job."""
+        try:
+            self.document.process_pdf(progress=self.report_progress)
+            self.status = 'completed'
+            self.error = None
+        except Exception as e:
+            logger.error(f"Ingestion job {self.id} failed (attempt {self.attempts}): {e}")
+            self.error = str(e)
+            # Retry later unless the attempts are exhausted
+            self.status = 'pending' if self.attempts < max_attempts else 'failed'
+            if self.status == 'pending':
+                PDFDocument.objects.filter(pk=self.document_id).update(status='pending')
+
+        if self.status != 'pending':
+            self.finished_at = timezone.now()
+        self.save()
+
+    def as_progress(self) -> dict:
+        return {
+            'job_id': str(self.id),
+            'document_id': str(self.document_id),
+            'status': self.status,
+            'pages_extracted': self.pages_extracted,
+            'chunks_total': self.chunks_total,
+            'chunks_embedded': self.chunks_embedded,
+            'error': self.error,
+        }
+
 
 class Subject(models.Model):
     id = models.AutoField(primary_key=True, unique=True)
@@ -0,0 +1,73 @@
+"""
+Parallel PDF text extraction.
+
+The page range is split into fixed-size slices that are parsed in a process
+pool, reading the stored file in place. Pages are yielded in document order
+as soon as their slice is done, so callers can chunk and embed early pages
+while later ones are still being extracted.
+
+This module deliberately avoids importing Django so spawned workers start fast.
+"""
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List, Optional, Tuple
+
+from pypdf import PdfReader
+
+logger = logging.getLogger(__name__)
+
+
+def _extract_page_range(path: str, start: int, stop: int) -> List[Tuple[int, str]]:
+    """Extract text of pages ``[start, stop)``; runs inside a pool worker."""
+    reader = PdfReader(path)
+    pages = []
+    for index in range(start, stop):
+        try:
+            text = reader.pages[index].extract_text() or ""
+        except Exception as e:
+            logger.error(f"Error extracting page {index + 1} of {path}: {e}")
+            text = ""
+        pages.append((index + 1, text))
+    return pages
+
+
+def count_pages(path: str) -> int:
+    return len(PdfReader(path).pages)
+
+
+def iter_pdf_pages(path: str, workers: Optional[int] = None, pages_per_task: int = 16,
+                   min_parallel_pages: int = 32) -> Iterator[Tuple[int, str]]:
+    """
+    Yield ``(page_number, text)`` for every page of a PDF, in order.
+
+    Args:
+        path (str): Path of the PDF on local storage
+        workers (int, optional): Pool size. Defaults to the number of CPUs.
+        pages_per_task (int): Pages parsed per pool task
+        min_parallel_pages (int): Documents shorter than this are parsed in-process
+    """
+    total_pages = count_pages(path)
+    workers = workers or os.cpu_count() or 1
+
+    if workers <= 1 or total_pages < min_parallel_pages:
+        yield from _extract_page_range(path, 0, total_pages)
+        return
+
+    ranges = [
+        (start, min(start + pages_per_task, total_pages))
+        for start in range(0, total_pages, pages_per_task)
+    ]
+    logger.info(f"Extracting {total_pages} pages from {path} with {workers} processes")
+
+    # spawn: forking a process that holds DB connections and threads is unsafe
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=min(workers, len(ranges)), mp_context=context) as executor:
+        futures = [executor.submit(_extract_page_range, path, start, stop) for start, stop in ranges]
+        try:
+            for future in futures:
+                yield from future.result()
+        finally:
+            for future in futures:
+                future.cancel()
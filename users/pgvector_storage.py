@@ -0,0 +1,89 @@
+"""
+The optional pgvector copy of chunk embeddings.
+
+``embedding_blob`` is the stored embedding of every chunk. The float32
+``DocumentChunk.embedding`` column and its HNSW index are only kept while
+``VECTOR_SEARCH_BACKEND`` is 'pgvector'; ``sync_storage`` fills or empties them
+when the backend changes (``manage.py sync_pgvector``).
+"""
+import logging
+
+from django.conf import settings
+
+from .embedding_codec import decode_embedding
+
+logger = logging.getLogger(__name__)
+
+HNSW_INDEX_NAME = 'documentchunk_embedding_hnsw'
+BATCH_SIZE = 500
+
+CREATE_HNSW_INDEX_SQL = f"""
+    CREATE INDEX IF NOT EXISTS {HNSW_INDEX_NAME}
+    ON users_documentchunk USING hnsw (embedding vector_cosine_ops)
+    WITH (m = 16, ef_construction = 64);
+"""
+DROP_HNSW_INDEX_SQL = f"DROP INDEX IF EXISTS {HNSW_INDEX_NAME};"
+
+
+def pgvector_enabled() -> bool:
+    return settings.VECTOR_SEARCH_BACKEND == 'pgvector'
+
+
+def backfill_embeddings(DocumentChunk, batch_size: int = BATCH_SIZE) -> int:
+    """Decode ``embedding_blob`` into the pgvector column of chunks that lack it. Returns the rows written."""
+    written = 0
+    last_id = 0
+    while True:
+        batch = list(
+            DocumentChunk.objects.filter(
+                id__gt=last_id,
+                embedding_blob__isnull=False,
+                embedding__isnull=True
+            ).order_by('id').values_list('id', 'embedding_blob', 'embedding_codec', 'embedding_scale')[:batch_size]
+        )
+        if not batch:
+            return written
+
+        DocumentChunk.objects.bulk_update(
+            [
+                DocumentChunk(id=chunk_id, embedding=decode_embedding(blob, codec, scale))
+                for chunk_id, blob, codec, scale in batch
+            ],
+            ['embedding']
+        )
+        written += len(batch)
+        last_id = batch[-1][0]
+
+
+def clear_embeddings(DocumentChunk, batch_size: int = BATCH_SIZE) -> int:
+    """Null the pgvector column of chunks whose embedding is also in ``embedding_blob``. Returns the rows cleared."""
+    cleared = 0
+    while True:
+        ids = list(
+            DocumentChunk.objects.filter(
+                embedding__isnull=False,
+                embedding_blob__isnull=False
+            ).order_by('id').values_list('id', flat=True)[:batch_size]
+        )
+        if not ids:
+            return cleared
+        cleared += DocumentChunk.objects.filter(id__in=ids).update(embedding=None)
+
+
+def sync_storage(DocumentChunk, schema_editor, enabled: bool) -> int:
+    """
+    Make the pgvector column and HNSW index match ``enabled``: backfill the column and build
+    the index, or drop the index and free the column.
+
+    Returns:
+        Number of chunk rows written or cleared
+    """
+    if enabled:
+        changed = backfill_embeddings(DocumentChunk)
+        # Built after the backfill, which is much faster than maintaining it row by row
+        schema_editor.execute(CREATE_HNSW_INDEX_SQL)
+    else:
+        schema_editor.execute(DROP_HNSW_INDEX_SQL)
+        changed = clear_embeddings(DocumentChunk)
+    logger.info(f"pgvector storage {'enabled' if enabled else 'disabled'}: {changed} chunks updated")
+    return changed
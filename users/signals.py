@@ -0,0 +1,43 @@
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from .models import Assistant, DocumentChunk, IndexChange, PDFDocument
+from .vector_index import vector_index_cache
+from .vector_shards import shard_store
+
+
+# DocumentChunk deliberately has no delete receivers: any receiver makes Django
+# load every chunk (embeddings included) before a cascade delete. Chunk removals
+# are recorded at the document level instead.
+
+@receiver(post_save, sender=DocumentChunk)
+def record_chunk_save(sender, instance, created, **kwargs):
+    """Append the chunk to the assistant's indexes, replacing the old row on updates."""
+    assistant_id = instance.document.assistant_id_id
+    IndexChange.record(
+        assistant_id,
+        added=[instance.id],
+        removed=[] if created else [instance.id]
+    )
+
+
+@receiver(pre_delete, sender=PDFDocument)
+def collect_document_chunks(sender, instance, **kwargs):
+    # Ids only; the chunks themselves are fast-deleted by the cascade
+    instance._deleted_chunk_ids = list(instance.chunks.values_list('id', flat=True))
+
+
+@receiver(post_delete, sender=PDFDocument)
+def record_document_delete(sender, instance, **kwargs):
+    """Tombstone the document's chunks in every worker's index."""
+    IndexChange.record(
+        instance.assistant_id_id,
+        removed=getattr(instance, '_deleted_chunk_ids', [])
+    )
+
+
+@receiver(post_delete, sender=Assistant)
+def drop_assistant_index(sender, instance, **kwargs):
+    vector_index_cache.invalidate(instance.id)
+    shard_store.remove(instance.id)
+    IndexChange.objects.filter(assistant_id=instance.id).delete()
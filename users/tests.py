@@ -1,3 +1,330 @@
-from django.test import TestCase
+import threading
+import time
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.test import SimpleTestCase, override_settings
+
+from .chunking import TokenChunker
+from .embedding_codec import (
+    FLOAT16, INT8, decode_embedding, decode_matrix, encode_embedding, quantize_matrix
+)
+from .ingestion import EmbeddingPipeline, content_hash
+from .vector_index import (
+    AssistantIndex, IVFLists, assign_clusters, normalize_rows, reciprocal_rank_fusion, spherical_kmeans
+)
+
+
+def random_matrix(rows, dims=16, seed=0):
+    return np.random.default_rng(seed).standard_normal((rows, dims)).astype(np.float32)
+
+
+class WordEncoding:
+    """Stand-in for a tiktoken encoding with one token per whitespace-separated word."""
+
+    def encode(self, text, disallowed_special=()):
+        return text.split()
+
+    def decode(self, tokens):
+        return " ".join(tokens)
+
+
+def fake_vector(text):
+    return [float(int(content_hash(text)[:8], 16)), float(len(text))]
+
+
+@override_settings(VECTOR_PREFILTER='off')
+class AssistantIndexSearchTests(SimpleTestCase):
+    def setUp(self):
+        self.matrix = random_matrix(50)
+        self.index = AssistantIndex.from_rows(zip(range(100, 150), self.matrix))
+
+    def test_returns_top_k_by_cosine_similarity(self):
+        query = self.matrix[7] + 0.01
+        results = self.index.search(query, k=5)
+
+        normalized = self.matrix / np.linalg.norm(self.matrix, axis=1, keepdims=True)
+        expected = normalized @ (query / np.linalg.norm(query))
+        top = np.argsort(-expected)[:5]
+        self.assertEqual([chunk_id for chunk_id, _ in results], [100 + int(i) for i in top])
+        self.assertEqual(results[0][0], 107)
+        np.testing.assert_allclose([score for _, score in results], expected[top], rtol=1e-5)
+
+    def test_restricts_search_to_given_chunks(self):
+        results = self.index.search(self.matrix[7], k=3, chunk_ids=[120, 130, 140, 999])
+        self.assertEqual(sorted(chunk_id for chunk_id, _ in results), [120, 130, 140])
+
+    def test_k_larger_than_index(self):
+        self.assertEqual(len(self.index.search(self.matrix[0], k=500)), 50)
+
+    def test_empty_index_and_zero_query(self):
+        empty = AssistantIndex.from_rows([])
+        self.assertEqual(empty.search(self.matrix[0], k=5), [])
+        self.assertEqual(self.index.search(np.zeros(16), k=5), [])
+
+
+
+@override_settings(VECTOR_PREFILTER='off')
+class AssistantIndexUpdateTests(SimpleTestCase):
+    def setUp(self):
+        self.matrix = random_matrix(6)
+        self.index = AssistantIndex.from_rows(zip(range(1, 7), self.matrix), change_id=3)
+
+    def ids(self, index, query):
+        return {chunk_id for chunk_id, _ in index.search(query, k=100)}
+
+    def test_apply_adds_and_removes_in_a_new_snapshot(self):
+        added = random_matrix(2, seed=1)
+        updated = self.index.apply([7, 8], added, removed_ids=[2, 5], change_id=4)
+
+        self.assertEqual(self.ids(updated, self.matrix[0]), {1, 3, 4, 6, 7, 8})
+        self.assertEqual((len(updated), updated.change_id), (6, 4))
+        self.assertEqual(updated.search(added[1], k=1)[0][0], 8)
+        # The original snapshot is untouched
+        self.assertEqual(self.ids(self.index, self.matrix[0]), {1, 2, 3, 4, 5, 6})
+        self.assertEqual(self.index.change_id, 3)
+
+    def test_replaying_a_change_does_not_duplicate_chunks(self):
+        added = random_matrix(1, seed=1)
+        once = self.index.apply([7], added, removed_ids=[], change_id=4)
+        twice = once.apply([7], added, removed_ids=[], change_id=4)
+
+        self.assertEqual(len(twice), 7)
+        self.assertEqual(len(twice.delta_ids), 1)
+
+    def test_removed_then_re_added_chunk_is_live(self):
+        replacement = random_matrix(1, seed=2)
+        updated = self.index.apply([3], replacement, removed_ids=[3], change_id=4)
+
+        self.assertEqual(len(updated), 6)
+        self.assertEqual(updated.search(replacement[0], k=1)[0][0], 3)
+
+    def test_restricted_search_covers_delta_rows(self):
+        updated = self.index.apply([7], random_matrix(1, seed=1), removed_ids=[2], change_id=4)
+        results = updated.search(self.matrix[0], k=10, chunk_ids=[1, 2, 7])
+        self.assertEqual({chunk_id for chunk_id, _ in results}, {1, 7})
+
+    def test_compacted_folds_delta_and_tombstones(self):
+        added = random_matrix(2, seed=1)
+        updated = self.index.apply([7, 8], added, removed_ids=[2], change_id=4)
+        compacted = updated.compacted()
+
+        self.assertEqual(sorted(compacted.chunk_ids.tolist()), [1, 3, 4, 5, 6, 7, 8])
+        self.assertEqual((len(compacted.delta_ids), compacted.dead, compacted.change_id), (0, None, 4))
+        self.assertEqual(compacted.garbage_ratio, 0)
+        for query in (self.matrix[3], added[0]):
+            expected = updated.search(query, k=3)
+            results = compacted.search(query, k=3)
+            self.assertEqual([chunk_id for chunk_id, _ in results], [chunk_id for chunk_id, _ in expected])
+            np.testing.assert_allclose([score for _, score in results], [score for _, score in expected], rtol=1e-5)
+
+    def test_compacting_everything_away(self):
+        emptied = self.index.apply([], [], removed_ids=range(1, 7), change_id=4).compacted()
+        self.assertEqual(len(emptied), 0)
+        self.assertEqual(emptied.search(self.matrix[0], k=3), [])
+
+
+
+def clustered_matrix(per_cluster=20, dims=16, seed=0):
+    """Rows scattered tightly around three orthogonal directions, and their true cluster."""
+    rng = np.random.default_rng(seed)
+    directions = np.eye(dims, dtype=np.float32)[:3]
+    labels = np.repeat(np.arange(3), per_cluster)
+    matrix = directions[labels] + 0.05 * rng.standard_normal((len(labels), dims)).astype(np.float32)
+    return normalize_rows(matrix), labels, directions
+
+
+class IVFTests(SimpleTestCase):
+    def test_spherical_kmeans_finds_separated_clusters(self):
+        matrix, labels, directions = clustered_matrix()
+        centroids = spherical_kmeans(matrix, 3, iterations=10)
+
+        np.testing.assert_allclose(np.linalg.norm(centroids, axis=1), 1.0, rtol=1e-5)
+        # Each true direction has its own centroid, and rows land with their cluster
+        self.assertEqual(sorted(np.argmax(centroids @ directions.T, axis=1).tolist()), [0, 1, 2])
+        assignments = assign_clusters(matrix, centroids)
+        for label in range(3):
+            self.assertEqual(len(set(assignments[labels == label].tolist())), 1)
+
+    def test_spherical_kmeans_caps_clusters_at_rows(self):
+        self.assertEqual(spherical_kmeans(random_matrix(4), 10).shape, (4, 16))
+
+    def test_group_sorts_rows_into_contiguous_lists(self):
+        chunk_ids = np.arange(10, 16)
+        matrix = random_matrix(6)
+        clusters = np.array([2, 0, 2, 0, 0, 2], dtype=np.int32)
+        centroids = np.eye(16, dtype=np.float32)[:3]
+        ids, grouped, ivf = IVFLists.group(chunk_ids, matrix, clusters, centroids)
+
+        self.assertEqual(ids.tolist(), [11, 13, 14, 10, 12, 15])
+        np.testing.assert_array_equal(grouped, matrix[[1, 3, 4, 0, 2, 5]])
+        self.assertEqual(ivf.offsets.tolist(), [0, 3, 3, 6])
+        self.assertEqual(ivf.row_clusters().tolist(), [0, 0, 0, 2, 2, 2])
+
+    def test_probe_returns_nearest_non_empty_lists(self):
+        centroids = np.eye(16, dtype=np.float32)[:3]
+        ivf = IVFLists(centroids, np.array([0, 3, 3, 6]))
+        query = np.zeros(16, dtype=np.float32)
+        query[:3] = [0.2, 0.9, 0.5]
+
+        self.assertEqual(ivf.probe(query, 1), [])
+        self.assertEqual(ivf.probe(query, 2), [(3, 6)])
+        self.assertEqual(ivf.probe(query, 10), [(0, 3), (3, 6)])
+
+    def test_clustered_index_scans_only_probed_lists(self):
+        matrix, labels, directions = clustered_matrix()
+        centroids = spherical_kmeans(matrix, 3)
+        rows = [(chunk_id, *encode_embedding(vector), None) for chunk_id, vector in enumerate(matrix)]
+        index = AssistantIndex.from_clustered(rows, centroids)
+        query = directions[1]
+
+        with override_settings(VECTOR_IVF_NPROBE=1):
+            results = index.search(query, k=100)
+        self.assertEqual(sorted(chunk_id for chunk_id, _ in results), np.flatnonzero(labels == 1).tolist())
+
+        with override_settings(VECTOR_IVF_NPROBE=3):
+            self.assertEqual(len(index.search(query, k=100)), len(matrix))
+
+
+@override_settings(EMBEDDING_BATCH_MAX_INPUTS=2, EMBEDDING_BATCH_MAX_TOKENS=1000)
+class EmbeddingPipelineTests(SimpleTestCase):
+    def setUp(self):
+        self.requested = []
+        self.lock = threading.Lock()
+        patcher = mock.patch('users.ingestion.get_encoding', return_value=WordEncoding())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def fake_embed_batch(self, inputs, model):
+        with self.lock:
+            self.requested.extend(inputs)
+            batch_number = len(self.requested)
+        # Earlier batches finish last, so results arrive out of order
+        time.sleep(0.05 / batch_number)
+        return [fake_vector(text) for text in inputs]
+
+    def run_pipeline(self, groups, **kwargs):
+        with mock.patch('users.ingestion._embed_batch', side_effect=self.fake_embed_batch):
+            pipeline = EmbeddingPipeline(max_workers=4, lookup_batch_size=1, **kwargs)
+            for texts in groups:
+                pipeline.add(texts)
+            return pipeline, pipeline.finish()
+
+    def test_embeddings_follow_the_order_chunks_were_added(self):
+        texts = [f"chunk number {i}" for i in range(9)]
+        pipeline, vectors = self.run_pipeline([texts[:4], texts[4:]])
+
+        self.assertEqual(vectors, [fake_vector(text) for text in texts])
+        self.assertEqual(pipeline.hashes, [content_hash(text) for text in texts])
+
+    def test_repeated_chunks_are_embedded_once(self):
+        texts = ["alpha", "beta", "alpha", "gamma", "beta", "alpha"]
+        progress = []
+        pipeline, vectors = self.run_pipeline([texts[:3], texts[3:]], progress=progress.append)
+
+        self.assertEqual(sorted(self.requested), ["alpha", "beta", "gamma"])
+        self.assertEqual(vectors, [fake_vector(text) for text in texts])
+        self.assertEqual(progress[-1], len(texts))
+
+    def test_stored_embeddings_are_reused(self):
+        stored = {content_hash("alpha"): [1.0, 2.0]}
+        lookup = mock.Mock(side_effect=lambda hashes: {h: stored[h] for h in hashes if h in stored})
+        store = mock.Mock()
+        pipeline, vectors = self.run_pipeline([["alpha", "beta"], ["alpha"]], lookup=lookup, store=store)
+
+        self.assertEqual(self.requested, ["beta"])
+        self.assertEqual(vectors, [[1.0, 2.0], fake_vector("beta"), [1.0, 2.0]])
+        self.assertEqual(pipeline.reused, 1)
+        store.assert_called_once_with({content_hash("beta"): fake_vector("beta")})
+
+
+class TokenChunkerTests(SimpleTestCase):
+    def setUp(self):
+        with mock.patch('users.chunking.get_encoding', return_value=WordEncoding()):
+            self.chunker = TokenChunker(target_tokens=10, overlap_tokens=3)
+
+    def test_chunks_stay_within_the_token_target(self):
+        text = " ".join(f"w{i}" for i in range(95))
+        chunks = self.chunker.split(text)
+
+        self.assertGreater(len(chunks), 1)
+        for chunk, token_count in chunks:
+            self.assertEqual(token_count, len(chunk.split()))
+            self.assertLessEqual(token_count, 10)
+        self.assertEqual(chunks[0][0].split()[0], "w0")
+        self.assertEqual(chunks[-1][0].split()[-1], "w94")
+
+    def test_consecutive_chunks_overlap(self):
+        text = " ".join(f"w{i}" for i in range(40))
+        chunks = [chunk.split() for chunk, _ in self.chunker.split(text)]
+
+        for previous, current in zip(chunks, chunks[1:]):
+            overlap = [word for word in current if word in previous]
+            self.assertTrue(0 < len(overlap) <= 3)
+            self.assertEqual(overlap, previous[-len(overlap):])
+
+    def test_splits_on_paragraphs_first(self):
+        first = " ".join(["alpha"] * 6)
+        second = " ".join(["beta"] * 6)
+        self.assertEqual(self.chunker.split(f"{first}\n\n{second}"), [(first, 6), (second, 6)])
+
+    def test_short_and_empty_text(self):
+        self.assertEqual(self.chunker.split("just a few words"), [("just a few words", 4)])
+        self.assertEqual(self.chunker.split(""), [])
+
+
+class ReciprocalRankFusionTests(SimpleTestCase):
+    def test_chunks_ranked_well_in_both_lists_win(self):
+        vector = [(1, 0.9), (2, 0.8), (3, 0.7)]
+        lexical = [(3, 12.0), (1, 4.0), (4, 1.0)]
+        fused = reciprocal_rank_fusion([vector, lexical], k=60)
+
+        self.assertEqual([chunk_id for chunk_id, _ in fused], [1, 3, 2, 4])
+        self.assertAlmostEqual(fused[0][1], 1 / 61 + 1 / 62)
+        self.assertAlmostEqual(fused[-1][1], 1 / 63)
+
+    def test_scores_are_ignored_and_single_lists_keep_their_order(self):
+        ranking = [(7, 0.1), (8, 50.0), (9, -3.0)]
+        self.assertEqual([chunk_id for chunk_id, _ in reciprocal_rank_fusion([ranking])], [7, 8, 9])
+        self.assertEqual(reciprocal_rank_fusion([]), [])
+
+
+class EmbeddingCodecTests(SimpleTestCase):
+    def setUp(self):
+        self.vector = random_matrix(1, dims=1536)[0] * 0.05
+
+    def test_float16_round_trip(self):
+        blob, codec, scale = encode_embedding(self.vector, FLOAT16)
+
+        self.assertEqual((codec, scale, len(blob)), (FLOAT16, None, 1536 * 2))
+        decoded = decode_embedding(blob, codec, scale)
+        self.assertEqual(decoded.dtype, np.float32)
+        np.testing.assert_allclose(decoded, self.vector, rtol=1e-3, atol=1e-6)
+
+    def test_int8_round_trip(self):
+        blob, codec, scale = encode_embedding(self.vector, INT8)
+
+        self.assertEqual((codec, len(blob)), (INT8, 1536))
+        decoded = decode_embedding(blob, codec, scale)
+        # Rounding to the nearest step loses at most half a step per dimension
+        self.assertLessEqual(np.abs(decoded - self.vector).max(), scale / 2 + 1e-7)
+        cosine = decoded @ self.vector / (np.linalg.norm(decoded) * np.linalg.norm(self.vector))
+        self.assertGreater(cosine, 0.999)
+
+    def test_int8_zero_vector(self):
+        blob, codec, scale = encode_embedding(np.zeros(8), INT8)
+        np.testing.assert_array_equal(decode_embedding(blob, codec, scale), np.zeros(8))
+
+    def test_decode_matrix_mixes_codecs_in_row_order(self):
+        matrix = random_matrix(4, dims=32)
+        rows = [encode_embedding(vector, codec) for vector, codec in zip(matrix, [FLOAT16, INT8, INT8, FLOAT16])]
+        decoded = decode_matrix(*zip(*rows))
+
+        for decoded_row, (blob, codec, scale) in zip(decoded, rows):
+            np.testing.assert_array_equal(decoded_row, decode_embedding(blob, codec, scale))
+
+    def test_quantize_matrix_matches_per_vector_encoding(self):
+        matrix = random_matrix(3, dims=32)
+        for codec in (FLOAT16, INT8):
+            expected = [decode_embedding(*encode_embedding(vector, codec)) for vector in matrix]
+            np.testing.assert_allclose(quantize_matrix(matrix, codec), expected, rtol=1e-6)
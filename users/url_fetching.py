@@ -0,0 +1,169 @@
+"""
+Concurrent fetch stage for URL knowledge-base sources.
+
+All web pages of a document are fetched at once over a shared aiohttp
+connection pool with a per-host connection limit and strict timeouts, one
+GET per URL. YouTube transcripts are loaded in threads alongside them.
+ETag / Last-Modified validators from a previous fetch can be passed back
+in so an unchanged page costs a 304 instead of a download.
+"""
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+from urllib.parse import urlparse
+
+import aiohttp
+from bs4 import BeautifulSoup
+from django.conf import settings
+from langchain_community.document_loaders import YoutubeLoader
+
+logger = logging.getLogger(__name__)
+
+YOUTUBE_DOMAINS = ['youtube.com', 'www.youtube.com', 'youtu.be', 'm.youtube.com']
+
+
+def is_youtube_url(url: str) -> bool:
+    return (
+        urlparse(url).netloc in YOUTUBE_DOMAINS
+        or 'youtube.com/watch' in url
+        or 'youtu.be/' in url
+    )
+
+
+@dataclass
+class FetchResult:
+    """
+    Outcome of fetching one URL source.
+
+    Attributes:
+        url (str): The requested URL.
+        text (str): Extracted page text or transcript; empty when unchanged or failed.
+        status (int): HTTP status, 304 when the page is unchanged since the last fetch.
+        etag (str): ETag validator to send on the next fetch.
+        last_modified (str): Last-Modified validator to send on the next fetch.
+        error (str): Error message when the fetch failed.
+    """
+
+    url: str
+    text: str = ""
+    status: int = 0
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    error: Optional[str] = None
+
+    @property
+    def not_modified(self) -> bool:
+        return self.status == 304
+
+    @property
+    def validators(self) -> Dict[str, str]:
+        return {
+            key: value
+            for key, value in (('etag', self.etag), ('last_modified', self.last_modified))
+            if value
+        }
+
+
+def html_to_text(html: str) -> str:
+    soup = BeautifulSoup(html, 'html.parser')
+    for tag in soup(['script', 'style', 'noscript']):
+        tag.decompose()
+    return soup.get_text(' ', strip=True)
+
+
+def _load_youtube(url: str) -> str:
+    docs = YoutubeLoader.from_youtube_url(url, add_video_info=False).load()
+    return " ".join(doc.page_content for doc in docs)
+
+
+async def _fetch_youtube(url: str, semaphore: asyncio.Semaphore) -> FetchResult:
+    async with semaphore:
+        try:
+            text = await asyncio.wait_for(
+                asyncio.to_thread(_load_youtube, url),
+                timeout=settings.URL_FETCH_TIMEOUT
+            )
+            return FetchResult(url=url, text=text, status=200)
+        except Exception as e:
+            logger.error(f"Error processing YouTube URL {url}: {str(e)}")
+            return FetchResult(url=url, error=str(e) or type(e).__name__)
+
+
+async def _fetch_web(session: aiohttp.ClientSession, url: str,
+                     validators: Optional[Dict[str, str]]) -> FetchResult:
+    headers = {}
+    if validators:
+        if validators.get('etag'):
+            headers['If-None-Match'] = validators['etag']
+        if validators.get('last_modified'):
+            headers['If-Modified-Since'] = validators['last_modified']
+
+    try:
+        async with session.get(url, headers=headers) as response:
+            etag = response.headers.get('ETag')
+            last_modified = response.headers.get('Last-Modified')
+            if response.status == 304:
+                return FetchResult(
+                    url=url,
+                    status=304,
+                    etag=etag or (validators or {}).get('etag'),
+                    last_modified=last_modified or (validators or {}).get('last_modified')
+                )
+            response.raise_for_status()
+
+            body = await response.content.read(settings.URL_FETCH_MAX_BYTES)
+            html = body.decode(response.charset or 'utf-8', errors='replace')
+
+        # Parsing is CPU-bound; keep the event loop free for the other downloads
+        text = await asyncio.to_thread(html_to_text, html)
+        return FetchResult(url=url, text=text, status=response.status,
+                           etag=etag, last_modified=last_modified)
+    except Exception as e:
+        logger.error(f"Error processing web URL {url}: {str(e)}")
+        return FetchResult(url=url, error=str(e) or type(e).__name__)
+
+
+async def _fetch_all(urls: List[str], validators: Dict[str, Dict[str, str]]) -> List[FetchResult]:
+    timeout = aiohttp.ClientTimeout(
+        total=settings.URL_FETCH_TIMEOUT,
+        connect=settings.URL_FETCH_CONNECT_TIMEOUT
+    )
+    connector = aiohttp.TCPConnector(
+        limit=settings.URL_FETCH_MAX_CONNECTIONS,
+        limit_per_host=settings.URL_FETCH_PER_HOST_LIMIT
+    )
+    headers = {'User-Agent': settings.URL_FETCH_USER_AGENT}
+    youtube_semaphore = asyncio.Semaphore(settings.URL_FETCH_PER_HOST_LIMIT)
+
+    async with aiohttp.ClientSession(timeout=timeout, connector=connector, headers=headers) as session:
+        return await asyncio.gather(*[
+            _fetch_youtube(url, youtube_semaphore) if is_youtube_url(url)
+            else _fetch_web(session, url, validators.get(url))
+            for url in urls
+        ])
+
+
+def fetch_urls(urls: List[str], validators: Optional[Dict[str, Dict[str, str]]] = None) -> List[FetchResult]:
+    """
+    Fetch every URL concurrently and return results in the same order.
+
+    Args:
+        urls: Web page or YouTube URLs
+        validators (dict, optional): Per-URL {'etag', 'last_modified'} from a previous
+            fetch; matching pages come back as 304 with no text
+
+    Returns:
+        One FetchResult per URL. Failures are logged and reported in ``error``
+        rather than raised.
+
+    Runs its own event loop, so it must be called from sync code; from async code
+    wrap the caller in sync_to_async.
+    """
+    if not urls:
+        return []
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(_fetch_all(list(urls), validators or {}))
+    raise RuntimeError("fetch_urls() cannot run inside an event loop; call it through sync_to_async")
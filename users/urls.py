@@ -17,6 +17,9 @@ urlpatterns = [
     # Generate Instructions
     path('assistants/generate_instructions/<str:assistant_id>', views.generate_instructions, name='generate_instructions'),
     
+    # Knowledge base ingestion progress (server-sent events)
+    path('ingestion/progress/<str:document_id>/', views.ingestion_progress, name='ingestion_progress'),
+
     # Delete KnowledgeBase
     path('delete_document/<str:document_id>/', views.del_knowledgebase, name='del_knowledgebase'),
     
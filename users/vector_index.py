@@ -0,0 +1,576 @@
+"""
+Process-level cache of per-assistant embedding matrices.
+
+Each assistant's chunk embeddings are held as one contiguous, L2-normalized
+float32 matrix with a parallel array of DocumentChunk ids, so a similarity
+query is a single mat-vec followed by an argpartition top-k instead of a
+Python loop over ORM instances.
+"""
+import copy
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Iterable, List, Optional, Tuple
+
+import numpy as np
+from django.conf import settings
+
+from .embedding_codec import decode_matrix
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """L2-normalize each row in place; zero rows are left as zeros."""
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    matrix /= norms
+    return matrix
+
+
+def decode_rows(rows: Iterable[Tuple[int, bytes, str, Optional[float]]]) -> Tuple[np.ndarray, np.ndarray]:
+    """Decode ``(chunk_id, blob, codec, scale)`` rows into ids and a normalized matrix."""
+    rows = list(rows)
+    if not rows:
+        return np.empty(0, dtype=np.int64), np.empty((0, 0), dtype=np.float32)
+
+    chunk_ids, blobs, codecs, scales = zip(*rows)
+    return np.array(chunk_ids, dtype=np.int64), normalize_rows(decode_matrix(blobs, codecs, scales))
+
+
+def reciprocal_rank_fusion(rankings: List[List[Tuple[int, float]]], k: int = 60) -> List[Tuple[int, float]]:
+    """
+    Merge ranked ``(chunk_id, score)`` lists by reciprocal-rank fusion.
+
+    Each list contributes ``1 / (k + rank)`` for every chunk it contains, so
+    rankings with incomparable scores (cosine similarity, text rank) can be
+    combined. Returns ``(chunk_id, fused_score)`` pairs, best first.
+    """
+    fused = {}
+    for ranking in rankings:
+        for rank, (chunk_id, _) in enumerate(ranking, start=1):
+            fused[chunk_id] = fused.get(chunk_id, 0.0) + 1.0 / (k + rank)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
+
+
+def assign_clusters(matrix: np.ndarray, centroids: np.ndarray, block_rows: int = 8192) -> np.ndarray:
+    """Index of the most similar centroid for each normalized row, computed in blocks."""
+    assignments = np.empty(len(matrix), dtype=np.int32)
+    for start in range(0, len(matrix), block_rows):
+        block = matrix[start:start + block_rows]
+        assignments[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+    return assignments
+
+
+def spherical_kmeans(matrix: np.ndarray, clusters: int, iterations: int = 10, seed: int = 0) -> np.ndarray:
+    """
+    Cluster normalized rows by cosine similarity (Lloyd iterations).
+
+    Returns:
+        ``(clusters, dims)`` float32 matrix of normalized centroids
+    """
+    rng = np.random.default_rng(seed)
+    clusters = min(clusters, len(matrix))
+    centroids = np.array(matrix[rng.choice(len(matrix), clusters, replace=False)], dtype=np.float32)
+
+    for _ in range(iterations):
+        assignments = assign_clusters(matrix, centroids)
+        order = np.argsort(assignments, kind='stable')
+        counts = np.bincount(assignments, minlength=clusters)
+        filled = np.flatnonzero(counts)
+        sums = np.zeros_like(centroids)
+        sums[filled] = np.add.reduceat(matrix[order], np.concatenate([[0], np.cumsum(counts)[:-1]])[filled])
+
+        # Re-seed empty clusters with random rows so every list stays in use
+        empty = np.flatnonzero(counts == 0)
+        if len(empty):
+            sums[empty] = matrix[rng.choice(len(matrix), len(empty), replace=False)]
+        centroids = normalize_rows(sums)
+    return centroids
+
+
+class Prefilter:
+    """
+    Reduced-dimension copy of an index's base matrix for first-stage search.
+
+    In 'pca' mode rows are projected onto the top principal components of
+    the assistant's embeddings (ada-002 is not Matryoshka-trained, so plain
+    truncation ranks poorly); 'truncate' keeps the leading dimensions, for
+    models trained to support that.
+    """
+
+    # Rows projected per block, bounding the temporary copy
+    BLOCK_ROWS = 8192
+
+    def __init__(self, reduced: np.ndarray, projection: Optional[np.ndarray] = None,
+                 mean: Optional[np.ndarray] = None):
+        self.reduced = reduced
+        self.projection = projection
+        self.mean = mean
+
+    @classmethod
+    def fit(cls, matrix: np.ndarray) -> Optional["Prefilter"]:
+        """Build a prefilter for ``matrix`` per the VECTOR_PREFILTER settings, or None if not worth it."""
+        mode = settings.VECTOR_PREFILTER
+        dims = settings.VECTOR_PREFILTER_DIMS
+        if mode == 'off' or len(matrix) < settings.VECTOR_PREFILTER_MIN_CHUNKS or dims >= matrix.shape[1]:
+            return None
+
+        if mode == 'truncate':
+            return cls(np.ascontiguousarray(matrix[:, :dims]))
+
+        # PCA from the covariance of a sample of rows; the top components are found by
+        # subspace iteration, which is much cheaper than a full eigendecomposition
+        rng = np.random.default_rng(0)
+        sample_size = min(len(matrix), settings.VECTOR_PREFILTER_SAMPLE)
+        sample = np.asarray(matrix[np.sort(rng.choice(len(matrix), sample_size, replace=False))])
+        mean = sample.mean(axis=0)
+        sample = sample - mean
+        covariance = (sample.T @ sample).astype(np.float64)
+
+        basis = rng.standard_normal((covariance.shape[0], min(covariance.shape[0], dims + 16)))
+        for _ in range(4):
+            basis, _ = np.linalg.qr(covariance @ basis)
+        eigenvalues, eigenvectors = np.linalg.eigh(basis.T @ covariance @ basis)
+        top = np.argsort(eigenvalues)[::-1][:dims]
+        projection = np.ascontiguousarray(basis @ eigenvectors[:, top], dtype=np.float32)
+        mean = mean.astype(np.float32)
+
+        reduced = np.empty((len(matrix), dims), dtype=np.float32)
+        for start in range(0, len(matrix), cls.BLOCK_ROWS):
+            block = matrix[start:start + cls.BLOCK_ROWS]
+            reduced[start:start + len(block)] = (block - mean) @ projection
+        return cls(reduced, projection, mean)
+
+    def project_query(self, query: np.ndarray) -> np.ndarray:
+        # The mean term is the same for every row, so it does not change the ranking
+        if self.projection is None:
+            return query[:self.reduced.shape[1]]
+        return query @ self.projection
+
+    @property
+    def nbytes(self) -> int:
+        return sum(a.nbytes for a in (self.reduced, self.projection, self.mean) if a is not None)
+
+
+class IVFLists:
+    """
+    Inverted lists over an index's base rows.
+
+    The base rows are stored sorted by cluster, so list ``c`` is the slice
+    ``offsets[c]:offsets[c + 1]`` of the matrix and probing a cluster is a
+    contiguous mat-vec. Centroids come from the assistant's IVFQuantizer.
+    """
+
+    def __init__(self, centroids: np.ndarray, offsets: np.ndarray):
+        self.centroids = np.ascontiguousarray(centroids, dtype=np.float32)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+
+    @classmethod
+    def group(cls, chunk_ids: np.ndarray, matrix: np.ndarray, clusters: np.ndarray,
+              centroids: np.ndarray) -> Tuple[np.ndarray, np.ndarray, "IVFLists"]:
+        """Sort rows by their cluster; returns the reordered ids and matrix and the lists over them."""
+        order = np.argsort(clusters, kind='stable')
+        counts = np.bincount(clusters, minlength=len(centroids))
+        offsets = np.concatenate([[0], np.cumsum(counts)])
+        return chunk_ids[order], matrix[order], cls(centroids, offsets)
+
+    def row_clusters(self) -> np.ndarray:
+        return np.repeat(np.arange(len(self.centroids), dtype=np.int32), np.diff(self.offsets))
+
+    def probe(self, query: np.ndarray, nprobe: int) -> List[Tuple[int, int]]:
+        """``(start, stop)`` row ranges of the ``nprobe`` clusters nearest to ``query``."""
+        scores = self.centroids @ query
+        nprobe = min(nprobe, len(scores))
+        nearest = np.sort(np.argpartition(-scores, nprobe - 1)[:nprobe])
+        return [
+            (int(self.offsets[c]), int(self.offsets[c + 1]))
+            for c in nearest
+            if self.offsets[c + 1] > self.offsets[c]
+        ]
+
+    @property
+    def nbytes(self) -> int:
+        return self.centroids.nbytes + self.offsets.nbytes
+
+
+class DocumentRouter:
+    """
+    Summary embeddings of an assistant's documents.
+
+    A query is first routed to the documents whose summary is most similar
+    to it, and chunk search is then limited to those documents. Documents
+    without a summary (not yet embedded) are always kept.
+    """
+
+    def __init__(self, document_ids: List, matrix: np.ndarray, unsummarized: List = ()):
+        self.document_ids = list(document_ids)
+        self.matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+        self.unsummarized = list(unsummarized)
+        self.synced_at = time.monotonic()
+
+    def __len__(self) -> int:
+        return len(self.document_ids) + len(self.unsummarized)
+
+    def route(self, query_embedding, top: int) -> List:
+        """Ids of the ``top`` documents most similar to the query, plus every unsummarized one."""
+        if not self.document_ids:
+            return list(self.unsummarized)
+        scores = self.matrix @ np.asarray(query_embedding, dtype=np.float32)
+        best = np.argsort(-scores)[:top]
+        return [self.document_ids[i] for i in best] + self.unsummarized
+
+    @property
+    def private_bytes(self) -> int:
+        return self.matrix.nbytes
+
+
+class AssistantIndex:
+    """
+    Normalized embedding matrix and chunk ids for a single assistant.
+
+    The base matrix is either built in process or memory-mapped from a shard
+    file (see users/vector_shards.py), in which case ``version`` names that
+    shard version. Small edits are applied without rebuilding the base:
+    added chunks go to a private delta matrix and removed chunks are
+    tombstoned in a mask. ``apply`` returns a new snapshot so concurrent
+    searches never see a half-applied update; ``compacted`` folds the delta
+    and tombstones back into a single matrix.
+
+    Large bases carry a ``prefilter``: search scans the reduced matrix for a
+    shortlist of k * VECTOR_RERANK_MULTIPLIER rows and reranks only those
+    with the full vectors. Delta rows are always scored in full.
+
+    Assistants with an IVFQuantizer carry ``ivf`` lists instead: search
+    scans only the VECTOR_IVF_NPROBE clusters nearest to the query.
+
+    ``change_id`` is the last IndexChange reflected in the index.
+    """
+
+    def __init__(self, chunk_ids: np.ndarray, matrix: np.ndarray, version: Optional[str] = None,
+                 change_id: int = 0, prefilter: Optional[Prefilter] = None, ivf: Optional[IVFLists] = None):
+        self.chunk_ids = np.ascontiguousarray(chunk_ids, dtype=np.int64)
+        self.matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+        self.version = version
+        self.prefilter = prefilter
+        self.ivf = ivf
+        self.change_id = change_id
+        self.delta_ids = np.empty(0, dtype=np.int64)
+        self.delta_matrix = np.empty((0, self.matrix.shape[1] if self.matrix.ndim == 2 else 0), dtype=np.float32)
+        # Tombstones over base + delta rows; None when nothing is deleted
+        self.dead: Optional[np.ndarray] = None
+        self.synced_at = time.monotonic()
+        # Positions of live rows sorted by chunk id, built on first restricted search
+        self._id_order: Optional[np.ndarray] = None
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Tuple[int, list]], change_id: int = 0) -> "AssistantIndex":
+        """Build an index from ``(chunk_id, embedding)`` rows."""
+        chunk_ids, vectors = [], []
+        for chunk_id, vector in rows:
+            chunk_ids.append(chunk_id)
+            vectors.append(vector)
+
+        if not vectors:
+            return cls(np.empty(0, dtype=np.int64), np.empty((0, 0), dtype=np.float32), change_id=change_id)
+
+        matrix = normalize_rows(np.array(vectors, dtype=np.float32))
+        return cls(np.array(chunk_ids, dtype=np.int64), matrix, change_id=change_id,
+                   prefilter=Prefilter.fit(matrix))
+
+    @classmethod
+    def from_encoded(cls, rows: Iterable[Tuple[int, bytes, str, Optional[float]]],
+                     change_id: int = 0) -> "AssistantIndex":
+        """Build an index from ``(chunk_id, blob, codec, scale)`` rows of compact embeddings."""
+        chunk_ids, matrix = decode_rows(rows)
+        prefilter = Prefilter.fit(matrix) if len(chunk_ids) else None
+        return cls(chunk_ids, matrix, change_id=change_id, prefilter=prefilter)
+
+    @classmethod
+    def from_clustered(cls, rows: Iterable[Tuple[int, bytes, str, Optional[float], Optional[int]]],
+                       centroids: np.ndarray, change_id: int = 0) -> "AssistantIndex":
+        """
+        Build an IVF index from ``(chunk_id, blob, codec, scale, cluster)`` rows.
+        Rows not yet assigned to a cluster are assigned to the nearest centroid.
+        """
+        rows = list(rows)
+        chunk_ids, matrix = decode_rows(row[:4] for row in rows)
+        if not len(chunk_ids):
+            return cls(chunk_ids, matrix, change_id=change_id)
+
+        clusters = np.array([-1 if row[4] is None else row[4] for row in rows], dtype=np.int32)
+        unassigned = (clusters < 0) | (clusters >= len(centroids))
+        if unassigned.any():
+            clusters[unassigned] = assign_clusters(matrix[unassigned], centroids)
+
+        chunk_ids, matrix, ivf = IVFLists.group(chunk_ids, matrix, clusters, centroids)
+        return cls(chunk_ids, matrix, change_id=change_id, ivf=ivf)
+
+    @property
+    def all_ids(self) -> np.ndarray:
+        if not len(self.delta_ids):
+            return self.chunk_ids
+        return np.concatenate([self.chunk_ids, self.delta_ids])
+
+    @property
+    def dead_count(self) -> int:
+        return int(self.dead.sum()) if self.dead is not None else 0
+
+    def __len__(self) -> int:
+        return len(self.chunk_ids) + len(self.delta_ids) - self.dead_count
+
+    @property
+    def nbytes(self) -> int:
+        prefilter_bytes = self.prefilter.nbytes if self.prefilter is not None else 0
+        ivf_bytes = self.ivf.nbytes if self.ivf is not None else 0
+        return (self.matrix.nbytes + self.chunk_ids.nbytes + prefilter_bytes + ivf_bytes
+                + self.private_delta_bytes)
+
+    @property
+    def private_delta_bytes(self) -> int:
+        dead_bytes = self.dead.nbytes if self.dead is not None else 0
+        return self.delta_matrix.nbytes + self.delta_ids.nbytes + dead_bytes
+
+    @property
+    def private_bytes(self) -> int:
+        """Memory owned by this process; memory-mapped shards live in the shared page cache."""
+        if self.version:
+            return self.private_delta_bytes
+        return self.nbytes
+
+    @property
+    def garbage_ratio(self) -> float:
+        """Delta rows plus tombstones relative to the base; compaction is due when it grows."""
+        return (len(self.delta_ids) + self.dead_count) / max(1, len(self.chunk_ids))
+
+    def apply(self, added_ids: np.ndarray, added_matrix: np.ndarray,
+              removed_ids: Iterable[int], change_id: int) -> "AssistantIndex":
+        """
+        Return a new snapshot with ``removed_ids`` tombstoned and then the
+        (unnormalized) ``added_matrix`` rows appended. Chunks that are already
+        live are not appended twice, so replaying a change is harmless.
+        """
+        snapshot = copy.copy(self)
+        all_ids = self.all_ids
+        dead = self.dead.copy() if self.dead is not None else np.zeros(len(all_ids), dtype=bool)
+
+        removed_ids = np.fromiter(removed_ids, dtype=np.int64)
+        if len(removed_ids):
+            dead |= np.isin(all_ids, removed_ids)
+
+        added_ids = np.asarray(added_ids, dtype=np.int64)
+        if len(added_ids):
+            fresh = ~np.isin(added_ids, all_ids[~dead])
+            added_ids = added_ids[fresh]
+            added_matrix = normalize_rows(np.array(added_matrix, dtype=np.float32)[fresh])
+
+            delta_matrix = self.delta_matrix
+            if not len(self.delta_ids):
+                delta_matrix = delta_matrix.reshape(0, added_matrix.shape[1])
+            snapshot.delta_ids = np.concatenate([self.delta_ids, added_ids])
+            snapshot.delta_matrix = np.concatenate([delta_matrix, added_matrix])
+            dead = np.concatenate([dead, np.zeros(len(added_ids), dtype=bool)])
+
+        snapshot.dead = dead if dead.any() else None
+        snapshot._id_order = None
+        snapshot.change_id = change_id
+        snapshot.synced_at = time.monotonic()
+        return snapshot
+
+    def compacted(self) -> "AssistantIndex":
+        """Fold the delta and tombstones into one private matrix, without touching the database."""
+        matrices = [m for m in (self.matrix, self.delta_matrix) if m.size]
+        if not matrices:
+            return AssistantIndex(np.empty(0, dtype=np.int64), np.empty((0, 0), dtype=np.float32),
+                                  change_id=self.change_id)
+
+        matrix = np.concatenate(matrices) if len(matrices) > 1 else np.array(matrices[0])
+        chunk_ids = self.all_ids
+        clusters = None
+        if self.ivf is not None:
+            # Base rows keep their cluster; delta rows go to the nearest centroid
+            clusters = self.ivf.row_clusters()
+            if len(self.delta_ids):
+                clusters = np.concatenate([clusters, assign_clusters(self.delta_matrix, self.ivf.centroids)])
+        if self.dead is not None:
+            alive = ~self.dead
+            matrix, chunk_ids = matrix[alive], chunk_ids[alive]
+            if clusters is not None:
+                clusters = clusters[alive]
+
+        if clusters is not None:
+            chunk_ids, matrix, ivf = IVFLists.group(chunk_ids, matrix, clusters, self.ivf.centroids)
+            return AssistantIndex(chunk_ids, matrix, change_id=self.change_id, ivf=ivf)
+        return AssistantIndex(chunk_ids, matrix, change_id=self.change_id, prefilter=Prefilter.fit(matrix))
+
+    def positions_of(self, chunk_ids: Iterable[int]) -> np.ndarray:
+        """Sorted row positions (base rows, then delta rows) of the given chunks that are live."""
+        all_ids = self.all_ids
+        if self._id_order is None:
+            alive = np.flatnonzero(~self.dead) if self.dead is not None else np.arange(len(all_ids))
+            self._id_order = alive[np.argsort(all_ids[alive], kind='stable')]
+        if not len(self._id_order):
+            return np.empty(0, dtype=np.int64)
+
+        sorted_ids = all_ids[self._id_order]
+        chunk_ids = np.fromiter(chunk_ids, dtype=np.int64)
+        slots = np.minimum(np.searchsorted(sorted_ids, chunk_ids), len(sorted_ids) - 1)
+        return np.sort(self._id_order[slots[sorted_ids[slots] == chunk_ids]])
+
+    def search(self, query_embedding, k: int, chunk_ids: Optional[Iterable[int]] = None) -> List[Tuple[int, float]]:
+        """
+        Return the ``k`` most similar chunks as ``(chunk_id, cosine_similarity)``
+        pairs, best first. ``chunk_ids`` limits the search to those chunks.
+        """
+        if not len(self) or k <= 0:
+            return []
+
+        query = np.asarray(query_embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm == 0:
+            return []
+        query = query / norm
+
+        base_rows = len(self.chunk_ids)
+        shortlist = k * settings.VECTOR_RERANK_MULTIPLIER
+        if chunk_ids is not None:
+            # Score only the given chunks, e.g. those of the documents the query was routed to
+            positions = self.positions_of(chunk_ids)
+            in_base = positions < base_rows
+            scores = np.empty(len(positions), dtype=np.float32)
+            if in_base.any():
+                scores[in_base] = self.matrix[positions[in_base]] @ query
+            if not in_base.all():
+                scores[~in_base] = self.delta_matrix[positions[~in_base] - base_rows] @ query
+        elif self.ivf is not None and base_rows:
+            # Scan only the inverted lists of the clusters nearest to the query
+            ranges = self.ivf.probe(query, settings.VECTOR_IVF_NPROBE)
+            positions = np.concatenate(
+                [np.arange(start, stop) for start, stop in ranges] or [np.empty(0, dtype=np.int64)]
+            )
+            scores = np.concatenate(
+                [self.matrix[start:stop] @ query for start, stop in ranges] or [np.empty(0, dtype=np.float32)]
+            )
+        elif self.prefilter is not None and base_rows > shortlist:
+            # Stage 1: reduced vectors pick the shortlist; stage 2: rerank it with full vectors
+            coarse = self.prefilter.reduced @ self.prefilter.project_query(query)
+            if self.dead is not None:
+                coarse[self.dead[:base_rows]] = -np.inf
+            positions = np.sort(np.argpartition(-coarse, shortlist - 1)[:shortlist])
+            scores = self.matrix[positions] @ query
+        else:
+            positions = np.arange(base_rows)
+            scores = self.matrix @ query if base_rows else np.empty(0, dtype=np.float32)
+
+        if chunk_ids is None and len(self.delta_ids):
+            positions = np.concatenate([positions, base_rows + np.arange(len(self.delta_ids))])
+            scores = np.concatenate([scores, self.delta_matrix @ query])
+        if self.dead is not None:
+            scores[self.dead[positions]] = -np.inf
+
+        k = min(k, int(np.isfinite(scores).sum()))
+        if not k:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+
+        all_ids = self.all_ids
+        return [(int(all_ids[positions[i]]), float(scores[i])) for i in top]
+
+
+class VectorIndexCache:
+    """
+    Memory-bounded LRU of AssistantIndex (or DocumentRouter) objects keyed
+    by assistant id.
+
+    Indexes are built lazily on first use and evicted least-recently-used
+    first once the combined size of process-private matrices exceeds
+    ``max_bytes``; memory-mapped shards do not count against it.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._indexes: "OrderedDict[str, AssistantIndex]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self._build_locks = {}
+
+    def _build_lock(self, key: str) -> threading.Lock:
+        with self._lock:
+            return self._build_locks.setdefault(key, threading.Lock())
+
+    def get(self, assistant_id, loader: Callable[[], AssistantIndex]) -> AssistantIndex:
+        """Return the cached index for ``assistant_id``, building it with ``loader`` on a miss."""
+        key = str(assistant_id)
+
+        with self._lock:
+            index = self._indexes.get(key)
+            if index is not None:
+                self._indexes.move_to_end(key)
+                return index
+
+        # Only one thread builds a given assistant's index at a time
+        with self._build_lock(key):
+            with self._lock:
+                index = self._indexes.get(key)
+                if index is not None:
+                    self._indexes.move_to_end(key)
+                    return index
+
+            index = loader()
+            self.put(key, index)
+            return index
+
+    def put(self, assistant_id, index: AssistantIndex) -> None:
+        key = str(assistant_id)
+        with self._lock:
+            previous = self._indexes.pop(key, None)
+            if previous is not None:
+                self._size -= previous.private_bytes
+
+            if index.private_bytes > self.max_bytes:
+                logger.warning(
+                    f"Vector index for assistant {key} ({index.private_bytes} bytes) exceeds "
+                    f"VECTOR_INDEX_MAX_BYTES; serving it uncached."
+                )
+                return
+
+            self._indexes[key] = index
+            self._size += index.private_bytes
+
+            while self._size > self.max_bytes and self._indexes:
+                evicted_key, evicted = self._indexes.popitem(last=False)
+                self._size -= evicted.private_bytes
+                logger.info(f"Evicted vector index for assistant {evicted_key}")
+
+    def invalidate(self, assistant_id) -> None:
+        """Drop the cached index for ``assistant_id`` so the next query rebuilds it."""
+        key = str(assistant_id)
+        with self._lock:
+            index = self._indexes.pop(key, None)
+            if index is not None:
+                self._size -= index.private_bytes
+
+    def clear(self) -> None:
+        with self._lock:
+            self._indexes.clear()
+            self._size = 0
+
+    def peek(self, assistant_id) -> Optional[AssistantIndex]:
+        """Return the cached index without building it or touching LRU order."""
+        with self._lock:
+            return self._indexes.get(str(assistant_id))
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+
+vector_index_cache = VectorIndexCache(
+    max_bytes=getattr(settings, 'VECTOR_INDEX_MAX_BYTES', 256 * 1024 * 1024)
+)
+
+document_router_cache = VectorIndexCache(
+    max_bytes=getattr(settings, 'DOCUMENT_ROUTER_MAX_BYTES', 32 * 1024 * 1024)
+)
@@ -0,0 +1,213 @@
+"""
+Memory-mapped on-disk shards of per-assistant embedding matrices.
+
+When VECTOR_SHARD_DIR is set, each assistant's normalized float32 matrix
+and chunk ids are exported as ``.npy`` files and opened with
+``np.load(mmap_mode='r')``, so every worker process on the machine shares
+one page-cache copy instead of holding its own.
+
+Layout::
+
+    VECTOR_SHARD_DIR/<assistant_id>/CURRENT        name of the live version
+    VECTOR_SHARD_DIR/<assistant_id>/<version>/ids.npy
+    VECTOR_SHARD_DIR/<assistant_id>/<version>/matrix.npy
+    VECTOR_SHARD_DIR/<assistant_id>/<version>/meta.json      last IndexChange included
+    VECTOR_SHARD_DIR/<assistant_id>/<version>/reduced.npy    optional prefilter
+    (with projection.npy and mean.npy in PCA mode)
+    VECTOR_SHARD_DIR/<assistant_id>/<version>/centroids.npy  optional IVF lists
+    (with offsets.npy; the matrix rows are then sorted by cluster)
+
+Versions are written to a temporary directory and published by atomically
+replacing CURRENT, so readers never see a partial shard. Removing CURRENT
+marks the shard stale; the next reader rebuilds it from the database.
+"""
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Callable, Optional
+
+import numpy as np
+from django.conf import settings
+
+from .vector_index import AssistantIndex, IVFLists, Prefilter
+
+try:
+    import fcntl
+except ImportError:  # Windows: builds are not serialized across processes
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+CURRENT = 'CURRENT'
+# Versions kept besides the live one, for readers still mapping older files
+KEEP_PREVIOUS_VERSIONS = 1
+
+
+class ShardStore:
+    """Exports and memory-maps assistant indexes under ``root``."""
+
+    def __init__(self, root: Optional[str]):
+        self.root = root
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.root)
+
+    def _assistant_dir(self, assistant_id) -> str:
+        return os.path.join(self.root, str(assistant_id))
+
+    def current_version(self, assistant_id) -> Optional[str]:
+        try:
+            with open(os.path.join(self._assistant_dir(assistant_id), CURRENT)) as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    @contextmanager
+    def _build_lock(self, assistant_id):
+        """Serialize shard builds for one assistant across processes."""
+        directory = self._assistant_dir(assistant_id)
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, '.lock'), 'w') as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def load(self, assistant_id) -> Optional[AssistantIndex]:
+        """Memory-map the live shard, or return None if there is none."""
+        version = self.current_version(assistant_id)
+        if version is None:
+            return None
+
+        directory = os.path.join(self._assistant_dir(assistant_id), version)
+        try:
+            chunk_ids = np.load(os.path.join(directory, 'ids.npy'), mmap_mode='r')
+            matrix = np.load(os.path.join(directory, 'matrix.npy'), mmap_mode='r')
+            with open(os.path.join(directory, 'meta.json')) as f:
+                meta = json.load(f)
+            prefilter = None
+            if meta.get('prefilter'):
+                prefilter = Prefilter(
+                    np.load(os.path.join(directory, 'reduced.npy'), mmap_mode='r'),
+                    *[
+                        np.load(os.path.join(directory, f'{name}.npy'))
+                        if os.path.exists(os.path.join(directory, f'{name}.npy')) else None
+                        for name in ('projection', 'mean')
+                    ]
+                )
+            ivf = None
+            if meta.get('ivf'):
+                ivf = IVFLists(
+                    np.load(os.path.join(directory, 'centroids.npy')),
+                    np.load(os.path.join(directory, 'offsets.npy'))
+                )
+        except (FileNotFoundError, ValueError) as e:
+            logger.warning(f"Vector shard {directory} unreadable: {e}")
+            return None
+        return AssistantIndex(chunk_ids, matrix, version=version,
+                              change_id=meta.get('change_id', 0), prefilter=prefilter, ivf=ivf)
+
+    def export(self, assistant_id, index: AssistantIndex) -> str:
+        """Write ``index`` as a new version and make it live. Returns the version name."""
+        directory = self._assistant_dir(assistant_id)
+        os.makedirs(directory, exist_ok=True)
+
+        version = f"{int(time.time() * 1000)}-{uuid.uuid4().hex[:8]}"
+        staging = tempfile.mkdtemp(prefix='.staging-', dir=directory)
+        try:
+            np.save(os.path.join(staging, 'ids.npy'), np.asarray(index.chunk_ids, dtype=np.int64))
+            np.save(os.path.join(staging, 'matrix.npy'), np.asarray(index.matrix, dtype=np.float32))
+            prefilter = index.prefilter
+            if prefilter is not None:
+                np.save(os.path.join(staging, 'reduced.npy'), np.asarray(prefilter.reduced))
+                for name in ('projection', 'mean'):
+                    if getattr(prefilter, name) is not None:
+                        np.save(os.path.join(staging, f'{name}.npy'), getattr(prefilter, name))
+            if index.ivf is not None:
+                np.save(os.path.join(staging, 'centroids.npy'), index.ivf.centroids)
+                np.save(os.path.join(staging, 'offsets.npy'), index.ivf.offsets)
+            with open(os.path.join(staging, 'meta.json'), 'w') as f:
+                json.dump({
+                    'change_id': index.change_id,
+                    'chunks': len(index),
+                    'prefilter': prefilter is not None,
+                    'ivf': index.ivf is not None,
+                }, f)
+            os.rename(staging, os.path.join(directory, version))
+        except Exception:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+
+        pointer = os.path.join(directory, f'.{CURRENT}.{version}')
+        with open(pointer, 'w') as f:
+            f.write(version)
+        os.replace(pointer, os.path.join(directory, CURRENT))
+
+        self._remove_old_versions(assistant_id, version)
+        logger.info(f"Exported vector shard {version} for assistant {assistant_id} ({len(index)} chunks)")
+        return version
+
+    def _remove_old_versions(self, assistant_id, live_version: str) -> None:
+        # Mappings already open keep working after their files are unlinked
+        directory = self._assistant_dir(assistant_id)
+        versions = sorted(
+            name for name in os.listdir(directory)
+            if not name.startswith('.') and name != CURRENT and name != live_version
+        )
+        for name in versions[:len(versions) - KEEP_PREVIOUS_VERSIONS]:
+            shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
+
+    def load_or_build(self, assistant_id, builder: Callable[[], AssistantIndex]) -> AssistantIndex:
+        """Map the live shard, building and exporting it with ``builder`` first if needed."""
+        index = self.load(assistant_id)
+        if index is not None:
+            return index
+
+        with self._build_lock(assistant_id):
+            # Another process may have exported while we waited for the lock
+            index = self.load(assistant_id)
+            if index is not None:
+                return index
+            self.export(assistant_id, builder())
+            return self.load(assistant_id)
+
+    def rebuild(self, assistant_id, builder: Callable[[], AssistantIndex]) -> str:
+        """Export a fresh shard built with ``builder``."""
+        with self._build_lock(assistant_id):
+            return self.export(assistant_id, builder())
+
+    def publish_compacted(self, assistant_id, index: AssistantIndex) -> Optional[AssistantIndex]:
+        """
+        Export ``index.compacted()`` as the new live shard and map it, unless
+        another process already published a newer base meanwhile.
+        """
+        with self._build_lock(assistant_id):
+            if self.current_version(assistant_id) != index.version:
+                return None
+            self.export(assistant_id, index.compacted())
+            return self.load(assistant_id)
+
+    def invalidate(self, assistant_id) -> None:
+        """Mark the assistant's shard stale so the next reader rebuilds it."""
+        if not self.enabled:
+            return
+        try:
+            os.unlink(os.path.join(self._assistant_dir(assistant_id), CURRENT))
+        except FileNotFoundError:
+            pass
+
+    def remove(self, assistant_id) -> None:
+        if self.enabled:
+            shutil.rmtree(self._assistant_dir(assistant_id), ignore_errors=True)
+
+
+shard_store = ShardStore(getattr(settings, 'VECTOR_SHARD_DIR', None))
@@ -1,8 +1,10 @@
+import asyncio
 import os
 from django.http import JsonResponse, HttpResponseRedirect, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 import json
+import time
 import uuid
 import base64
 from typing import Dict, Any, Optional
@@ -10,13 +12,14 @@ import logging
 from django.conf import settings
 from django.core.files import File
 from django.shortcuts import redirect
+from django.urls import reverse
 from django.contrib.auth.models import User
 from django_htmx.http import HttpResponseClientRedirect
 from django.core.validators import URLValidator
 from django.core.exceptions import ValidationError
 
 # Ensure these imports match your project structure
-from .models import SupabaseUser, Assistant, PDFDocument, AssistantRating, Subject, Topic
+from .models import SupabaseUser, Assistant, PDFDocument, AssistantRating, Subject, Topic, IngestionJob
 from django.template.loader import TemplateDoesNotExist
 from django.contrib.auth.decorators import login_required
 from django.shortcuts import render
@@ -130,8 +133,9 @@ def create_assistant(request, ass_id: Optional[str] = None):
 
         print(documents)
 
-        urls = [{'title': document.title, 'id': document.doc_id} for document in documents if document.metadata.get('document_type') == 'url']
-        pdfs = [{'title': document.title, 'id': document.doc_id} for document in documents if document.metadata.get('document_type') == 'pdf']
+        # metadata is only filled in once background ingestion completes, so classify by source
+        urls = [{'title': document.title, 'id': document.doc_id} for document in documents if not document.file]
+        pdfs = [{'title': document.title, 'id': document.doc_id} for document in documents if document.file]
         is_creator = request.user.id == assistant_data.user_id.id
 
         subjects = Subject.objects.all()
@@ -271,6 +275,8 @@ def create_assistant(request, ass_id: Optional[str] = None):
 
         # Track if a document was uploaded
         document_uploaded = False
+        # Documents queued for background ingestion in this request
+        queued_documents = []
         # Handle file uploads
         if files := request.FILES.getlist('knowledge_base'):
             for file in files:
@@ -282,13 +288,14 @@ def create_assistant(request, ass_id: Optional[str] = None):
                         title=file.name
                     )
                     
-                    # Asynchronous PDF processing recommended
-                    pdf_document.process_pdf()
+                    # Processed by `manage.py ingestion_worker`; the request returns immediately
+                    IngestionJob.enqueue(pdf_document)
+                    queued_documents.append(pdf_document)
                     document_uploaded = True
                     changes_made = True
                 
                 except Exception as e:
-                    logger.error(f"PDF processing error for {file.name}: {e}")
+                    logger.error(f"PDF upload error for {file.name}: {e}")
 
         url_list = []
         # Handle URL input
@@ -300,15 +307,18 @@ def create_assistant(request, ass_id: Optional[str] = None):
                 url_list.append(url)
                 
                 # Create PDFDocument with URL
-                url_document = PDFDocument.objects.create(
+                url_document = PDFDocument(
                     user_id=user,
                     assistant_id=assistant,
                     urls=url_list,
                     title=url  # Use URL as title
                 )
+                url_document._validate_document_input()
+                url_document.save()
                 
-                # Process the URL document
-                url_document.process_pdf()
+                # Queue the URL document for background processing
+                IngestionJob.enqueue(url_document)
+                queued_documents.append(url_document)
                 document_uploaded = True
                 changes_made = True
             
@@ -331,6 +341,14 @@ def create_assistant(request, ass_id: Optional[str] = None):
                     "is_published": assistant.is_published,
                     # "image": base64.b64encode(assistant.image_blob).decode('utf-8') if assistant.image_blob else None,
                     "image_url": assistant.image if assistant.image else None,
+                    "documents": [
+                        {
+                            "doc_id": str(document.doc_id),
+                            "title": document.title,
+                            "progress_url": reverse('ingestion_progress', args=[str(document.doc_id)])
+                        }
+                        for document in queued_documents
+                    ],
                     "message": "Assistant updated successfully"
                 }
                 return format_response(data=response_data)
@@ -457,6 +475,50 @@ def del_knowledgebase(request, document_id: str):
     except PDFDocument.DoesNotExist:
         return JsonResponse({'error': 'Document not found'}, status=404)
 
+@login_required(login_url='accounts/login/')
+@require_http_methods(["GET"])
+async def ingestion_progress(request, document_id: str) -> StreamingHttpResponse:
+    """
+    Server-sent events stream of a knowledge-base document's ingestion progress.
+
+    Emits the job's status and counters whenever they change and closes once
+    the document is completed or failed. Async so that under ASGI each event
+    is sent as it happens and a waiting stream holds no thread.
+    """
+    try:
+        document = await PDFDocument.objects.select_related('assistant_id').aget(doc_id=document_id)
+    except (PDFDocument.DoesNotExist, ValidationError):
+        return JsonResponse({'error': 'Document not found'}, status=404)
+
+    user = await request.auser()
+    # A document without an assistant has no owner to check against
+    if document.assistant_id is None or document.assistant_id.user_id_id != user.id:
+        return JsonResponse({'error': 'Unauthorized to view this document'}, status=403)
+
+    async def event_stream():
+        last_progress = None
+        deadline = time.monotonic() + 15 * 60
+        while time.monotonic() < deadline:
+            job = await IngestionJob.objects.filter(document=document).order_by('-created_at').afirst()
+            if job:
+                progress = job.as_progress()
+            else:
+                await document.arefresh_from_db(fields=['status'])
+                progress = {'document_id': str(document.doc_id), 'status': document.status}
+
+            if progress != last_progress:
+                yield f"data: {json.dumps(progress)}\n\n"
+                last_progress = progress
+
+            if progress['status'] in ('completed', 'failed'):
+                return
+            await asyncio.sleep(1)
+
+    response = StreamingHttpResponse(event_stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
 @login_required(login_url='accounts/login/')
 def create_assistant_view(request, ass_id):
     try: